@@ -81,3 +81,39 @@ class Call(Expr):
 
     def accept(self, visitor):
         return visitor.visit_call_expr(self)
+
+class Get(Expr):
+    def __init__(self, object: Expr, name: Token):
+        self.object = object
+        self.name = name
+        self.cache = None
+        self.entries = None
+
+    def accept(self, visitor):
+        return visitor.visit_get_expr(self)
+
+class Set(Expr):
+    def __init__(self, object: Expr, name: Token, value: Expr):
+        self.object = object
+        self.name = name
+        self.value = value
+        self.cache = None
+        self.entries = None
+
+    def accept(self, visitor):
+        return visitor.visit_set_expr(self)
+
+class This(Expr):
+    def __init__(self, keyword: Token):
+        self.keyword = keyword
+
+    def accept(self, visitor):
+        return visitor.visit_this_expr(self)
+
+class Super(Expr):
+    def __init__(self, keyword: Token, method: Token):
+        self.keyword = keyword
+        self.method = method
+
+    def accept(self, visitor):
+        return visitor.visit_super_expr(self)
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from ttoken import Token
-from Expr import Expr
+from Expr import Expr, Variable
 
 
 class Stmt(ABC):
@@ -11,6 +11,8 @@ class Stmt(ABC):
 class Block(Stmt):
     def __init__(self, statements: list[Stmt]):
         self.statements = statements
+        self.scoped = True
+        self.start = None
 
     def accept(self, visitor):
         return visitor.visit_block_stmt(self)
@@ -18,6 +20,7 @@ class Block(Stmt):
 class ExprStmt(Stmt):
     def __init__(self, expression: Expr):
         self.expression = expression
+        self.start = None
 
     def accept(self, visitor):
         return visitor.visit_exprstmt_stmt(self)
@@ -25,6 +28,7 @@ class ExprStmt(Stmt):
 class Print(Stmt):
     def __init__(self, expression: Expr):
         self.expression = expression
+        self.start = None
 
     def accept(self, visitor):
         return visitor.visit_print_stmt(self)
@@ -50,6 +54,7 @@ class Function(Stmt):
         self.name = name
         self.params = params
         self.body = body
+        self.captures = None
 
     def accept(self, visitor):
         return visitor.visit_function_stmt(self)
@@ -59,6 +64,7 @@ class If(Stmt):
         self.condition = condition
         self.then_branch = then_branch
         self.else_branch = else_branch
+        self.start = None
 
     def accept(self, visitor):
         return visitor.visit_if_stmt(self)
@@ -67,6 +73,7 @@ class While(Stmt):
     def __init__(self, condition: Expr, body: Stmt):
         self.condition = condition
         self.body = body
+        self.start = None
 
     def accept(self, visitor):
         return visitor.visit_while_stmt(self)
@@ -77,3 +84,33 @@ class Break(Stmt):
 
     def accept(self, visitor):
         return visitor.visit_break_stmt(self)
+
+class ForRange(Stmt):
+    def __init__(self, counter: Token, loop: While, operator: Token, limit: Expr, step: float, body: Stmt):
+        self.counter = counter
+        self.loop = loop
+        self.operator = operator
+        self.limit = limit
+        self.step = step
+        self.body = body
+
+    def accept(self, visitor):
+        return visitor.visit_forrange_stmt(self)
+
+class Import(Stmt):
+    def __init__(self, keyword: Token, path: Token, name: Token):
+        self.keyword = keyword
+        self.path = path
+        self.name = name
+
+    def accept(self, visitor):
+        return visitor.visit_import_stmt(self)
+
+class Class(Stmt):
+    def __init__(self, name: Token, superclass: Variable, methods: list[Function]):
+        self.name = name
+        self.superclass = superclass
+        self.methods = methods
+
+    def accept(self, visitor):
+        return visitor.visit_class_stmt(self)
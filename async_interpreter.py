@@ -0,0 +1,235 @@
+import __future__
+import ast
+import asyncio
+import inspect
+import sys
+from io import TextIOBase
+
+from Stmt import Stmt, Function
+from ttoken import Token
+from error import ErrorHandler, LoxRuntimeError
+from environment import Environment
+from callable import LoxCallable, LoxFunction
+from lox_return import LoxReturn
+from lox_class import LoxClass, LoxInstance, BoundMethod
+from budget import Budget, BudgetExceeded, CallDepthExceeded, start_of
+from interpreter import Interpreter
+
+# Steps between giving the event loop a turn.
+DEFAULT_INTERVAL = 100
+
+
+class LoxSleep(LoxCallable):
+    """sleep(ms), which only suspends the script that calls it."""
+
+    arity_count = 1
+
+    def call(self, interpreter: Interpreter, arguments: tuple) -> object:
+        milliseconds = arguments[0]
+        if not isinstance(milliseconds, float):
+            raise LoxRuntimeError(None, "Can only sleep for a number of milliseconds.")
+        return asyncio.sleep(max(milliseconds, 0.0) / 1000)
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+class AsyncInterpreter(Interpreter):
+    """Runs a program as an asyncio task, so many can share one thread.
+
+    Every visit method is a coroutine. A step is a statement or a call, and
+    every `interval` of them the script gives the event loop a turn. Natives
+    may return an awaitable, which suspends only the script that called
+    them. Under a budget the script gives up its turn whenever the budget is
+    checked instead. The JIT is never used since compiled code can't suspend.
+
+    Only stepping and calling are written out here. The other methods are
+    the Interpreter's, compiled again as coroutines, see _coroutines.
+    """
+
+    is_async = True
+
+    def __init__(
+        self,
+        error_handler: ErrorHandler,
+        jit_threshold: int | None = None,
+        out: TextIOBase | None = None,
+        quicken: bool = True,
+        interval: int = DEFAULT_INTERVAL,
+    ):
+        super().__init__(error_handler, None, out, quicken)
+        self.interval = interval
+        self._countdown = interval
+        self._max_depth = sys.maxsize
+
+    def limit(self, budget: Budget) -> None:
+        self.budget = budget
+        self._countdown = budget.start()
+        self._depth = 0
+        self._max_depth = budget.max_depth if budget.max_depth is not None else sys.maxsize
+        self.visit_inlined_expr = self.visit_call_expr
+
+    def _define_natives(self, environment: Environment) -> None:
+        super()._define_natives(environment)
+        environment.define("sleep", LoxSleep())
+
+    async def _pause(self, node: Stmt | Token) -> None:
+        if self.budget is not None:
+            self._countdown = self.budget.check(node)
+        else:
+            self._countdown = self.interval
+        await asyncio.sleep(0)
+
+    async def _call(self, callee: object, arguments: tuple, paren: Token) -> object:
+        self._countdown -= 1
+        if self._countdown <= 0:
+            await self._pause(paren)
+
+        callee_type: type = type(callee)
+        if callee_type is LoxFunction:
+            return await self._call_function(callee, arguments, paren, None)
+        if callee_type is BoundMethod:
+            return await self._call_function(callee.method, arguments, paren, callee.instance)
+        if callee_type is LoxClass:
+            instance: LoxInstance = LoxInstance(callee)
+            initializer: LoxFunction | None = callee.find_method("init")
+            if initializer is not None:
+                await self._call_function(initializer, arguments, paren, instance)
+            elif arguments:
+                raise LoxRuntimeError(paren, f"Expected 0 arguments but got {len(arguments)}.")
+            return instance
+
+        try:
+            result = Interpreter._call(self, callee, arguments, paren)
+            if inspect.isawaitable(result):
+                result = await result
+        except LoxRuntimeError as error:
+            # Natives don't know where they were called from.
+            if error.token is None:
+                error.token = paren
+            raise
+        return result
+
+    async def _call_function(
+        self, function: LoxFunction, arguments: tuple, paren: Token, this: object
+    ) -> object:
+        if len(arguments) != function.arity_count:
+            raise LoxRuntimeError(
+                paren, f"Expected {function.arity_count} arguments but got {len(arguments)}."
+            )
+        if self._depth >= self._max_depth:
+            raise CallDepthExceeded(paren, f"More than {self._max_depth} nested calls.")
+
+        declaration: Function = function.declaration
+        environment: Environment = Environment(
+            function.closure, declaration, dict(zip(function.params, arguments))
+        )
+        if this is not None:
+            environment.define("this", this)
+
+        self._depth += 1
+        try:
+            await self._execute_block(declaration.body, environment)
+        except LoxReturn as r:
+            return this if function.is_initializer else r.value
+        except RecursionError:
+            raise CallDepthExceeded(paren, "Stack overflow.")
+        finally:
+            self._depth -= 1
+        return this if function.is_initializer else None
+
+    async def _execute(self, stmt: Stmt) -> None:
+        self._countdown -= 1
+        if self._countdown <= 0:
+            await self._pause(stmt)
+        try:
+            await stmt.accept(self)
+        except BudgetExceeded as error:
+            if error.token is None:
+                error.token = start_of(stmt)
+            raise
+
+
+# The Interpreter methods AsyncInterpreter runs as coroutines compiled from
+# their source, besides the visit methods.
+_GENERATED: tuple[str, ...] = (
+    "_visit_binary_unquickened",
+    "_inlined_call",
+    "_execute_block",
+    "_execute_traced",
+    "_execute_block_traced",
+    "execute_module",
+    "interpret",
+    "repl_interpret",
+)
+
+
+class _Awaiting(ast.NodeTransformer):
+    """Makes a coroutine of a method: it awaits the calls of the methods in
+    `coroutines`, and evaluates an expression by awaiting expr.accept(self)
+    rather than _evaluate, which saves a coroutine per node."""
+
+    def __init__(self, coroutines: set[str]) -> None:
+        self._coroutines = coroutines
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.AsyncFunctionDef:
+        self.generic_visit(node)
+        return ast.AsyncFunctionDef(**{field: getattr(node, field) for field in node._fields})
+
+    def visit_Call(self, node: ast.Call) -> ast.expr:
+        self.generic_visit(node)
+        function: ast.expr = node.func
+        if not isinstance(function, ast.Attribute):
+            return node
+        if function.attr == "accept":
+            return ast.Await(node)
+        if not isinstance(function.value, ast.Name) or function.value.id != "self":
+            return node
+        if function.attr == "_evaluate":
+            (expr,) = node.args
+            accept = ast.Attribute(expr, "accept", ast.Load())
+            return ast.Await(ast.Call(accept, [ast.Name("self", ast.Load())], []))
+        if function.attr in self._coroutines:
+            return ast.Await(node)
+        return node
+
+
+def _coroutines(names: list[str]) -> None:
+    """Give AsyncInterpreter coroutine versions of the Interpreter methods
+    names, compiled from the source of the Interpreter so the two can't
+    drift apart. Tracebacks point at the Interpreter's lines."""
+    module = sys.modules[Interpreter.__module__]
+    tree: ast.Module = ast.parse(inspect.getsource(module))
+    interpreter: ast.ClassDef = next(
+        node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == "Interpreter"
+    )
+    methods: dict[str, ast.FunctionDef] = {
+        node.name: node for node in interpreter.body if isinstance(node, ast.FunctionDef)
+    }
+
+    # What a generated method awaits: the others, what is written out
+    # above, and what settrace and Lox swap in for them.
+    coroutines: set[str] = set(names) | {
+        name for name, value in vars(AsyncInterpreter).items() if inspect.iscoroutinefunction(value)
+    }
+    coroutines |= {"_execute_untraced", "_execute_block_untraced", "importer"}
+    awaiting = _Awaiting(coroutines)
+    body: list[ast.stmt] = [awaiting.visit(methods[name]) for name in names]
+    code = compile(
+        ast.fix_missing_locations(ast.Module(body, [])),
+        inspect.getsourcefile(module),
+        "exec",
+        flags=__future__.annotations.compiler_flag,
+        dont_inherit=True,
+    )
+    namespace: dict[str, object] = dict(vars(module))
+    exec(code, namespace)
+    for name in names:
+        method = namespace[name]
+        method.__qualname__ = f"AsyncInterpreter.{name}"
+        setattr(AsyncInterpreter, name, method)
+
+
+_coroutines(
+    [name for name in vars(Interpreter) if name.startswith("visit_")] + list(_GENERATED)
+)
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+
+from Expr import Expr
+from Stmt import Stmt
+from ttoken import Token
+from error import LoxRuntimeError
+
+
+# Steps run between checks of the clock and the memory.
+DEFAULT_INTERVAL = 1024
+
+
+class BudgetExceeded(LoxRuntimeError):
+    exit_status = 80
+
+
+class StepBudgetExceeded(BudgetExceeded):
+    exit_status = 81
+
+
+class DeadlineExceeded(BudgetExceeded):
+    exit_status = 82
+
+
+class CallDepthExceeded(BudgetExceeded):
+    exit_status = 83
+
+
+class MemoryBudgetExceeded(BudgetExceeded):
+    exit_status = 84
+
+
+class Budget:
+    """Limits on one run of a script.
+
+    A step is a statement the tree walker executes, a call, or an iteration
+    of a compiled loop. Steps are counted down and only every `interval`
+    of them is the step count, the clock and the memory checked, so the
+    deadline and the memory cap may be overshot by that many steps. The
+    memory is how many bytes more the process has resident than when the
+    run started, see resident_memory. So it counts what the script keeps
+    alive, and what it freed that Python kept, but also what other threads
+    allocate. A statement that grows memory a lot at once, like doubling a
+    string, can go far past the cap before the next check; a smaller
+    interval catches it sooner. The call depth is checked on every call.
+    """
+
+    def __init__(
+        self,
+        max_steps: int | None = None,
+        timeout: float | None = None,
+        max_depth: int | None = None,
+        max_memory: int | None = None,
+        interval: int = DEFAULT_INTERVAL,
+    ) -> None:
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_depth = max_depth
+        self.max_memory = max_memory
+        self.interval = interval
+
+        self.steps = 0
+        self._chunk = 0
+        self._deadline: float | None = None
+        self._baseline = 0
+
+    def start(self) -> int:
+        """Start a run, returns the steps until the first check."""
+        self.steps = 0
+        if self.timeout is not None:
+            self._deadline = time.monotonic() + self.timeout
+        if self.max_memory is not None:
+            self._baseline = resident_memory()
+        return self._next()
+
+    def check(self, node: Stmt | Expr) -> int:
+        """Raise if the run is over budget, else return the steps until the
+        next check. node is what was about to run, for the error's line."""
+        self.steps += self._chunk
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise StepBudgetExceeded(
+                start_of(node), f"Ran more than {self.max_steps} steps."
+            )
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise DeadlineExceeded(
+                start_of(node), f"Ran longer than {self.timeout:g} seconds."
+            )
+        if self.max_memory is not None and resident_memory() - self._baseline > self.max_memory:
+            raise MemoryBudgetExceeded(
+                start_of(node), f"Used more than {self.max_memory / 2**20:g} MB of memory."
+            )
+        return self._next()
+
+    def _next(self) -> int:
+        chunk = self.interval
+        if self.max_steps is not None:
+            # Check right after the last step allowed.
+            chunk = max(1, min(chunk, self.max_steps - self.steps + 1))
+        self._chunk = chunk
+        return chunk
+
+
+# The process that opened /proc/self/statm, and the file, which a fork
+# leaves to its children still reading the parent.
+_statm: tuple[int, int] | None = None
+
+
+def resident_memory() -> int:
+    """The bytes of memory the process has resident, or the most it has had
+    where the operating system only tells that."""
+    global _statm
+    try:
+        if _statm is None or _statm[0] != os.getpid():
+            _statm = (os.getpid(), os.open("/proc/self/statm", os.O_RDONLY))
+        return int(os.pread(_statm[1], 64, 0).split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, AttributeError):
+        import resource
+
+        peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes everywhere but macOS.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def token_of(node: object) -> Token | None:
+    """The first token in node, for reporting a line."""
+    pending: list[object] = [node]
+    while pending:
+        item = pending.pop(0)
+        if isinstance(item, Token):
+            return item
+        if isinstance(item, list):
+            pending.extend(item)
+        elif isinstance(item, (Stmt, Expr)):
+            ast = getattr(item, "_ast", None)
+            if ast is None:
+                pending.extend(vars(item).values())
+            else:
+                # A cursor into a flat syntax tree, which only holds the
+                # fields read so far, so they come from its kind.
+                from flat_ast import _KINDS
+
+                kind = _KINDS[ast.kinds[item.index]]
+                pending.extend(getattr(item, name) for name, _ in kind.fields)
+    return None
+
+
+def start_of(node: object) -> Token | None:
+    """The token node starts with, None for one without any tokens, like a
+    block a pass made up."""
+    # Set by the parser on the statements that may have no token of their
+    # own, like `while (true) {}`.
+    start: Token | None = getattr(node, "start", None)
+    if start is not None:
+        return start
+    return token_of(node)
+
+
+def line_of(stmt: Stmt) -> int | None:
+    """The line stmt starts on, None for one without any tokens."""
+    token: Token | None = start_of(stmt)
+    return token.line if token is not None else None
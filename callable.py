@@ -1,8 +1,8 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING
-import time
+from collections.abc import Callable, Sequence
 
+from type_checking import TYPE_CHECKING
 from Stmt import Function
 from lox_return import LoxReturn
 from environment import Environment
@@ -13,46 +13,81 @@ if TYPE_CHECKING:
 
 
 class LoxCallable(ABC):
+    """Anything a Lox program can call.
+
+    Calls check `arity_count`, which every callable sets once up front, as
+    the test for being callable at all, so they need neither an isinstance
+    check nor a call to arity(). The arguments are a tuple.
+    """
+
+    arity_count: int = 0
+
     @abstractmethod
-    def call(self, interpreter: Interpreter, arguments: list[object]) -> object:
+    def call(self, interpreter: Interpreter, arguments: Sequence[object]) -> object:
         pass
 
-    @abstractmethod
     def arity(self) -> int:
-        pass
+        return self.arity_count
 
 
 class LoxFunction(LoxCallable):
-    def __init__(self, declaration: Function, closure: Environment) -> None:
+    def __init__(
+        self, declaration: Function, closure: Environment, is_initializer: bool = False
+    ) -> None:
         self.declaration = declaration
         self.closure = closure
-
-    def call(self, interpreter: Interpreter, arguments: list[object]) -> object:
-        environment: Environment = Environment(self.closure)
-
-        for i, param in enumerate(self.declaration.params):
-            environment.define(param.lexeme, arguments[i])
-
+        self.params: tuple[str, ...] = tuple(param.lexeme for param in declaration.params)
+        self.arity_count = len(self.params)
+        # An initializer returns the instance it was called on, whatever it returns.
+        self.is_initializer = is_initializer
+        # Calls plus loop iterations so far, for tiering up to the JIT.
+        self.hotness: int = 0
+        self.compiled = None
+
+    def call(
+        self, interpreter: Interpreter, arguments: Sequence[object], this: object = None
+    ) -> object:
+        """this is the instance a method is called on, None for functions."""
+        if self.compiled is not None:
+            return self.compiled(interpreter, self.closure, *arguments)
+
+        jit = interpreter.jit
+        if jit is not None and self.hotness >= jit.threshold and jit.compile(self):
+            return self.compiled(interpreter, self.closure, *arguments)
+
+        environment: Environment = Environment(
+            self.closure, self.declaration, dict(zip(self.params, arguments))
+        )
+        if this is not None:
+            environment.define("this", this)
+
+        backedges: int = interpreter.backedges
         try:
             interpreter._execute_block(self.declaration.body, environment)
         except LoxReturn as r:
+            if self.is_initializer:
+                return this
             return r.value
+        finally:
+            self.hotness += 1 + interpreter.backedges - backedges
 
+        if self.is_initializer:
+            return this
         return None
 
-    def arity(self) -> int:
-        return len(self.declaration.params)
-
     def __str__(self) -> str:
         return f"<fn {self.declaration.name.lexeme}>"
 
 
-class LoxClock(LoxCallable):
-    def call(self, interpreter: Interpreter, arguments: list[object]) -> object:
-        return time.time()
+class LoxNative(LoxCallable):
+    """A function written in Python, called with the arguments alone."""
 
-    def arity(self) -> int:
-        return 0
+    def __init__(self, arity: int, function: Callable[..., object]) -> None:
+        self.arity_count = arity
+        self.function = function
+
+    def call(self, interpreter: Interpreter, arguments: Sequence[object]) -> object:
+        return self.function(*arguments)
 
     def __str__(self) -> str:
         return "<native fn>"
@@ -0,0 +1,286 @@
+from walker import AstWalker
+from error import ErrorHandler
+from Stmt import Stmt, Block, Var, Function, If, While, Break, Return, Import, Class
+from Expr import Assign, Variable, Logical, Ternary
+from lazy_function import LazyFunction, is_unparsed
+
+
+class InitializedVariable(Variable):
+    """A variable read the analysis proved can never see an uninitialized value.
+
+    The interpreter reads it without checking for the sentinel `var x;`
+    leaves behind. Plain Variable nodes keep the check.
+    """
+
+    def accept(self, visitor):
+        return visitor.visit_initialized_expr(self)
+
+
+# What is known about a variable declared without an initializer at some point.
+_UNASSIGNED = "unassigned"
+_MAYBE = "maybe"
+
+# Variables not in a state are assigned, and None is the state of code that
+# can't be reached.
+State = dict[tuple[int, str], str] | None
+
+
+class DefiniteAssignment(AstWalker):
+    """Static pass that finds the variable reads that can't be uninitialized.
+
+    Within a function it follows the control flow, tracking for every
+    variable declared without an initializer whether it is unassigned, maybe
+    assigned or assigned. Declarations are tracked in order, so a read before
+    a declaration in the same scope resolves further out like the
+    environment chain would. Reads of assigned variables become
+    InitializedVariable nodes. Reading an unassigned one is reported as an
+    error, since it fails whenever it runs.
+
+    A nested function can run at any time, so its free variables are only
+    known to be initialized if no enclosing scope declares them without an
+    initializer, and a variable it assigns to is never unassigned in the
+    functions around it. Loops count everything their condition and body
+    assign as maybe assigned before the first iteration. Without
+    `known_globals`, as in the REPL, a free variable may be a global an
+    earlier run left uninitialized, so free reads keep their check.
+    """
+
+    def __init__(self, error_handler: ErrorHandler | None, known_globals: bool = True) -> None:
+        # Lazy bodies are analyzed at run time, where an error can't be reported.
+        self._error_handler = error_handler
+        # Names declared so far by each scope of the current function.
+        self._scopes: list[set[str]] = []
+        # Names each of those scopes declares without an initializer anywhere in it.
+        self._uninitialized: list[set[str]] = []
+        # Keyed by scope depth and name, the variables that aren't assigned yet.
+        self._state: State = {}
+        # Names that may be uninitialized outside the current function, None for any.
+        self._outer: frozenset[str] | None = frozenset() if known_globals else None
+        # Names functions nested in the current one assign to.
+        self._assigned_inside: set[str] = set()
+        # The states at the break statements of each enclosing loop.
+        self._breaks: list[list[State]] = []
+
+    def analyze(self, statements: list[Stmt]) -> list[Stmt]:
+        self._body([], statements)
+        return statements
+
+    def analyze_body(self, function: LazyFunction, body: list[Stmt]) -> list[Stmt]:
+        """Analyze the body of a lazy function once it has been parsed."""
+        self._outer = function.uninitialized
+        self._body(function.params, body)
+        return body
+
+    def _body(self, params: list, statements: list[Stmt]) -> None:
+        self._scopes = [{param.lexeme for param in params}]
+        self._uninitialized = [_declared_uninitialized(statements)]
+        self._state = {}
+        self._assigned_inside = _assigned_in_functions(statements)
+        self._breaks = []
+        self.walk(statements)
+
+    def visit_block_stmt(self, stmt: Block):
+        self._scopes.append(set())
+        self._uninitialized.append(_declared_uninitialized(stmt.statements))
+        super().visit_block_stmt(stmt)
+        self._uninitialized.pop()
+        self._scopes.pop()
+        depth: int = len(self._scopes)
+        if self._state:
+            self._state = {key: value for key, value in self._state.items() if key[0] != depth}
+
+    def visit_var_stmt(self, stmt: Var):
+        super().visit_var_stmt(stmt)
+        name: str = stmt.name.lexeme
+        self._scopes[-1].add(name)
+        if self._state is None:
+            return
+        key = (len(self._scopes) - 1, name)
+        if stmt.initializer is not None:
+            self._state.pop(key, None)
+        elif name in self._assigned_inside:
+            self._state[key] = _MAYBE
+        else:
+            self._state[key] = _UNASSIGNED
+
+    def visit_function_stmt(self, stmt: Function):
+        self._declare(stmt.name.lexeme)
+        self._function(stmt)
+
+    def visit_class_stmt(self, stmt: Class):
+        self._walk_expr(stmt.superclass)
+        self._declare(stmt.name.lexeme)
+        for method in stmt.methods:
+            self._function(method)
+
+    def visit_import_stmt(self, stmt: Import):
+        self._declare(stmt.name.lexeme)
+
+    def _declare(self, name: str) -> None:
+        """Declare a name bound to a value straight away."""
+        self._scopes[-1].add(name)
+        if self._state:
+            self._state.pop((len(self._scopes) - 1, name), None)
+
+    def _function(self, stmt: Function) -> None:
+        outer: frozenset[str] | None = None
+        if self._outer is not None:
+            outer = self._outer.union(*self._uninitialized)
+        if is_unparsed(stmt):
+            stmt.uninitialized = outer
+            return
+
+        saved = (
+            self._scopes, self._uninitialized, self._state, self._outer,
+            self._assigned_inside, self._breaks,
+        )
+        self._outer = outer
+        self._body(stmt.params, stmt.body)
+        (
+            self._scopes, self._uninitialized, self._state, self._outer,
+            self._assigned_inside, self._breaks,
+        ) = saved
+
+    def visit_if_stmt(self, stmt: If):
+        self._walk_expr(stmt.condition)
+        before: State = _copy(self._state)
+        self._walk_stmt(stmt.then_branch)
+        after_then: State = self._state
+        self._state = before
+        self._walk_stmt(stmt.else_branch)
+        self._state = _join(after_then, self._state)
+
+    def visit_while_stmt(self, stmt: While):
+        if self._state:
+            # Whatever an iteration assigns may be assigned by an earlier one.
+            assigned: set[str] = _assigned(stmt)
+            self._state = {
+                key: _MAYBE if key[1] in assigned else value for key, value in self._state.items()
+            }
+        self._walk_expr(stmt.condition)
+        exit_state: State = _copy(self._state)
+        self._breaks.append([])
+        self._walk_stmt(stmt.body)
+        depth: int = len(self._scopes)
+        for state in self._breaks.pop():
+            if state is not None:
+                # Leave out the scopes inside the loop the break was in.
+                state = {key: value for key, value in state.items() if key[0] < depth}
+            exit_state = _join(exit_state, state)
+        self._state = exit_state
+
+    def visit_break_stmt(self, stmt: Break):
+        self._breaks[-1].append(self._state)
+        self._state = None
+
+    def visit_return_stmt(self, stmt: Return):
+        super().visit_return_stmt(stmt)
+        self._state = None
+
+    def visit_logical_expr(self, expr: Logical):
+        self._walk_expr(expr.left)
+        before: State = _copy(self._state)
+        self._walk_expr(expr.right)
+        self._state = _join(before, self._state)
+
+    def visit_ternary_expr(self, expr: Ternary):
+        self._walk_expr(expr.condition)
+        before: State = _copy(self._state)
+        self._walk_expr(expr.left)
+        after_left: State = self._state
+        self._state = before
+        self._walk_expr(expr.right)
+        self._state = _join(after_left, self._state)
+
+    def visit_assign_expr(self, expr: Assign):
+        super().visit_assign_expr(expr)
+        depth: int | None = self._depth(expr.name.lexeme)
+        if depth is not None and self._state:
+            self._state.pop((depth, expr.name.lexeme), None)
+
+    def visit_variable_expr(self, expr: Variable):
+        name: str = expr.name.lexeme
+        depth: int | None = self._depth(name)
+        if depth is None:
+            # Free, so declared by an enclosing function or a global.
+            if self._outer is not None and name not in self._outer:
+                expr.__class__ = InitializedVariable
+            return
+        if self._state is None:
+            # Can't be reached, leave the check in.
+            return
+
+        status: str | None = self._state.get((depth, name))
+        if status is None:
+            expr.__class__ = InitializedVariable
+        elif status == _UNASSIGNED and self._error_handler is not None:
+            self._error_handler.error(expr.name, "Can't read a variable before it is assigned.")
+
+    def _depth(self, name: str) -> int | None:
+        """The depth of the innermost scope of the current function that has
+        declared name so far, None if it hasn't been."""
+        for depth in range(len(self._scopes) - 1, -1, -1):
+            if name in self._scopes[depth]:
+                return depth
+        return None
+
+
+class _Assignments(AstWalker):
+    """The names assigned to by what it walks, nested functions only if
+    `nested_only`, in which case the identifiers of lazy bodies count too."""
+
+    def __init__(self, nested_only: bool = False) -> None:
+        self.names: set[str] = set()
+        self._nested_only = nested_only
+        self._functions = 0
+
+    def visit_function_stmt(self, stmt: Function):
+        if is_unparsed(stmt):
+            self.names |= stmt.identifiers
+            return
+        self._functions += 1
+        super().visit_function_stmt(stmt)
+        self._functions -= 1
+
+    def visit_assign_expr(self, expr: Assign):
+        if self._functions or not self._nested_only:
+            self.names.add(expr.name.lexeme)
+        super().visit_assign_expr(expr)
+
+
+def _assigned(loop: While) -> set[str]:
+    assignments = _Assignments()
+    assignments._walk_expr(loop.condition)
+    assignments._walk_stmt(loop.body)
+    return assignments.names
+
+
+def _assigned_in_functions(statements: list[Stmt]) -> set[str]:
+    assignments = _Assignments(nested_only=True)
+    assignments.walk(statements)
+    return assignments.names
+
+
+def _declared_uninitialized(statements: list[Stmt]) -> set[str]:
+    return {
+        statement.name.lexeme
+        for statement in statements
+        if isinstance(statement, Var) and statement.initializer is None
+    }
+
+
+def _copy(state: State) -> State:
+    return None if state is None else dict(state)
+
+
+def _join(a: State, b: State) -> State:
+    """The state where two paths of control flow meet."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    joined: dict[tuple[int, str], str] = {}
+    for key in a.keys() | b.keys():
+        # Missing from one means assigned there.
+        joined[key] = a[key] if a.get(key) == b.get(key) else _MAYBE
+    return joined
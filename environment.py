@@ -8,25 +8,43 @@ class Environment:
 
 
 class Environment:
-    def __init__(self, enclosing: Environment | None = None):
+    def __init__(
+        self,
+        enclosing: Environment | None = None,
+        scope: object | None = None,
+        values: dict[str, object] | None = None,
+    ):
         self._enclosing = enclosing
-        self._values: dict[str, object] = {}
+        self._values: dict[str, object] = {} if values is None else values
+        # The Block or Function node whose execution created this scope.
+        self.scope = scope
 
     def define(self, name: str, value: object) -> None:
         self._values[name] = value
 
     def get(self, name: Token) -> object:
+        """The value of name, which may be UNINITIALIZED. Only reads the
+        definite assignment analysis proved safe use this."""
         try:
-            value = self._values[name.lexeme]
-            if isinstance(value, Unitialized):
-                raise LoxRuntimeError(name, f"Uninitialized variable '{name.lexeme}'.")
-            return value
+            return self._values[name.lexeme]
         except KeyError:
             if self._enclosing is not None:
                 return self._enclosing.get(name)
 
             raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
 
+    def get_checked(self, name: Token) -> object:
+        value = self.get(name)
+        if value is UNINITIALIZED:
+            raise LoxRuntimeError(name, f"Uninitialized variable '{name.lexeme}'.")
+        return value
+
+    def variables(self) -> dict[str, object]:
+        """The names visible from here and their values, for debuggers."""
+        values: dict[str, object] = {} if self._enclosing is None else self._enclosing.variables()
+        values.update(self._values)
+        return values
+
     def assign(self, name: Token, value: object) -> None:
         if name.lexeme in self._values.keys():
             self._values[name.lexeme] = value
@@ -38,6 +56,75 @@ class Environment:
 
         raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
 
+    def capture(self, scopes: frozenset | None) -> Environment:
+        """Return the chain a closure needs, keeping only the listed scopes.
+
+        `scopes` holds the scope nodes that declare a name the closure refers
+        to, or None to keep everything. The globals are always kept. Kept scopes
+        are shared, not copied, so assignments through the closure stay visible
+        to everyone.
+        """
+        if scopes is None:
+            return self
+
+        chain: list[Environment] = []
+        environment = self
+        while environment._enclosing is not None:
+            chain.append(environment)
+            environment = environment._enclosing
+
+        captured: Environment = environment
+        fully_kept = True
+        for environment in reversed(chain):
+            if environment.scope not in scopes:
+                fully_kept = False
+            elif fully_kept:
+                # Everything outside this scope is kept too so it can be reused.
+                captured = environment
+            else:
+                view = Environment(captured, environment.scope)
+                view._values = environment._values
+                captured = view
+
+        return captured
+
+
+class GlobalEnvironment(Environment):
+    """The outermost environment, which can report changes to watched names.
+
+    Compiled code bakes in some globals and watches them to find out when
+    that stops being valid.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._watchers: dict[str, list] = {}
+
+    def watch(self, name: str, callback) -> None:
+        self._watchers.setdefault(name, []).append(callback)
+
+    def define(self, name: str, value: object) -> None:
+        self._values[name] = value
+        if name in self._watchers:
+            self._changed(name)
+
+    def assign(self, name: Token, value: object) -> None:
+        super().assign(name, value)
+        if name.lexeme in self._watchers:
+            self._changed(name.lexeme)
+
+    def _changed(self, name: str) -> None:
+        for callback in self._watchers.pop(name):
+            callback()
+
 
 class Unitialized:
-    pass
+    """The value of a variable declared without an initializer, until it is
+    assigned. There is only the one, UNINITIALIZED."""
+
+    def __reduce__(self):
+        # Snapshots load it as the same object.
+        return "UNINITIALIZED"
+
+
+UNINITIALIZED = Unitialized()
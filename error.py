@@ -1,11 +1,16 @@
+from io import TextIOBase
+
 from ttoken import Token
 from tokentype import TokenType
 
 
 class ErrorHandler:
-    def __init__(self):
+    def __init__(self, out: TextIOBase | None = None):
+        # Where errors are reported, stdout if None.
+        self.out = out
         self.had_error = False
         self.had_runtime_error = False
+        self.runtime_exit_status = 70
 
     def error(self, token: Token, message: str) -> None:
         if isinstance(token, Token):
@@ -17,15 +22,23 @@ class ErrorHandler:
             self.report(token, "", message)
 
     def runtime_error(self, error):
-        print(f"{error}\n[line {error.token.line}]")
+        if error.token is None:
+            # Raised where no statement around it has a token.
+            print(error, file=self.out)
+        else:
+            print(f"{error}\n[line {error.token.line}]", file=self.out)
         self.had_runtime_error = True
+        self.runtime_exit_status = error.exit_status
 
     def report(self, line: int, where: str, message: str) -> None:
-        print(f"[line {line}] Error{where}: {message}")
+        print(f"[line {line}] Error{where}: {message}", file=self.out)
         self.had_error = True
 
 
 class LoxRuntimeError(RuntimeError):
+    # What the script exits with when this ends it.
+    exit_status = 70
+
     def __init__(self, token: Token, *args):
         super().__init__(*args)
         self.token = token
@@ -0,0 +1,554 @@
+import inspect
+import struct
+import sys
+from array import array
+
+import Expr
+import Stmt
+from ttoken import Token
+from tokentype import TokenType
+from quickening import QuickenedBinary, UnspecializedBinary, QUICKENED
+
+
+class FlatAstError(Exception):
+    pass
+
+
+# How a field of a node is stored in its slot.
+_NODE = 0  # index of the child node, -1 for None
+_NODES = 1  # position in the slots of a count followed by node indices
+_TOKEN = 2  # index into the token arrays, -1 for None
+_TOKENS = 3  # position in the slots of a count followed by token indices
+_LITERAL = 4  # index into the literal arrays
+
+# Kinds of literal values.
+_NIL = 0
+_FALSE = 1
+_TRUE = 2
+_NUMBER = 3
+_STRING = 4
+
+_TOKEN_TYPES: list[TokenType] = list(TokenType)
+_TOKEN_TYPE_INDEX: dict[TokenType, int] = {
+    token_type: index for index, token_type in enumerate(_TOKEN_TYPES)
+}
+
+_MAGIC = b"LOXA"
+_VERSION = 1
+_BYTEORDER = {"little": 0, "big": 1}[sys.byteorder]
+
+# Names and typecodes of the arrays, in the order they are serialized.
+_ARRAYS: tuple[tuple[str, str], ...] = (
+    ("kinds", "B"),
+    ("first", "i"),
+    ("slots", "i"),
+    ("token_types", "B"),
+    ("token_lines", "i"),
+    ("token_offsets", "i"),
+    ("token_lexemes", "i"),
+    ("token_literals", "i"),
+    ("literal_kinds", "B"),
+    ("literal_numbers", "d"),
+    ("literal_strings", "i"),
+    ("string_ends", "i"),
+    ("strings", "B"),
+)
+_HEADER = struct.Struct(f"=4sBBxxi{len(_ARRAYS)}i")
+
+
+def _field_type(annotation: object) -> int:
+    if annotation is Token:
+        return _TOKEN
+    if annotation == list[Token]:
+        return _TOKENS
+    if inspect.isclass(annotation) and issubclass(annotation, (Expr.Expr, Stmt.Stmt)):
+        return _NODE
+    if getattr(annotation, "__origin__", None) is list:
+        (item,) = annotation.__args__
+        if inspect.isclass(item) and issubclass(item, (Expr.Expr, Stmt.Stmt)):
+            return _NODES
+    return _LITERAL
+
+
+def _node_classes() -> list[type]:
+    classes: list[type] = []
+    for module, base in ((Expr, Expr.Expr), (Stmt, Stmt.Stmt)):
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__ and cls is not base and issubclass(cls, base):
+                classes.append(cls)
+    return classes
+
+
+class Cursor:
+    """A node of a FlatAst.
+
+    It has the attributes and the `accept` of the node class it stands for,
+    and counts as an instance of it, so visitors and the Interpreter walk it
+    like the object tree. A FlatAst makes one cursor per node, and a field
+    is only read from the arrays the first time. The annotations static
+    passes set come from the tree's side tables, and read as their defaults,
+    which keep every scope, in a tree read back from bytes.
+    """
+
+    __slots__ = ("_ast", "index")
+
+    def __init__(self, ast: "FlatAst", index: int) -> None:
+        self._ast = ast
+        self.index = index
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, Cursor) and self._ast is other._ast and self.index == other.index
+        )
+
+    def __hash__(self) -> int:
+        return hash((id(self._ast), self.index))
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.index}>"
+
+
+class _Field:
+    """Reads a field from the arrays, then leaves the value on the cursor,
+    where later reads find it first."""
+
+    __slots__ = ("name", "read")
+
+    def __init__(self, name: str, read) -> None:
+        self.name = name
+        self.read = read
+
+    def __get__(self, cursor: Cursor | None, owner: type | None = None):
+        if cursor is None:
+            return self
+        value = self.read(cursor)
+        cursor.__dict__[self.name] = value
+        return value
+
+
+def _reader(name: str, position: int, field_type: int) -> _Field:
+    if field_type == _NODE:
+        def read(cursor: Cursor):
+            ast = cursor._ast
+            return ast.node(ast.slots[ast.first[cursor.index] + position])
+    elif field_type == _NODES:
+        def read(cursor: Cursor):
+            ast = cursor._ast
+            start = ast.slots[ast.first[cursor.index] + position]
+            return [ast.node(child) for child in ast.slots[start + 1:start + 1 + ast.slots[start]]]
+    elif field_type == _TOKEN:
+        def read(cursor: Cursor):
+            ast = cursor._ast
+            return ast.token(ast.slots[ast.first[cursor.index] + position])
+    elif field_type == _TOKENS:
+        def read(cursor: Cursor):
+            ast = cursor._ast
+            start = ast.slots[ast.first[cursor.index] + position]
+            return [ast.token(token) for token in ast.slots[start + 1:start + 1 + ast.slots[start]]]
+    else:
+        def read(cursor: Cursor):
+            ast = cursor._ast
+            return ast.literal(ast.slots[ast.first[cursor.index] + position])
+    return _Field(name, read)
+
+
+class _Kind:
+    def __init__(self, index: int, node_class: type) -> None:
+        self.index = index
+        self.node_class = node_class
+        parameters = list(inspect.signature(node_class.__init__).parameters.values())[1:]
+        self.fields: list[tuple[str, int]] = [
+            (parameter.name, _field_type(parameter.annotation)) for parameter in parameters
+        ]
+
+        # Whatever __init__ sets beyond the fields are pass annotations.
+        prototype = node_class(*[None] * len(self.fields))
+        defaults = {
+            name: value
+            for name, value in vars(prototype).items()
+            if name not in dict(self.fields)
+        }
+
+        self.defaults: dict[str, object] = defaults
+
+        namespace: dict[str, object] = {"accept": node_class.accept, **defaults}
+        for position, (name, field_type) in enumerate(self.fields):
+            namespace[name] = _reader(name, position, field_type)
+        self.cursor_class: type = type(f"{node_class.__name__}Cursor", (Cursor,), namespace)
+        # So isinstance checks on nodes hold for cursors too.
+        node_class.register(self.cursor_class)
+        # Cursors for the subclasses static passes turn nodes into, by class.
+        self.pass_cursor_classes: dict[type, type] = {}
+
+    def pass_cursor_class(self, node_class: type) -> type:
+        cursor_class: type | None = self.pass_cursor_classes.get(node_class)
+        if cursor_class is None:
+            namespace: dict[str, object] = {"accept": node_class.accept}
+            # Node classes it refers to, like the one it goes back to, as cursors.
+            for name, value in vars(node_class).items():
+                if isinstance(value, type) and value in _KIND_OF:
+                    namespace[name] = _KIND_OF[value].cursor_class
+            cursor_class = type(f"{node_class.__name__}Cursor", (self.cursor_class,), namespace)
+            node_class.register(cursor_class)
+            self.pass_cursor_classes[node_class] = cursor_class
+        return cursor_class
+
+
+_KINDS: list[_Kind] = [_Kind(index, cls) for index, cls in enumerate(_node_classes())]
+_KIND_OF: dict[type, _Kind] = {kind.node_class: kind for kind in _KINDS}
+
+
+def _quickened_cursors(kind: _Kind) -> dict[type, type]:
+    """Cursors of kind's class, a Binary, for each class quickening
+    rewrites Binary nodes into."""
+    classes: dict[type, type] = {}
+    for specialization in QUICKENED[kind.node_class]:
+        namespace: dict[str, object] = {
+            name: getattr(specialization, name)
+            for name in ("accept", "operand_type", "operation")
+            if hasattr(specialization, name)
+        }
+        # Named like the node class, so quickening reports count both.
+        classes[specialization] = type(specialization.__name__, (kind.cursor_class,), namespace)
+        specialization.register(classes[specialization])
+    for cursor_class in classes.values():
+        cursor_class.unspecialized = classes[UnspecializedBinary]
+    return classes
+
+
+QUICKENED[_KIND_OF[Expr.Binary].cursor_class] = _quickened_cursors(_KIND_OF[Expr.Binary])
+
+
+class FlatAst:
+    """A syntax tree stored in parallel arrays instead of node objects.
+
+    Node i has kind `kinds[i]` and its fields in `slots`, starting at
+    `first[i]`. Tokens and literal values are rows of their own arrays and
+    all text is one UTF-8 buffer. The arrays are written out as is, and can
+    be read back from any buffer without copying, such as shared memory.
+
+    What the static passes added to the tree it was flattened from is kept
+    in side tables next to the arrays: per node, the pass subclass it was
+    turned into and the annotations that differ from their defaults. They
+    are only in memory and aren't written out.
+    """
+
+    def __init__(
+        self,
+        arrays: dict[str, object],
+        roots: int,
+        classes: dict[int, type] | None = None,
+        annotations: dict[int, dict[str, tuple[int, object]]] | None = None,
+    ) -> None:
+        for name, _ in _ARRAYS:
+            setattr(self, name, arrays[name])
+        # Position in the slots of the top level statements.
+        self._roots = roots
+        self._classes: dict[int, type] = classes or {}
+        # Per node, its annotations, each stored like a field.
+        self._annotations: dict[int, dict[str, tuple[int, object]]] = annotations or {}
+        self._cursors: list[Cursor | None] = [None] * len(self.kinds)
+        self._tokens: list[Token | None] = [None] * len(self.token_types)
+        self._strings: dict[int, str] = {}
+        # Views into a buffer the arrays were read from, see release.
+        self._views: list[memoryview] = []
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @property
+    def statements(self) -> list[Cursor]:
+        start = self._roots
+        return [self.node(index) for index in self.slots[start + 1:start + 1 + self.slots[start]]]
+
+    def node(self, index: int) -> Cursor | None:
+        if index < 0:
+            return None
+        cursor = self._cursors[index]
+        if cursor is None:
+            kind = _KINDS[self.kinds[index]]
+            node_class: type | None = self._classes.get(index)
+            if node_class is None:
+                cursor = kind.cursor_class(self, index)
+            else:
+                cursor = kind.pass_cursor_class(node_class)(self, index)
+            # Before the annotations, which can refer back to it.
+            self._cursors[index] = cursor
+            for name, (field_type, value) in self._annotations.get(index, {}).items():
+                setattr(cursor, name, self._annotation(field_type, value))
+        return cursor
+
+    def _annotation(self, field_type: int, value: object) -> object:
+        if field_type == _NODE:
+            return self.node(value)
+        if field_type == _NODES:
+            return frozenset(self.node(index) for index in value)
+        if field_type == _TOKEN:
+            return self.token(value)
+        return value
+
+    def token(self, index: int) -> Token | None:
+        if index < 0:
+            return None
+        token = self._tokens[index]
+        if token is None:
+            token = Token(
+                _TOKEN_TYPES[self.token_types[index]],
+                self.string(self.token_lexemes[index]),
+                self.literal(self.token_literals[index]),
+                self.token_lines[index],
+                self.token_offsets[index],
+            )
+            self._tokens[index] = token
+        return token
+
+    def literal(self, index: int) -> object:
+        if index < 0:
+            return None
+        kind = self.literal_kinds[index]
+        if kind == _NUMBER:
+            return self.literal_numbers[index]
+        if kind == _STRING:
+            return self.string(self.literal_strings[index])
+        return (None, False, True)[kind]
+
+    def string(self, index: int) -> str:
+        text = self._strings.get(index)
+        if text is None:
+            start = self.string_ends[index - 1] if index > 0 else 0
+            text = bytes(self.strings[start:self.string_ends[index]]).decode("utf-8")
+            self._strings[index] = text
+        return text
+
+    def inflate(self) -> list[Stmt.Stmt]:
+        """Rebuild the node objects."""
+        return [self._inflate(cursor) for cursor in self.statements]
+
+    def _inflate(self, value: object) -> object:
+        if isinstance(value, Cursor):
+            kind = _KINDS[self.kinds[value.index]]
+            return kind.node_class(
+                *[self._inflate(getattr(value, name)) for name, _ in kind.fields]
+            )
+        if isinstance(value, list):
+            return [self._inflate(item) for item in value]
+        return value
+
+    def to_bytes(self) -> bytes:
+        arrays = [getattr(self, name) for name, _ in _ARRAYS]
+        header = _HEADER.pack(
+            _MAGIC, _VERSION, _BYTEORDER, self._roots, *[len(values) for values in arrays]
+        )
+        chunks = [header, bytes(_padding(len(header)))]
+        for values in arrays:
+            data = bytes(values)
+            chunks.append(data)
+            chunks.append(bytes(_padding(len(data))))
+        return b"".join(chunks)
+
+    @classmethod
+    def from_buffer(cls, buffer) -> "FlatAst":
+        """Read a FlatAst from to_bytes output, without copying the arrays."""
+        view = memoryview(buffer).cast("B")
+        if len(view) < _HEADER.size:
+            raise FlatAstError("Truncated syntax tree.")
+        magic, version, byteorder, roots, *lengths = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION or byteorder != _BYTEORDER:
+            raise FlatAstError("Not a syntax tree this version can read.")
+
+        views: list[memoryview] = [view]
+        arrays: dict[str, object] = {}
+        position = _HEADER.size + _padding(_HEADER.size)
+        for (name, typecode), length in zip(_ARRAYS, lengths):
+            size = length * array(typecode).itemsize
+            if position + size > len(view):
+                raise FlatAstError("Truncated syntax tree.")
+            data = view[position:position + size]
+            arrays[name] = data.cast(typecode)
+            views += [data, arrays[name]]
+            position += size + _padding(size)
+
+        ast = cls(arrays, roots)
+        ast._views = views
+        return ast
+
+    def release(self) -> None:
+        """Let go of the buffer the tree was read from, it can't be used after."""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "FlatAst":
+        with open(path, "rb") as f:
+            return cls.from_buffer(f.read())
+
+    def share(self) -> "shared_memory.SharedMemory":
+        """Copy the tree into new shared memory other processes can attach to."""
+        from multiprocessing import shared_memory
+
+        data = self.to_bytes()
+        memory = shared_memory.SharedMemory(create=True, size=len(data))
+        memory.buf[:len(data)] = data
+        return memory
+
+    @classmethod
+    def attach(cls, name: str) -> tuple["FlatAst", "shared_memory.SharedMemory"]:
+        """Read the tree from shared memory.
+
+        Keep the memory open while the tree is used, and release the tree
+        before closing it.
+        """
+        from multiprocessing import shared_memory
+
+        memory = shared_memory.SharedMemory(name=name)
+        return cls.from_buffer(memory.buf), memory
+
+
+def _padding(size: int) -> int:
+    return -size % 8
+
+
+class _Flattener:
+    def __init__(self) -> None:
+        self._arrays: dict[str, array] = {name: array(typecode) for name, typecode in _ARRAYS}
+        self._tokens: dict[int, int] = {}
+        self._strings: dict[str, int] = {}
+        # The index of every node flattened, by id.
+        self._nodes: dict[int, int] = {}
+        self._classes: dict[int, type] = {}
+        self._annotations: dict[int, dict[str, tuple[int, object]]] = {}
+
+    def flatten(self, statements: list[Stmt.Stmt]) -> FlatAst:
+        roots = self._list([self._node(statement) for statement in statements])
+        return FlatAst(self._arrays, roots, self._classes, self._annotations)
+
+    def _node(self, node: object) -> int:
+        if node is None:
+            return -1
+        kind = next(_KIND_OF[cls] for cls in type(node).__mro__ if cls in _KIND_OF)
+        # Quickened and lazy nodes are stored as the class they specialize,
+        # the classes static passes turn nodes into as themselves.
+        node_class: type = type(node)
+        if node_class.accept is kind.node_class.accept or issubclass(
+            node_class, (QuickenedBinary, UnspecializedBinary)
+        ):
+            node_class = kind.node_class
+
+        index = len(self._arrays["kinds"])
+        self._nodes[id(node)] = index
+        if node_class is not kind.node_class:
+            self._classes[index] = node_class
+        self._arrays["kinds"].append(kind.index)
+        slots = self._arrays["slots"]
+        start = len(slots)
+        self._arrays["first"].append(start)
+        slots.extend([-1] * len(kind.fields))
+
+        for position, (name, field_type) in enumerate(kind.fields):
+            value = getattr(node, name)
+            if field_type == _NODE:
+                slot = self._node(value)
+            elif field_type == _NODES:
+                slot = self._list([self._node(child) for child in value])
+            elif field_type == _TOKEN:
+                slot = self._token(value)
+            elif field_type == _TOKENS:
+                slot = self._list([self._token(token) for token in value])
+            else:
+                slot = self._literal(value)
+            slots[start + position] = slot
+
+        # After the fields, so the scopes in captures are indexed.
+        annotations: dict[str, tuple[int, object]] = {}
+        fields: dict[str, int] = dict(kind.fields)
+        names = [name for name in vars(node) if name not in fields and name in kind.defaults]
+        names += [name for name in getattr(node_class, "__annotations__", {}) if name not in fields]
+        for name in names:
+            value = vars(node).get(name, kind.defaults.get(name))
+            if name in kind.defaults and value is kind.defaults[name]:
+                continue
+            annotation = self._annotation(value)
+            if annotation is not None:
+                annotations[name] = annotation
+        if annotations:
+            self._annotations[index] = annotations
+        return index
+
+    def _annotation(self, value: object) -> tuple[int, object] | None:
+        """An annotation stored like a field, None if it can't be."""
+        if isinstance(value, Token):
+            return _TOKEN, self._token(value)
+        if isinstance(value, (Expr.Expr, Stmt.Stmt)):
+            index = self._nodes.get(id(value))
+            return _NODE, self._node(value) if index is None else index
+        if isinstance(value, frozenset):
+            # The scopes of a closure.
+            indices = [self._nodes.get(id(scope)) for scope in value]
+            return None if None in indices else (_NODES, tuple(indices))
+        return _LITERAL, value
+
+    def _list(self, indices: list[int]) -> int:
+        slots = self._arrays["slots"]
+        start = len(slots)
+        slots.append(len(indices))
+        slots.extend(indices)
+        return start
+
+    def _token(self, token: Token | None) -> int:
+        if token is None:
+            return -1
+        index = self._tokens.get(id(token))
+        if index is None:
+            index = len(self._arrays["token_types"])
+            self._tokens[id(token)] = index
+            self._arrays["token_types"].append(_TOKEN_TYPE_INDEX[token.token_type])
+            self._arrays["token_lines"].append(token.line)
+            self._arrays["token_offsets"].append(token.offset)
+            self._arrays["token_lexemes"].append(self._string(token.lexeme))
+            self._arrays["token_literals"].append(
+                -1 if token.literal is None else self._literal(token.literal)
+            )
+        return index
+
+    def _literal(self, value: object) -> int:
+        string = -1
+        number = 0.0
+        if value is None:
+            kind = _NIL
+        elif value is False:
+            kind = _FALSE
+        elif value is True:
+            kind = _TRUE
+        elif isinstance(value, (int, float)):
+            kind = _NUMBER
+            number = float(value)
+        elif isinstance(value, str):
+            kind = _STRING
+            string = self._string(value)
+        else:
+            raise FlatAstError(f"Can't store literal {value!r}.")
+
+        index = len(self._arrays["literal_kinds"])
+        self._arrays["literal_kinds"].append(kind)
+        self._arrays["literal_numbers"].append(number)
+        self._arrays["literal_strings"].append(string)
+        return index
+
+    def _string(self, text: str) -> int:
+        index = self._strings.get(text)
+        if index is None:
+            index = len(self._arrays["string_ends"])
+            self._strings[text] = index
+            self._arrays["strings"].frombytes(text.encode("utf-8"))
+            self._arrays["string_ends"].append(len(self._arrays["strings"]))
+        return index
+
+
+def flatten(statements: list[Stmt.Stmt]) -> FlatAst:
+    """Store a tree, lazy function bodies included, as a FlatAst."""
+    return _Flattener().flatten(statements)
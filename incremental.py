@@ -0,0 +1,332 @@
+from bisect import bisect_left
+from collections.abc import Callable
+
+from ttoken import Token
+from tokentype import TokenType
+from Stmt import Stmt, Import
+from error import ErrorHandler
+from scanner import Scanner
+from parser import Parser, ParseError
+from walker import AstWalker
+
+
+# Characters a token looks past its end, in `1.5` from the 1 on.
+_LOOKAHEAD = 2
+
+
+class _Failed:
+    """Stands in for the statement of a declaration whose error recovery ran
+    into the end, which makes the parse of the whole source None."""
+
+
+_FAILED = _Failed()
+
+
+class _Declaration:
+    """A top-level declaration and the tokens it was parsed from.
+
+    Edits before it move it, which only adds to `offset_shift` and
+    `line_shift` until its tokens are read, see Document._settle.
+    """
+
+    __slots__ = ("statement", "tokens", "made_up", "offset_shift", "line_shift")
+
+    def __init__(self, statement: Stmt | None | _Failed, tokens: list[Token]) -> None:
+        self.statement = statement
+        self.tokens = tokens
+        # Tokens in the tree that aren't in the source, which move with it.
+        self.made_up: list[Token] = _made_up_tokens(statement, tokens)
+        self.offset_shift = 0
+        self.line_shift = 0
+
+    @property
+    def start(self) -> int:
+        return self.tokens[0].offset + self.offset_shift
+
+    @property
+    def end(self) -> int:
+        last: Token = self.tokens[-1]
+        return last.offset + len(last.lexeme) + self.offset_shift
+
+    def settle(self) -> None:
+        """Move the tokens to where the edits so far put them."""
+        if self.offset_shift or self.line_shift:
+            for token in self.tokens:
+                token.offset += self.offset_shift
+                token.line += self.line_shift
+            for token in self.made_up:
+                token.offset += self.offset_shift
+                token.line += self.line_shift
+            self.offset_shift = self.line_shift = 0
+
+
+class Document:
+    """A source kept scanned and parsed as it is edited, for editors.
+
+    The tokens and statements are always what scanning and parsing the
+    whole source would give, but an edit only rescans from the declaration
+    before the one it touches until the scanner is back at the start of a
+    token it found before. No token starts inside a string or comment, so
+    that is where the old tokens are right again. Then the declarations
+    the new tokens belong to are parsed again, one at a time, until one
+    ends where an old one did. When the end of the new tokens cuts a
+    declaration short, as an unclosed brace does, more of the declarations
+    after it are taken in, twice as many each time. Declarations after the
+    edit keep their statements, and their tokens are moved to their new
+    lines and offsets only once they are read.
+
+    Opening a string or comment that runs to the end of the source leaves
+    no old token to come back to, so the declarations after it are kept
+    aside until an edit after them, and closing it again comes back to
+    them instead of scanning the rest of the source.
+
+    Errors in what is scanned or parsed again are reported to error_handler
+    as an edit finds them.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        error_handler: ErrorHandler,
+        parser_class: Callable[..., Parser] = Parser,
+    ) -> None:
+        self._error_handler = error_handler
+        self._parser_class = parser_class
+        self.source = source
+        self._declarations: list[_Declaration] = []
+        # The declarations after an edit that opened a string or comment
+        # running to the end, with the EOF and offset shift they go with.
+        # Closing it again finds the scanner back at their tokens.
+        self._swallowed: list[_Declaration] = []
+        self._swallowed_eof: Token | None = None
+        self._swallowed_shift: int = 0
+
+        tokens: list[Token] = Scanner(source, error_handler).scan_tokens()
+        self._eof: Token = tokens.pop()
+        self._declarations = self._parse(tokens, 0)[0]
+
+    @property
+    def tokens(self) -> list[Token]:
+        """The tokens of the source, EOF last."""
+        self._settle()
+        tokens: list[Token] = []
+        for declaration in self._declarations:
+            tokens.extend(declaration.tokens)
+        tokens.append(self._eof)
+        return tokens
+
+    @property
+    def statements(self) -> list[Stmt | None] | None:
+        """The statements of the source, as Parser.parse returns them."""
+        self._settle()
+        statements: list[Stmt | None] = [declaration.statement for declaration in self._declarations]
+        if statements and statements[-1] is _FAILED:
+            return None
+        return statements
+
+    def edit(self, start: int, end: int, text: str) -> list[Stmt | None]:
+        """Replace the source from offset start to end with text, and return
+        the statements of the declarations parsed again."""
+        old: str = self.source
+        self.source = old[:start] + text + old[end:]
+        shift: int = len(text) - (end - start)
+
+        # A declaration that ends right before the edit may have looked at a
+        # token it changes, so scanning restarts one before that.
+        declarations: list[_Declaration] = self._declarations
+        first: int = bisect_left(
+            declarations, start - _LOOKAHEAD, key=lambda declaration: declaration.end
+        )
+        if first > 0:
+            first -= 1
+            declarations[first].settle()
+            restart: Token = declarations[first].tokens[0]
+            offset, line = restart.offset, restart.line - restart.lexeme.count("\n")
+        else:
+            offset, line = 0, 1
+
+        # Swallowed declarations are only right while the edits are before them.
+        swallowed: list[_Declaration] = self._swallowed
+        if swallowed and swallowed[0].start + self._swallowed_shift < end + _LOOKAHEAD:
+            swallowed = self._swallowed = []
+
+        # Scan until a token starts where one did before the edit.
+        scanner: Scanner = Scanner(self.source, self._error_handler)
+        tokens: list[Token] = []
+        last: int = len(declarations)
+        eof: Token = self._eof
+        resynced: bool = False
+        for token in scanner.scan_from(offset, line):
+            if token.token_type == TokenType.EOF:
+                self._eof = token
+                break
+            if token.offset >= start + len(text):
+                found: tuple[int, int] | None = self._find(declarations, token.offset - shift, first)
+                if found is not None:
+                    last, index = found
+                    line_shift: int = self._resume(declarations[last], index, token, shift)
+                    tokens.extend(declarations[last].tokens[index:])
+                    last += 1
+                    # The rest is as it was, only moved.
+                    for declaration in declarations[last:]:
+                        declaration.offset_shift += shift
+                        declaration.line_shift += line_shift
+                    self._eof.offset += shift
+                    self._eof.line += line_shift
+                    resynced = True
+                    break
+                if swallowed:
+                    moved: int = shift + self._swallowed_shift
+                    found = self._find(swallowed, token.offset - moved, 0)
+                    if found is not None:
+                        resumed, index = found
+                        line_shift = self._resume(swallowed[resumed], index, token, moved)
+                        tokens.extend(swallowed[resumed].tokens[index:])
+                        # What was scanned after the edit is replaced by them.
+                        for declaration in swallowed[resumed + 1:]:
+                            declaration.offset_shift += moved
+                            declaration.line_shift += line_shift
+                        declarations[first:] = swallowed[resumed + 1:]
+                        last = first
+                        self._eof = Token(
+                            TokenType.EOF, "", None, self._swallowed_eof.line + line_shift, len(self.source)
+                        )
+                        swallowed = self._swallowed = []
+                        resynced = True
+                        break
+            tokens.append(token)
+
+        if not resynced:
+            # Everything after the edit was scanned into something else.
+            after: int = bisect_left(
+                declarations, end + _LOOKAHEAD, first, key=lambda declaration: declaration.start
+            )
+            if after < len(declarations):
+                self._swallowed = declarations[after:]
+                self._swallowed_eof = eof
+                self._swallowed_shift = shift
+                swallowed = []
+        if swallowed:
+            self._swallowed_shift += shift
+
+        parsed, last = self._parse(tokens, last)
+        self._declarations[first:last] = parsed
+        return [declaration.statement for declaration in parsed]
+
+    @staticmethod
+    def _resume(declaration: _Declaration, index: int, token: Token, shift: int) -> int:
+        """Move the old tokens of declaration from index on to where token
+        found the first of them again, and return how many lines they moved."""
+        declaration.settle()
+        # Not the newlines in the edit, the scanner skips those in comments.
+        line_shift: int = token.line - declaration.tokens[index].line
+        for old_token in declaration.tokens[index:]:
+            old_token.offset += shift
+            old_token.line += line_shift
+        return line_shift
+
+    @staticmethod
+    def _find(declarations: list[_Declaration], offset: int, first: int) -> tuple[int, int] | None:
+        """The index of the declaration from first on, and of its token, that
+        started at offset, None if none did."""
+        found: int = bisect_left(
+            declarations, offset + 1, first, key=lambda declaration: declaration.start
+        ) - 1
+        if found < first:
+            return None
+        declaration: _Declaration = declarations[found]
+        target: int = offset - declaration.offset_shift
+        index: int = bisect_left(declaration.tokens, target, key=lambda token: token.offset)
+        if index < len(declaration.tokens) and declaration.tokens[index].offset == target:
+            return found, index
+        return None
+
+    def _parse(self, tokens: list[Token], following: int) -> tuple[list[_Declaration], int]:
+        """Parse tokens into declarations, up to the first one that ends where
+        the declaration at index `following` starts, taking in the ones after
+        it until one does. Returns the declarations and the index of the
+        first old one left as it is."""
+        declarations: list[_Declaration] = self._declarations
+        parsed: list[_Declaration] = []
+        position: int = 0
+        taken: int = 1
+        while True:
+            if following < len(declarations):
+                declarations[following].settle()
+                lookahead: Token = declarations[following].tokens[0]
+                stream: list[Token] = tokens[position:] + [lookahead, self._eof]
+            else:
+                stream = tokens[position:] + [self._eof]
+            # Where the old declarations take over.
+            boundary: int = len(tokens) - position
+            if boundary == 0 and following < len(declarations):
+                return parsed, following
+
+            errors = _DeferredErrors()
+            parser: Parser = self._parser_class(stream, errors)
+            start: int = 0
+            try:
+                for statement, after in parser.declarations():
+                    if after > boundary:
+                        break
+                    parsed.append(_Declaration(statement, stream[start:after]))
+                    errors.replay(self._error_handler)
+                    start = after
+                    if after == boundary:
+                        return parsed, following
+                else:
+                    return parsed, following
+            except ParseError:
+                if following >= len(declarations):
+                    parsed.append(_Declaration(_FAILED, stream[start:-1]))
+                    errors.replay(self._error_handler)
+                    return parsed, following
+
+            # The declaration at start runs into the old ones, take in more.
+            position += start
+            for declaration in declarations[following:following + taken]:
+                declaration.settle()
+                tokens.extend(declaration.tokens)
+            following += taken
+            taken *= 2
+
+    def _settle(self) -> None:
+        for declaration in self._declarations:
+            declaration.settle()
+
+
+class _DeferredErrors(ErrorHandler):
+    """Holds on to the errors of a declaration until it is known whether it
+    has to be parsed again with more tokens."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._reports: list[tuple[int, str, str]] = []
+
+    def report(self, line: int, where: str, message: str) -> None:
+        self._reports.append((line, where, message))
+        self.had_error = True
+
+    def replay(self, error_handler: ErrorHandler) -> None:
+        for line, where, message in self._reports:
+            error_handler.report(line, where, message)
+        self._reports = []
+
+
+class _ImportNames(AstWalker):
+    def __init__(self) -> None:
+        self.names: list[Token] = []
+
+    def visit_import_stmt(self, stmt: Import):
+        self.names.append(stmt.name)
+
+
+def _made_up_tokens(statement: Stmt | None | _Failed, tokens: list[Token]) -> list[Token]:
+    # The parser names an import after its path, with a token of its own.
+    if not isinstance(statement, Stmt) or all(
+        token.token_type != TokenType.IMPORT for token in tokens
+    ):
+        return []
+    names = _ImportNames()
+    names.walk([statement])
+    return names.names
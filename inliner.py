@@ -0,0 +1,268 @@
+from collections.abc import Iterator
+
+from walker import AstWalker
+from Stmt import Stmt, Block, Var, Function, Return, Import, Class
+from Expr import Expr, Assign, Variable, Call
+from ttoken import Token
+from lazy_function import is_unparsed
+
+
+# Nodes a function's return expression may have to be inlined.
+DEFAULT_MAX_SIZE = 16
+
+
+class InlinedCall(Call):
+    """A call to a small top-level function whose body it evaluates directly.
+
+    The interpreter looks the callee up as usual and only skips the call if
+    it is still the function that was inlined: `function_name` is the name
+    token of its declaration. The arguments are bound to `params` in a fresh
+    environment on the function's closure, where `body` is evaluated, so
+    nothing changes but the cost of the call.
+    """
+
+    function_name: Token
+    params: list[str]
+    body: Expr
+    # What the call goes back to once the JIT compiled the function.
+    uninlined = Call
+
+    def accept(self, visitor):
+        return visitor.visit_inlined_expr(self)
+
+
+class Inliner(AstWalker):
+    """Static pass that inlines calls to tiny top-level functions.
+
+    A function qualifies when its body is a single `return <expr>;` of at
+    most `max_size` nodes, it's declared once at the top level and never
+    assigned, no cycle of top-level functions and classes naming each other
+    leads back to it, and its name is only ever called, never passed
+    around. Calls to it with the right number of arguments, where no local
+    shadows the name, become InlinedCall nodes.
+
+    An Inliner keeps what it did over every program it inlines, for report.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self._max_size = max_size
+        # Per inlined function, how many call sites, and why others weren't inlined.
+        self.inlined: dict[str, int] = {}
+        self.rejected: dict[str, str] = {}
+        self._candidates: dict[str, Function] = {}
+        # Names declared by the enclosing local scopes.
+        self._scopes: list[set[str]] = []
+
+    def inline(self, statements: list[Stmt]) -> list[Stmt]:
+        self._candidates = self._find_candidates(statements)
+        if self._candidates:
+            self.walk(statements)
+        return statements
+
+    def _find_candidates(self, statements: list[Stmt]) -> dict[str, Function]:
+        declarations: dict[str, int] = {}
+        functions: dict[str, Function] = {}
+        # The top-level names each top-level function or class names.
+        names: dict[str, set[str]] = {}
+        for statement in statements:
+            if isinstance(statement, (Var, Function, Import, Class)):
+                name: str = statement.name.lexeme
+                declarations[name] = declarations.get(name, 0) + 1
+                if isinstance(statement, Function) and not is_unparsed(statement):
+                    functions[name] = statement
+                if isinstance(statement, (Function, Class)):
+                    names.setdefault(name, set()).update(_Uses([statement]).referenced)
+
+        candidates: dict[str, Function] = {}
+        uses = _Uses(statements)
+        recursive: set[str] = _recursive(names)
+        for name, function in functions.items():
+            body: list[Stmt] = function.body
+            if len(body) != 1 or not isinstance(body[0], Return) or body[0].value is None:
+                continue
+            reason: str | None = self._reject(function, declarations[name], uses, recursive)
+            if reason is None:
+                candidates[name] = function
+            else:
+                self.rejected[_describe(function)] = reason
+        return candidates
+
+    def _reject(
+        self, function: Function, declarations: int, uses: "_Uses", recursive: set[str]
+    ) -> str | None:
+        name: str = function.name.lexeme
+        body: Return = function.body[0]
+        if declarations > 1:
+            return "declared more than once"
+        if name in uses.assigned:
+            return "assigned to"
+        if name in uses.unparsed:
+            return "named in a function body that isn't parsed yet"
+        if name in uses.escaping:
+            return "used other than by calling it"
+        if name in recursive:
+            return "recursive"
+        if _size(body.value) > self._max_size:
+            return f"larger than {self._max_size} nodes"
+        return None
+
+    def visit_block_stmt(self, stmt: Block):
+        if not stmt.scoped:
+            super().visit_block_stmt(stmt)
+            return
+        self._scopes.append(_declared(stmt.statements))
+        super().visit_block_stmt(stmt)
+        self._scopes.pop()
+
+    def visit_function_stmt(self, stmt: Function):
+        if is_unparsed(stmt):
+            return
+        self._scopes.append({param.lexeme for param in stmt.params} | _declared(stmt.body))
+        super().visit_function_stmt(stmt)
+        self._scopes.pop()
+
+    def visit_class_stmt(self, stmt: Class):
+        for method in stmt.methods:
+            # Methods see `this`, but that can't shadow a function.
+            self.visit_function_stmt(method)
+
+    def visit_call_expr(self, expr: Call):
+        super().visit_call_expr(expr)
+        if type(expr) is not Call or not isinstance(expr.callee, Variable):
+            return
+
+        name: str = expr.callee.name.lexeme
+        function: Function | None = self._candidates.get(name)
+        if function is None or len(expr.arguments) != len(function.params):
+            return
+        if any(name in scope for scope in self._scopes):
+            return
+
+        expr.__class__ = InlinedCall
+        expr.function_name = function.name
+        expr.params = [param.lexeme for param in function.params]
+        expr.body = function.body[0].value
+        key: str = _describe(function)
+        self.inlined[key] = self.inlined.get(key, 0) + 1
+
+    def report(self) -> str:
+        lines: list[str] = ["Inlined functions:"]
+        for name in sorted(self.inlined):
+            lines.append(f"  {name:<30} {self.inlined[name]:>6} call sites")
+        lines.append(f"  {'total':<30} {sum(self.inlined.values()):>6} call sites")
+        if self.rejected:
+            lines.append("  not inlined:")
+            for name in sorted(self.rejected):
+                lines.append(f"    {name}: {self.rejected[name]}")
+        return "\n".join(lines)
+
+
+class _Uses(AstWalker):
+    """Which names the statements assign, refer to, or use as a value
+    rather than a callee."""
+
+    def __init__(self, statements: list[Stmt]) -> None:
+        self.assigned: set[str] = set()
+        self.referenced: set[str] = set()
+        self.escaping: set[str] = set()
+        # Names in lazy bodies, which could be used any of those ways.
+        self.unparsed: set[str] = set()
+        self.walk(statements)
+
+    def visit_function_stmt(self, stmt: Function):
+        if is_unparsed(stmt):
+            self.unparsed |= stmt.identifiers
+        else:
+            super().visit_function_stmt(stmt)
+
+    def visit_assign_expr(self, expr: Assign):
+        self.assigned.add(expr.name.lexeme)
+        super().visit_assign_expr(expr)
+
+    def visit_variable_expr(self, expr: Variable):
+        self.referenced.add(expr.name.lexeme)
+        self.escaping.add(expr.name.lexeme)
+
+    def visit_call_expr(self, expr: Call):
+        if isinstance(expr.callee, Variable):
+            self.referenced.add(expr.callee.name.lexeme)
+        else:
+            self._walk_expr(expr.callee)
+        for argument in expr.arguments:
+            self._walk_expr(argument)
+
+
+class _Size(AstWalker):
+    def __init__(self) -> None:
+        self.nodes = 0
+
+    def _walk_expr(self, expr: Expr | None) -> None:
+        if expr is not None:
+            self.nodes += 1
+            expr.accept(self)
+
+
+def _size(expr: Expr) -> int:
+    size = _Size()
+    size._walk_expr(expr)
+    return size.nodes
+
+
+def _recursive(names: dict[str, set[str]]) -> set[str]:
+    """The names in names that lead back to themselves, directly or through
+    others, found as the strongly connected components of Tarjan's
+    algorithm without recursion."""
+    index: dict[str, int] = {}
+    lowest: dict[str, int] = {}
+    stack: list[str] = []
+    on_stack: set[str] = set()
+    recursive: set[str] = set()
+    for root in names:
+        if root in index:
+            continue
+        index[root] = lowest[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        # Each name being visited, with the names it leads to still to visit.
+        visiting: list[tuple[str, Iterator[str]]] = [(root, iter(names[root]))]
+        while visiting:
+            name, following = visiting[-1]
+            for successor in following:
+                if successor not in names:
+                    continue
+                if successor not in index:
+                    index[successor] = lowest[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    visiting.append((successor, iter(names[successor])))
+                    break
+                if successor in on_stack:
+                    lowest[name] = min(lowest[name], index[successor])
+            else:
+                visiting.pop()
+                if visiting:
+                    caller: str = visiting[-1][0]
+                    lowest[caller] = min(lowest[caller], lowest[name])
+                if lowest[name] == index[name]:
+                    component: list[str] = []
+                    while True:
+                        member: str = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == name:
+                            break
+                    if len(component) > 1 or name in names[name]:
+                        recursive.update(component)
+    return recursive
+
+
+def _declared(statements: list[Stmt]) -> set[str]:
+    return {
+        statement.name.lexeme
+        for statement in statements
+        if isinstance(statement, (Var, Function, Import, Class))
+    }
+
+
+def _describe(function: Function) -> str:
+    return f"{function.name.lexeme} (line {function.name.line})"
@@ -1,22 +1,230 @@
+from __future__ import annotations
+import sys
+import time
+from collections.abc import Callable
+from io import TextIOBase
+
 from visitor import StmtVisitor, ExprVisitor
-from Stmt import Stmt, ExprStmt, Print, Var, If, While, Function, Return
-from Expr import Expr, Binary, Ternary, Grouping, Literal, Unary, Variable, Assign, Logical, Call
+from Stmt import Stmt, Block, ExprStmt, Print, Var, If, While, Function, Return, ForRange, Import, Class
+from Expr import Expr, Binary, Ternary, Grouping, Literal, Unary, Variable, Assign, Logical, Call, Get
+from Expr import Set, This, Super
 from tokentype import TokenType as TT
 from ttoken import Token
 from error import ErrorHandler, LoxRuntimeError, BreakError
-from environment import Environment, Unitialized
-from callable import LoxCallable, LoxFunction, LoxClock
+from environment import Environment, GlobalEnvironment, UNINITIALIZED
+from callable import LoxFunction, LoxNative
 from lox_return import LoxReturn
+from quickening import QuickenedBinary, Quickener, QUICKENED
+from jit import Jit, DEFAULT_THRESHOLD
+from modules import LoxModule
+from lox_class import LoxClass, LoxInstance, BoundMethod, property_entry, field_entry
+from definite_assignment import InitializedVariable
+from type_checking import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from budget import Budget
+    from inliner import InlinedCall
+
+
+# Looked up by `super`, which needs the instance as well as the superclass.
+_THIS = Token(TT.THIS, "this", None, 0)
+
+# Called as hook(event, line, environment, arg) by a traced interpreter.
+TraceHook = Callable[[str, int, Environment, object], object]
+
+# The methods settrace swaps for traced ones.
+_TRACED = ("_execute", "_execute_block", "visit_inlined_expr")
+
+# Python frames a Lox call takes in the tree walker, with some to spare for
+# statements nested in its body.
+_FRAMES_PER_CALL = 16
 
 
 class Interpreter(StmtVisitor, ExprVisitor):
-    def __init__(self, error_handler: ErrorHandler):
+    # Whether interpret and the visit methods are coroutines.
+    is_async = False
+
+    def __init__(
+        self,
+        error_handler: ErrorHandler,
+        jit_threshold: int | None = DEFAULT_THRESHOLD,
+        out: TextIOBase | None = None,
+        quicken: bool = True,
+    ):
         self.error_handler = error_handler
-        self.globals: Environment = Environment()
+        # Where print statements go, stdout if None.
+        self.out = out
+        self.globals: GlobalEnvironment = GlobalEnvironment()
         self._environment: Environment = self.globals
 
-        # Define native functions
-        self.globals.define("clock", LoxClock())
+        # Loop iterations so far, functions use it to measure how hot they are.
+        self.backedges: int = 0
+        self.jit: Jit | None = None
+        if jit_threshold is not None:
+            self.jit = Jit(self.globals, jit_threshold)
+
+        # Finds, parses and runs the module an import statement names.
+        self.importer: Callable[[Import], LoxModule] | None = None
+
+        self.budget: Budget | None = None
+        self._countdown: int = 0
+        self._depth: int = 0
+        self._max_depth: int = 0
+
+        self._trace: TraceHook | None = None
+        # The methods settrace replaced, and the JIT it turned off.
+        self._untraced: dict[str, object] = {}
+        self._untraced_jit: Jit | None = None
+        self._execute_untraced: Callable[[Stmt], object] | None = None
+        self._execute_block_untraced: Callable[[list[Stmt], Environment], object] | None = None
+        # The line of the last statement traced, and the error last reported.
+        self._trace_line: int = 0
+        self._trace_error: LoxRuntimeError | None = None
+        self._trace_lines: dict[Stmt, int] = {}
+
+        # Whether property accesses remember what they found in inline caches.
+        self._caching: bool = quicken
+        self.quickener: Quickener = Quickener()
+        if not quicken:
+            # The syntax tree is left as it is.
+            self.visit_binary_expr = self._visit_binary_unquickened
+            self.visit_quickened_expr = self._visit_binary_unquickened
+
+        self._define_natives(self.globals)
+
+    def limit(self, budget: Budget) -> None:
+        """Stop the script with a BudgetExceeded error once it goes over budget.
+
+        Runs without a budget don't pay for it: the counting versions of
+        _execute and _call are only swapped in here.
+        """
+        self.budget = budget
+        self._countdown = budget.start()
+        self._depth = 0
+        self._max_depth = budget.max_depth if budget.max_depth is not None else sys.maxsize
+        if budget.max_depth is not None:
+            # Leave Python enough stack for the depth allowed.
+            sys.setrecursionlimit(
+                max(sys.getrecursionlimit(), budget.max_depth * _FRAMES_PER_CALL + 100)
+            )
+        self._execute = self._execute_budgeted
+        self._call = self._call_budgeted
+        # Inlined calls would skip counting the call.
+        self.visit_inlined_expr = self.visit_call_expr
+        if self.jit is not None:
+            self.jit.budgeted = True
+
+    def settrace(self, hook: TraceHook | None) -> None:
+        """Have hook(event, line, environment, arg) called as the script runs,
+        or stop if hook is None. Like sys.settrace, for debuggers and tracers.
+
+        The events are
+        - "statement" before each statement, arg None. Blocks have none of
+          their own.
+        - "call" on entering a function, with the environment of its
+          parameters, arg None.
+        - "return" on leaving one, arg the value returned. A function left
+          by an error returns None.
+        - "exception" when a runtime error leaves a statement, once per
+          function it passes through, arg the LoxRuntimeError.
+        line is the line of the statement, or of the function's name for
+        "call", and environment is where the script is. Its variables() are
+        the names the script can see.
+
+        Untraced runs don't pay for it: the traced versions of _execute and
+        _execute_block are only swapped in here. While tracing, calls aren't
+        inlined and the JIT is off, with everything it compiled sent back to
+        the tree walker, except calls already running compiled code. Call it
+        after limit().
+        """
+        if hook is None:
+            if self._trace is not None:
+                for name, method in self._untraced.items():
+                    if method is None:
+                        delattr(self, name)
+                    else:
+                        setattr(self, name, method)
+                self.jit = self._untraced_jit
+                self._untraced = {}
+                self._untraced_jit = None
+                self._execute_untraced = None
+                self._execute_block_untraced = None
+            self._trace = None
+            return
+
+        if self._trace is None:
+            self._untraced = {name: vars(self).get(name) for name in _TRACED}
+            self._untraced_jit = self.jit
+            self._execute_untraced = self._execute
+            self._execute_block_untraced = self._execute_block
+            if self.jit is not None:
+                self.jit.deoptimize_all()
+                self.jit = None
+            self._execute = self._execute_traced
+            self._execute_block = self._execute_block_traced
+            self.visit_inlined_expr = self.visit_call_expr
+        self._trace = hook
+
+    def _execute_traced(self, stmt: Stmt) -> None:
+        if not isinstance(stmt, Block):
+            line: int | None = self._trace_lines.get(stmt)
+            if line is None:
+                from budget import line_of
+
+                line = self._trace_lines[stmt] = line_of(stmt) or 0
+            self._trace_line = line
+            self._trace("statement", line, self._environment, None)
+        try:
+            self._execute_untraced(stmt)
+        except LoxRuntimeError as error:
+            # Only the innermost statement in each function reports it.
+            if error is not self._trace_error:
+                self._trace_error = error
+                self._trace("exception", self._trace_line, self._environment, error)
+            raise
+
+    def _execute_block_traced(self, statements: list[Stmt], environment: Environment) -> None:
+        scope: object = environment.scope
+        if not isinstance(scope, Function):
+            self._execute_block_untraced(statements, environment)
+            return
+
+        caller_line: int = self._trace_line
+        self._trace_line = scope.name.line
+        self._trace("call", scope.name.line, environment, None)
+        try:
+            self._execute_block_untraced(statements, environment)
+        except LoxReturn as r:
+            self._trace("return", self._trace_line, environment, r.value)
+            raise
+        except LoxRuntimeError:
+            # The statement making the call reports it again.
+            self._trace_error = None
+            self._trace("return", self._trace_line, environment, None)
+            raise
+        else:
+            self._trace("return", self._trace_line, environment, None)
+        finally:
+            self._trace_line = caller_line
+
+    def use_globals(self, globals: GlobalEnvironment) -> None:
+        """Carry on from the globals of an earlier run."""
+        self.globals = globals
+        self._environment = globals
+        if self.jit is not None:
+            budgeted = self.jit.budgeted
+            self.jit = Jit(globals, self.jit.threshold)
+            self.jit.budgeted = budgeted
+
+    def _define_natives(self, environment: Environment) -> None:
+        environment.define("clock", LoxNative(0, time.time))
+
+    def execute_module(self, name: str, statements: list[Stmt]) -> LoxModule:
+        """Run a module's top level in a namespace of its own."""
+        environment: GlobalEnvironment = GlobalEnvironment()
+        self._define_natives(environment)
+        self._execute_block(statements, environment)
+        return LoxModule(name, environment)
 
     def interpret(self, statements: list[Stmt]):
         try:
@@ -30,7 +238,7 @@ class Interpreter(StmtVisitor, ExprVisitor):
             for statement in statements:
                 if isinstance(statement, ExprStmt):
                     result = self._evaluate(statement.expression)
-                    print(self._stringify(result))
+                    print(self._stringify(result), file=self.out)
                 self._execute(statement)
         except LoxRuntimeError as error:
             self.error_handler.runtime_error(error)
@@ -39,6 +247,29 @@ class Interpreter(StmtVisitor, ExprVisitor):
         left = self._evaluate(expr.left)
         right = self._evaluate(expr.right)
 
+        # Only generic nodes get quickened, never deoptimized ones or other subclasses.
+        if type(expr) in QUICKENED:
+            self.quickener.quicken(expr, left, right)
+
+        return self._binary_operation(expr, left, right)
+
+    def visit_quickened_expr(self, expr: QuickenedBinary):
+        # Read once, runs sharing the tree may rewrite the node meanwhile.
+        specialization: type = type(expr)
+        left = self._evaluate(expr.left)
+        right = self._evaluate(expr.right)
+
+        operand_type: type | None = specialization.operand_type
+        if type(left) is operand_type and type(right) is operand_type:
+            return specialization.operation(left, right)
+
+        self.quickener.deoptimize(expr, specialization)
+        return self._binary_operation(expr, left, right)
+
+    def _visit_binary_unquickened(self, expr: Binary):
+        return self._binary_operation(expr, self._evaluate(expr.left), self._evaluate(expr.right))
+
+    def _binary_operation(self, expr: Binary, left: object, right: object) -> object:
         match expr.operator.token_type:
             case TT.GREATER:
                 self._check_number_operands(expr.operator, left, right)
@@ -92,20 +323,147 @@ class Interpreter(StmtVisitor, ExprVisitor):
     def visit_call_expr(self, expr: Call) -> object:
         callee: object = self._evaluate(expr.callee)
 
-        arguments: list[object] = []
-        for argument in expr.arguments:
-            arguments.append(self._evaluate(argument))
+        # Most calls take a few arguments, those get a tuple built in one go.
+        arguments: list[Expr] = expr.arguments
+        count: int = len(arguments)
+        if count == 0:
+            values: tuple = ()
+        elif count == 1:
+            values = (self._evaluate(arguments[0]),)
+        elif count == 2:
+            values = (self._evaluate(arguments[0]), self._evaluate(arguments[1]))
+        elif count == 3:
+            values = (
+                self._evaluate(arguments[0]),
+                self._evaluate(arguments[1]),
+                self._evaluate(arguments[2]),
+            )
+        else:
+            values = tuple([self._evaluate(argument) for argument in arguments])
+
+        return self._call(callee, values, expr.paren)
+
+    def visit_inlined_expr(self, expr: InlinedCall) -> object:
+        function: object = self._environment.get(expr.callee.name)
+        if type(function) is LoxFunction and function.declaration.name is expr.function_name:
+            if self.jit is None or function.hotness < self.jit.threshold:
+                return self._inlined_call(expr, function)
+            if self._caching:
+                # From now on the JIT's code beats walking the body.
+                expr.__class__ = expr.uninlined
+        # Shadowed or rebound since, so it's an ordinary call.
+        return self._call(
+            function, tuple([self._evaluate(argument) for argument in expr.arguments]), expr.paren
+        )
+
+    def _inlined_call(self, expr: InlinedCall, function: LoxFunction) -> object:
+        function.hotness += 1
+        values: dict[str, object] = {
+            param: self._evaluate(argument) for param, argument in zip(expr.params, expr.arguments)
+        }
+        environment: Environment = Environment(function.closure, function.declaration, values)
+
+        previous: Environment = self._environment
+        self._environment = environment
+        try:
+            return self._evaluate(expr.body)
+        finally:
+            self._environment = previous
+
+    def _call(self, callee: object, arguments: tuple, paren: Token) -> object:
+        try:
+            arity: int = callee.arity_count
+        except AttributeError:
+            raise LoxRuntimeError(paren, "Can only call functions and classes.")
+        if len(arguments) != arity:
+            raise LoxRuntimeError(paren, f"Expected {arity} arguments but got {len(arguments)}.")
 
-        if not isinstance(callee, LoxCallable):
-            raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
+        return callee.call(self, arguments)
 
-        function: LoxCallable = callee
-        if len(arguments) != function.arity():
-            raise LoxRuntimeError(
-                expr.paren, f"Expected {function.arity()} arguments but got {len(arguments)}."
-            )
+    def _call_budgeted(self, callee: object, arguments: tuple, paren: Token) -> object:
+        self._countdown -= 1
+        if self._countdown <= 0:
+            self._countdown = self.budget.check(paren)
+
+        if self._depth >= self._max_depth:
+            from budget import CallDepthExceeded
+
+            raise CallDepthExceeded(paren, f"More than {self._max_depth} nested calls.")
+        self._depth += 1
+        try:
+            return Interpreter._call(self, callee, arguments, paren)
+        except RecursionError:
+            from budget import CallDepthExceeded
+
+            # Python ran out of stack before the budget did.
+            raise CallDepthExceeded(paren, "Stack overflow.")
+        finally:
+            self._depth -= 1
+
+    def _tick(self, node: Stmt) -> None:
+        """Count a step of a compiled loop."""
+        self._countdown -= 1
+        if self._countdown <= 0:
+            self._countdown = self.budget.check(node)
+
+    def visit_get_expr(self, expr: Get) -> object:
+        return self._property(expr, self._evaluate(expr.object))
+
+    def _property(self, expr: Get, obj: object) -> object:
+        if type(obj) is LoxInstance:
+            shape = obj.shape
+            cache = expr.cache
+            if cache is not None and cache[0] is shape:
+                entry = cache[1]
+            else:
+                entry = property_entry(expr, shape, self._caching)
+                if entry is None:
+                    raise LoxRuntimeError(expr.name, f"Undefined property '{expr.name.lexeme}'.")
+            if type(entry) is int:
+                return obj.fields[entry]
+            return BoundMethod(obj, entry)
+        return self._get(obj, expr.name)
+
+    def _get(self, obj: object, name: Token) -> object:
+        if isinstance(obj, LoxModule):
+            return obj.get(name)
+        raise LoxRuntimeError(name, "Only instances and modules have properties.")
+
+    def visit_set_expr(self, expr: Set) -> object:
+        obj: object = self._evaluate(expr.object)
+        value: object = self._evaluate(expr.value)
+        self._set_field(expr, obj, value)
+        return value
+
+    def _set_field(self, expr: Set, obj: object, value: object) -> None:
+        if type(obj) is not LoxInstance:
+            raise LoxRuntimeError(expr.name, "Only instances have fields.")
+        shape = obj.shape
+        cache = expr.cache
+        if cache is not None and cache[0] is shape:
+            entry = cache[1]
+        else:
+            entry = field_entry(expr, shape, self._caching)
+        if type(entry) is int:
+            obj.fields[entry] = value
+        else:
+            # A new field, always the next slot.
+            obj.fields.append(value)
+            obj.shape = entry
 
-        return function.call(self, arguments)
+    def visit_this_expr(self, expr: This) -> object:
+        return self._environment.get(expr.keyword)
+
+    def visit_super_expr(self, expr: Super) -> object:
+        return self._super_method(
+            expr, self._environment.get(expr.keyword), self._environment.get(_THIS)
+        )
+
+    def _super_method(self, expr: Super, superclass: LoxClass, instance: LoxInstance) -> object:
+        method: LoxFunction | None = superclass.find_method(expr.method.lexeme)
+        if method is None:
+            raise LoxRuntimeError(expr.method, f"Undefined property '{expr.method.lexeme}'.")
+        return BoundMethod(instance, method)
 
     def visit_ternary_expr(self, expr: Ternary):
         if self._evaluate(expr.condition):
@@ -144,18 +502,59 @@ class Interpreter(StmtVisitor, ExprVisitor):
         return None
 
     def visit_variable_expr(self, expr: Variable) -> object:
+        return self._environment.get_checked(expr.name)
+
+    def visit_initialized_expr(self, expr: InitializedVariable) -> object:
         return self._environment.get(expr.name)
 
     def visit_while_stmt(self, stmt: While) -> None:
         try:
             while self._is_truthy(self._evaluate(stmt.condition)):
                 self._execute(stmt.body)
+                self.backedges += 1
         except BreakError:
             pass
 
     def visit_break_stmt(self, stmt: Token):
         raise BreakError()
 
+    def visit_forrange_stmt(self, stmt: ForRange) -> None:
+        # The counter was just declared in the current environment.
+        values: dict[str, object] = self._environment._values
+        name: str = stmt.counter.lexeme
+        counter: object = values[name]
+        if not isinstance(counter, float):
+            self.visit_while_stmt(stmt.loop)
+            return
+
+        operator: Token = stmt.operator
+        comparison: TT = operator.token_type
+        step: float = stmt.step
+        try:
+            while True:
+                limit: object = self._evaluate(stmt.limit)
+                if not isinstance(limit, float):
+                    raise LoxRuntimeError(operator, "Operands must be numbers.")
+
+                if comparison == TT.LESS:
+                    if not counter < limit:
+                        break
+                elif comparison == TT.LESS_EQUAL:
+                    if not counter <= limit:
+                        break
+                elif comparison == TT.GREATER:
+                    if not counter > limit:
+                        break
+                elif not counter >= limit:
+                    break
+
+                self._execute(stmt.body)
+                self.backedges += 1
+                counter += step
+                values[name] = counter
+        except BreakError:
+            pass
+
     def _check_number_operand(self, operator: Token, operand: object):
         if isinstance(operand, float):
             return
@@ -200,6 +599,21 @@ class Interpreter(StmtVisitor, ExprVisitor):
     def _execute(self, stmt: Stmt) -> None | Expr:
         stmt.accept(self)
 
+    def _execute_budgeted(self, stmt: Stmt) -> None:
+        self._countdown -= 1
+        if self._countdown <= 0:
+            self._countdown = self.budget.check(stmt)
+        try:
+            stmt.accept(self)
+        except LoxRuntimeError as error:
+            # A budget checked on a statement without tokens, like a block a
+            # pass made up, leaves the line to the one around it.
+            if error.token is None:
+                from budget import start_of
+
+                error.token = start_of(stmt)
+            raise
+
     def _execute_block(self, statements: list[Stmt], environment: Environment):
         prev = self._environment
         try:
@@ -209,17 +623,50 @@ class Interpreter(StmtVisitor, ExprVisitor):
         finally:
             self._environment = prev
 
-    def visit_block_stmt(self, stmt: Stmt) -> None:
-        self._execute_block(stmt.statements, Environment(enclosing=self._environment))
+    def visit_block_stmt(self, stmt: Block) -> None:
+        if stmt.scoped:
+            self._execute_block(stmt.statements, Environment(self._environment, stmt))
+        else:
+            # Nothing is declared in this block so the current scope can be reused.
+            for statement in stmt.statements:
+                self._execute(statement)
         return None
 
     def visit_exprstmt_stmt(self, stmt: ExprStmt) -> None:
         self._evaluate(stmt.expression)
 
     def visit_function_stmt(self, stmt: Function) -> None:
-        function: LoxFunction = LoxFunction(stmt, self._environment)
+        function: LoxFunction = LoxFunction(stmt, self._environment.capture(stmt.captures))
         self._environment.define(stmt.name.lexeme, function)
 
+    def visit_import_stmt(self, stmt: Import) -> None:
+        if self.importer is None:
+            raise LoxRuntimeError(stmt.keyword, "Can't import modules here.")
+        self._environment.define(stmt.name.lexeme, self.importer(stmt))
+
+    def visit_class_stmt(self, stmt: Class) -> None:
+        superclass: object = None
+        if stmt.superclass is not None:
+            superclass = self._evaluate(stmt.superclass)
+        self._environment.define(stmt.name.lexeme, self._class(stmt, superclass))
+
+    def _class(self, stmt: Class, superclass: object) -> LoxClass:
+        environment: Environment = self._environment
+        if stmt.superclass is not None:
+            if not isinstance(superclass, LoxClass):
+                raise LoxRuntimeError(stmt.superclass.name, "Superclass must be a class.")
+            # The scope the resolver gave `super`, keyed by the superclass expression.
+            environment = Environment(environment, stmt.superclass)
+            environment.define("super", superclass)
+
+        methods: dict[str, LoxFunction] = {
+            method.name.lexeme: LoxFunction(
+                method, environment.capture(method.captures), method.name.lexeme == "init"
+            )
+            for method in stmt.methods
+        }
+        return LoxClass(stmt.name.lexeme, superclass, methods)
+
     def visit_if_stmt(self, stmt: If):
         if self._is_truthy(self._evaluate(stmt.condition)):
             self._execute(stmt.then_branch)
@@ -230,7 +677,7 @@ class Interpreter(StmtVisitor, ExprVisitor):
 
     def visit_print_stmt(self, stmt: Print) -> None:
         value: object = self._evaluate(stmt.expression)
-        print(self._stringify(value))
+        print(self._stringify(value), file=self.out)
 
     def visit_return_stmt(self, stmt: Return) -> None:
         value: object | None = None
@@ -239,7 +686,7 @@ class Interpreter(StmtVisitor, ExprVisitor):
         raise LoxReturn(value)
 
     def visit_var_stmt(self, stmt: Var) -> None:
-        value = Unitialized()
+        value = UNINITIALIZED
         if stmt.initializer is not None:
             value = self._evaluate(stmt.initializer)
 
@@ -0,0 +1,443 @@
+from __future__ import annotations
+import time
+
+from type_checking import TYPE_CHECKING
+from visitor import StmtVisitor, ExprVisitor
+from Stmt import Stmt, Block, ExprStmt, Print, Return, Var, Function, If, While, Break, ForRange, Import, Class
+from Expr import Expr, Assign, Binary, Ternary, Grouping, Literal, Logical, Unary, Variable, Call, Get
+from Expr import Set, This, Super
+from tokentype import TokenType as TT
+from ttoken import Token
+from error import LoxRuntimeError, BreakError
+from environment import Environment, GlobalEnvironment, UNINITIALIZED
+from callable import LoxCallable
+from definite_assignment import InitializedVariable
+
+if TYPE_CHECKING:
+    from callable import LoxFunction
+
+
+DEFAULT_THRESHOLD = 1000
+
+
+class Jit:
+    """Second tier for hot functions.
+
+    Every LoxFunction starts out in the tree walking interpreter and counts
+    its calls and loop iterations. Once that crosses `threshold` its body is
+    translated to Python source and compiled into a code object, which serves
+    every later call. Functions defined at the top level get the functions
+    they call from the globals baked in as constants. Redefining or assigning
+    one of those globals deoptimizes every function that baked it in, which
+    then goes back to the tree walker until it gets hot again. When the
+    interpreter runs under a budget, compiled loops count their iterations
+    against it.
+    """
+
+    def __init__(self, globals: GlobalEnvironment, threshold: int = DEFAULT_THRESHOLD) -> None:
+        self.threshold = threshold
+        self._globals = globals
+        # Declarations we can't compile, with the reason why.
+        self._unsupported: dict[Function, str] = {}
+        # Whether compiled loops count their iterations against the
+        # interpreter's budget.
+        self.budgeted = False
+
+        # The dependencies of the functions compiled and still valid.
+        self._valid: set[_Dependency] = set()
+
+        self.compiled = 0
+        self.deoptimized = 0
+        self.compile_time = 0.0
+
+    def compile(self, function: LoxFunction) -> bool:
+        declaration: Function = function.declaration
+        if declaration in self._unsupported:
+            return False
+        if function.is_initializer:
+            # Compiled code has no `this` to return.
+            self._unsupported[declaration] = "is an initializer"
+            return False
+
+        start = time.perf_counter()
+        try:
+            source, constants, baked = _FunctionCompiler(
+                declaration, function.closure is self._globals, self.budgeted
+            ).compile(self._globals)
+            namespace = dict(_RUNTIME, **constants)
+            exec(compile(source, f"<lox fun {declaration.name.lexeme}>", "exec"), namespace)
+        except _Unsupported as unsupported:
+            self._unsupported[declaration] = str(unsupported)
+            return False
+        except SyntaxError as error:
+            self._unsupported[declaration] = error.msg
+            return False
+        finally:
+            self.compile_time += time.perf_counter() - start
+
+        dependency: _Dependency = namespace["D"]
+        dependency.function = function
+        for name in baked:
+            self._globals.watch(name, lambda: self._deoptimize(dependency))
+
+        function.compiled = namespace["lox_fn"]
+        self._valid.add(dependency)
+        self.compiled += 1
+        return True
+
+    def _deoptimize(self, dependency: _Dependency) -> None:
+        if not dependency.valid:
+            return
+        # Calls already running in the compiled code see this and stop using
+        # the constants, later calls go back to the tree walker.
+        dependency.valid = False
+        dependency.function.compiled = None
+        dependency.function.hotness = 0
+        self._valid.discard(dependency)
+        self.deoptimized += 1
+
+    def deoptimize_all(self) -> None:
+        """Send every compiled function back to the tree walker."""
+        for dependency in list(self._valid):
+            self._deoptimize(dependency)
+
+    def report(self) -> str:
+        lines: list[str] = [
+            "JIT:",
+            f"  threshold        {self.threshold}",
+            f"  compiled         {self.compiled}",
+            f"  deoptimized      {self.deoptimized}",
+            f"  compile time     {self.compile_time * 1000:.2f} ms",
+        ]
+        if self._unsupported:
+            lines.append("  not compiled:")
+            for declaration, reason in self._unsupported.items():
+                lines.append(f"    {declaration.name.lexeme} (line {declaration.name.line}): {reason}")
+        return "\n".join(lines)
+
+
+class _Dependency:
+    """Shared between a compiled function and the globals it baked in."""
+
+    def __init__(self) -> None:
+        self.valid = True
+        self.function: LoxFunction | None = None
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _is_equal(a, b):
+    if a is None and b is None:
+        return True
+    if a == None:
+        return False
+
+    return a == b
+
+
+def _assign(environment: Environment, name: Token, value: object) -> object:
+    environment.assign(name, value)
+    return value
+
+
+def _checked(value: object, name: Token) -> object:
+    if value is UNINITIALIZED:
+        raise LoxRuntimeError(name, f"Uninitialized variable '{name.lexeme}'.")
+    return value
+
+
+def _set(interp, expr: Set, obj: object, value: object) -> object:
+    interp._set_field(expr, obj, value)
+    return value
+
+
+def _not_a_number(operator: Token):
+    raise LoxRuntimeError(operator, "Operand must be a number.")
+
+
+_RUNTIME: dict[str, object] = {
+    "_float": float,
+    "_is_equal": _is_equal,
+    "_assign": _assign,
+    "_checked": _checked,
+    "_set": _set,
+    "_not_a_number": _not_a_number,
+    "_BreakError": BreakError,
+    "_UNINITIALIZED": UNINITIALIZED,
+}
+
+_ARITHMETIC: dict[TT, str] = {
+    TT.PLUS: "+",
+    TT.MINUS: "-",
+    TT.STAR: "*",
+    TT.SLASH: "/",
+    TT.LESS: "<",
+    TT.LESS_EQUAL: "<=",
+    TT.GREATER: ">",
+    TT.GREATER_EQUAL: ">=",
+}
+
+_COMPARISONS = (
+    TT.LESS, TT.LESS_EQUAL, TT.GREATER, TT.GREATER_EQUAL, TT.EQUAL_EQUAL, TT.BANG_EQUAL
+)
+
+
+class _FunctionCompiler(StmtVisitor, ExprVisitor):
+    """Translates a function body to the source of a Python function.
+
+    Statements append lines, expressions return Python expressions. Locals
+    become Python locals, resolved in declaration order like the environment
+    chain would. Anything free is looked up in the closure at runtime.
+    Function declarations inside the body aren't supported since their
+    closure would need the locals in an Environment.
+    """
+
+    def __init__(self, declaration: Function, top_level: bool, budgeted: bool = False) -> None:
+        self._declaration = declaration
+        self._top_level = top_level
+        self._budgeted = budgeted
+        self._lines: list[str] = []
+        self._indent = 1
+        self._scopes: list[dict[str, str]] = []
+        self._uninitialized: set[str] = set()
+        self._constants: dict[str, object] = {"D": _Dependency()}
+        self._baked: set[str] = set()
+        self._loop_depth = 0
+        self._counter = 0
+
+    def compile(self, globals: GlobalEnvironment) -> tuple[str, dict[str, object], set[str]]:
+        self._globals = globals
+        self._scopes.append({})
+        params = [self._declare(param.lexeme) for param in self._declaration.params]
+        self._statements(self._declaration.body)
+        self._emit("return None")
+
+        header = f"def lox_fn(interp, closure{''.join(', ' + param for param in params)}):"
+        return "\n".join([header] + self._lines), self._constants, self._baked
+
+    def _emit(self, line: str) -> None:
+        self._lines.append("    " * self._indent + line)
+
+    def _temporary(self) -> str:
+        self._counter += 1
+        return f"_t{self._counter}"
+
+    def _constant(self, value: object) -> str:
+        self._counter += 1
+        name = f"K{self._counter}"
+        self._constants[name] = value
+        return name
+
+    def _declare(self, name: str) -> str:
+        scope = self._scopes[-1]
+        if name not in scope:
+            self._counter += 1
+            scope[name] = f"v{self._counter}_{name}"
+        return scope[name]
+
+    def _lookup(self, name: str) -> str | None:
+        for scope in reversed(self._scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def _statements(self, statements: list[Stmt]) -> None:
+        start = len(self._lines)
+        for statement in statements:
+            statement.accept(self)
+        if len(self._lines) == start:
+            self._emit("pass")
+
+    def _condition(self, expr: Expr) -> str:
+        # Comparisons and negations already produce a Python bool.
+        if isinstance(expr, Binary) and expr.operator.token_type in _COMPARISONS:
+            return expr.accept(self)
+        if isinstance(expr, Unary) and expr.operator.token_type == TT.BANG:
+            return expr.accept(self)
+
+        value = self._temporary()
+        return f"(({value} := {expr.accept(self)}) is not None and {value} is not False)"
+
+    def _free_environment(self) -> str:
+        return self._constant(self._globals) if self._top_level else "closure"
+
+    def visit_block_stmt(self, stmt: Block):
+        self._scopes.append({})
+        self._statements(stmt.statements)
+        self._scopes.pop()
+
+    def visit_exprstmt_stmt(self, stmt: ExprStmt):
+        self._emit(stmt.expression.accept(self))
+
+    def visit_print_stmt(self, stmt: Print):
+        self._emit(f"print(interp._stringify({stmt.expression.accept(self)}), file=interp.out)")
+
+    def visit_return_stmt(self, stmt: Return):
+        value = "None" if stmt.value is None else stmt.value.accept(self)
+        self._emit(f"return {value}")
+
+    def visit_var_stmt(self, stmt: Var):
+        # The initializer still sees an outer variable with the same name.
+        if stmt.initializer is None:
+            value = "_UNINITIALIZED"
+        else:
+            value = stmt.initializer.accept(self)
+
+        name = self._declare(stmt.name.lexeme)
+        if stmt.initializer is None:
+            self._uninitialized.add(name)
+        self._emit(f"{name} = {value}")
+
+    def visit_function_stmt(self, stmt: Function):
+        raise _Unsupported("declares a nested function")
+
+    def visit_if_stmt(self, stmt: If):
+        self._emit(f"if {self._condition(stmt.condition)}:")
+        self._indent += 1
+        self._scopes.append({})
+        self._statements([stmt.then_branch])
+        self._scopes.pop()
+        self._indent -= 1
+        if stmt.else_branch is not None:
+            self._emit("else:")
+            self._indent += 1
+            self._scopes.append({})
+            self._statements([stmt.else_branch])
+            self._scopes.pop()
+            self._indent -= 1
+
+    def visit_while_stmt(self, stmt: While):
+        # A break in a called function ends the loop it is called from.
+        self._emit("try:")
+        self._indent += 1
+        self._emit(f"while {self._condition(stmt.condition)}:")
+        self._indent += 1
+        if self._budgeted:
+            self._emit(f"interp._tick({self._constant(stmt)})")
+        self._loop_depth += 1
+        self._scopes.append({})
+        self._statements([stmt.body])
+        self._scopes.pop()
+        self._loop_depth -= 1
+        self._indent -= 2
+        self._emit("except _BreakError:")
+        self._emit("    pass")
+
+    def visit_break_stmt(self, stmt: Break):
+        if self._loop_depth == 0:
+            raise _Unsupported("break outside of a loop")
+        self._emit("break")
+
+    def visit_forrange_stmt(self, stmt: ForRange):
+        # The counter is a Python local here anyway.
+        self.visit_while_stmt(stmt.loop)
+
+    def visit_import_stmt(self, stmt: Import):
+        raise _Unsupported("imports a module")
+
+    def visit_class_stmt(self, stmt: Class):
+        raise _Unsupported("declares a class")
+
+    def visit_assign_expr(self, expr: Assign):
+        value = expr.value.accept(self)
+        local = self._lookup(expr.name.lexeme)
+        if local is not None:
+            return f"({local} := {value})"
+        return f"_assign({self._free_environment()}, {self._constant(expr.name)}, {value})"
+
+    def visit_binary_expr(self, expr: Binary):
+        token_type: TT = expr.operator.token_type
+        if token_type in (TT.EQUAL_EQUAL, TT.BANG_EQUAL):
+            equal = f"_is_equal({expr.left.accept(self)}, {expr.right.accept(self)})"
+            return equal if token_type == TT.EQUAL_EQUAL else f"(not {equal})"
+        if token_type not in _ARITHMETIC:
+            raise _Unsupported(f"operator '{expr.operator.lexeme}'")
+
+        left, right = self._temporary(), self._temporary()
+        # & rather than 'and' so both operands are always evaluated, in order.
+        return (
+            f"({left} {_ARITHMETIC[token_type]} {right} "
+            f"if (({left} := {expr.left.accept(self)}).__class__ is _float) "
+            f"& (({right} := {expr.right.accept(self)}).__class__ is _float) "
+            f"else interp._binary_operation({self._constant(expr)}, {left}, {right}))"
+        )
+
+    def visit_quickened_expr(self, expr: Binary):
+        return self.visit_binary_expr(expr)
+
+    def visit_ternary_expr(self, expr: Ternary):
+        condition = self._condition(expr.condition)
+        return f"({expr.left.accept(self)} if {condition} else {expr.right.accept(self)})"
+
+    def visit_grouping_expr(self, expr: Grouping):
+        return expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr: Literal):
+        if expr.value is None or isinstance(expr.value, (bool, float, str)):
+            return repr(expr.value)
+        return self._constant(expr.value)
+
+    def visit_logical_expr(self, expr: Logical):
+        left = self._temporary()
+        truthy = f"({left} := {expr.left.accept(self)}) is not None and {left} is not False"
+        if expr.operator.token_type == TT.OR:
+            return f"({left} if {truthy} else {expr.right.accept(self)})"
+        return f"({expr.right.accept(self)} if {truthy} else {left})"
+
+    def visit_unary_expr(self, expr: Unary):
+        right = self._temporary()
+        if expr.operator.token_type == TT.BANG:
+            return f"(({right} := {expr.right.accept(self)}) is None or {right} is False)"
+        return (
+            f"(-{right} if ({right} := {expr.right.accept(self)}).__class__ is _float "
+            f"else _not_a_number({self._constant(expr.operator)}))"
+        )
+
+    def visit_variable_expr(self, expr: Variable):
+        name: str = expr.name.lexeme
+        # Only reads the definite assignment analysis couldn't prove are checked.
+        checked: bool = type(expr) is not InitializedVariable
+        local = self._lookup(name)
+        if local is not None:
+            if checked and local in self._uninitialized:
+                return f"_checked({local}, {self._constant(expr.name)})"
+            return local
+
+        token = self._constant(expr.name)
+        get: str = f"{self._free_environment()}.{'get_checked' if checked else 'get'}({token})"
+        value = self._globals._values.get(name)
+        if self._top_level and isinstance(value, LoxCallable):
+            # Guarded so a call already running notices a deoptimization.
+            self._baked.add(name)
+            return f"({self._constant(value)} if D.valid else {get})"
+        return get
+
+    def visit_initialized_expr(self, expr: Variable):
+        return self.visit_variable_expr(expr)
+
+    def visit_call_expr(self, expr: Call):
+        callee = expr.callee.accept(self)
+        arguments = "".join(f"{argument.accept(self)}, " for argument in expr.arguments)
+        return f"interp._call({callee}, ({arguments}), {self._constant(expr.paren)})"
+
+    def visit_inlined_expr(self, expr: Call):
+        # Compiled code already calls the functions it baked in directly.
+        return self.visit_call_expr(expr)
+
+    def visit_get_expr(self, expr: Get):
+        # The node goes along for its inline cache.
+        return f"interp._property({self._constant(expr)}, {expr.object.accept(self)})"
+
+    def visit_set_expr(self, expr: Set):
+        return (
+            f"_set(interp, {self._constant(expr)}, "
+            f"{expr.object.accept(self)}, {expr.value.accept(self)})"
+        )
+
+    def visit_this_expr(self, expr: This):
+        raise _Unsupported("uses 'this'")
+
+    def visit_super_expr(self, expr: Super):
+        raise _Unsupported("uses 'super'")
@@ -0,0 +1,67 @@
+from __future__ import annotations
+from _thread import RLock
+
+from type_checking import TYPE_CHECKING
+from Stmt import Stmt, Function
+from ttoken import Token
+
+if TYPE_CHECKING:
+    from parser import LazyBodies
+
+
+_PARSING = RLock()
+
+
+class LazyFunction(Function):
+    """A function declaration whose body is only parsed when it is needed.
+
+    The parser skips the body after checking it is valid and remembers where
+    it is in the source. The first time `body` is read, for example by the
+    first call, the body is scanned, parsed and analyzed.
+    """
+
+    def __init__(
+        self,
+        name: Token,
+        params: list[Token],
+        bodies: LazyBodies,
+        start: int,
+        end: int,
+        line: int,
+        identifiers: frozenset[str],
+    ):
+        super().__init__(name, params, None)
+        self._bodies = bodies
+        # Source offsets of the body between the braces.
+        self.start = start
+        self.end = end
+        self.line = line
+        # Every identifier in the body, a superset of the names it refers to.
+        self.identifiers = identifiers
+        # Enclosing scopes as the Resolver saw them, for resolving the body later.
+        self.scopes: list = []
+        # Names that may be uninitialized outside the function, for
+        # DefiniteAssignment. None means any may be.
+        self.uninitialized: frozenset[str] | None = None
+
+    @property
+    def is_parsed(self) -> bool:
+        return self._body is not None
+
+    @property
+    def body(self) -> list[Stmt]:
+        if self._body is None:
+            # Threads sharing the declaration parse it once. Reentrant, as
+            # analyzing a body can parse the bodies nested in it.
+            with _PARSING:
+                if self._body is None:
+                    self._body = self._bodies.materialize(self)
+        return self._body
+
+    @body.setter
+    def body(self, statements: list[Stmt] | None) -> None:
+        self._body = statements
+
+
+def is_unparsed(function: Function) -> bool:
+    return isinstance(function, LazyFunction) and not function.is_parsed
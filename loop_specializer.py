@@ -0,0 +1,108 @@
+from walker import AstWalker
+from Stmt import Stmt, Block, Var, While, ExprStmt, ForRange, Function
+from Expr import Expr, Assign, Binary, Literal, Variable
+from tokentype import TokenType as TT
+from lazy_function import is_unparsed
+
+
+class LoopSpecializer(AstWalker):
+    """Replaces canonical counting loops with a ForRange statement.
+
+    A loop qualifies when it is a block holding just a `var` declaration
+    and a while loop, which is what a for loop desugars to:
+
+        { var i = <start>; while (i < <limit>) { <body>; i = i + <number>; } }
+
+    with any of < <= > >= as the comparison, + or - in the increment, and
+    neither the body nor the limit assigning to the counter, functions
+    declared in them included. The block's scope is fresh, so nothing else
+    can see the counter. The interpreter then keeps the counter in a Python
+    float instead of evaluating the comparison and increment nodes, and
+    falls back to the original loop if the counter doesn't start out as a
+    number.
+    """
+
+    def specialize(self, statements: list[Stmt]) -> list[Stmt]:
+        self.walk(statements)
+        return statements
+
+    def visit_block_stmt(self, stmt: Block):
+        super().visit_block_stmt(stmt)
+        if len(stmt.statements) != 2:
+            return
+        declaration, loop = stmt.statements
+        if isinstance(declaration, Var) and isinstance(loop, While):
+            counting_loop = self._counting_loop(declaration.name.lexeme, loop)
+            if counting_loop is not None:
+                stmt.statements[1] = counting_loop
+
+    def _counting_loop(self, counter: str, loop: While) -> ForRange | None:
+        condition: Expr = loop.condition
+        if not isinstance(condition, Binary) or condition.operator.token_type not in (
+            TT.LESS, TT.LESS_EQUAL, TT.GREATER, TT.GREATER_EQUAL
+        ):
+            return None
+        if not self._is_variable(condition.left, counter):
+            return None
+
+        if not isinstance(loop.body, Block) or len(loop.body.statements) != 2:
+            return None
+        body, increment = loop.body.statements
+        step = self._step(counter, increment)
+        if step is None:
+            return None
+
+        if assigns(counter, body) or assigns(counter, condition.right):
+            return None
+
+        return ForRange(condition.left.name, loop, condition.operator, condition.right, step, body)
+
+    def _step(self, counter: str, increment: Stmt) -> float | None:
+        if not isinstance(increment, ExprStmt):
+            return None
+
+        assign: Expr = increment.expression
+        if not isinstance(assign, Assign) or assign.name.lexeme != counter:
+            return None
+
+        value: Expr = assign.value
+        if not isinstance(value, Binary) or not self._is_variable(value.left, counter):
+            return None
+        if not isinstance(value.right, Literal) or not isinstance(value.right.value, float):
+            return None
+
+        match value.operator.token_type:
+            case TT.PLUS:
+                return value.right.value
+            case TT.MINUS:
+                return -value.right.value
+
+        return None
+
+    def _is_variable(self, expr: Expr, name: str) -> bool:
+        return isinstance(expr, Variable) and expr.name.lexeme == name
+
+
+def assigns(name: str, node: Stmt | Expr) -> bool:
+    """Whether anything in node, nested functions included, assigns to name."""
+    finder = _AssignmentFinder(name)
+    node.accept(finder)
+    return finder.found
+
+
+class _AssignmentFinder(AstWalker):
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self.found = False
+
+    def visit_assign_expr(self, expr: Assign):
+        if expr.name.lexeme == self._name:
+            self.found = True
+        super().visit_assign_expr(expr)
+
+    def visit_function_stmt(self, stmt: Function):
+        # Without parsing it, all we know is whether the name shows up.
+        if is_unparsed(stmt):
+            self.found = self.found or self._name in stmt.identifiers
+        else:
+            super().visit_function_stmt(stmt)
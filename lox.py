@@ -1,41 +1,376 @@
+from __future__ import annotations
+import functools
+import os
 import sys
+from io import TextIOBase
+from types import SimpleNamespace
 from error import ErrorHandler
 from scanner import Scanner
 from ttoken import Token
-from parser import Parser
-from Stmt import Stmt
+from parser import Parser, LazyBodies
+from lazy_function import LazyFunction
+from Stmt import Stmt, Import
 from interpreter import Interpreter
+from jit import DEFAULT_THRESHOLD
+from resolver import Resolver
+from loop_specializer import LoopSpecializer
+from definite_assignment import DefiniteAssignment
+from modules import LoxModule, MODULES
+from error import LoxRuntimeError
+from type_checking import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from budget import Budget
+    from inliner import Inliner
+    from lox_coverage import Coverage
+    from quickening import Quickener
+    from tree_shaker import TreeShaker
 
-def main() -> None:
-    lox = Lox(error_handler=ErrorHandler())
+# Python frames the passes after parsing take for a rule frame of the
+# stack parser, with some to spare.
+_FRAMES_PER_RULE = 2
+
+# Command line options, with the keyword arguments for add_argument.
+_OPTIONS: list[tuple[str, dict]] = [
+    ("--quicken-stats", {"action": "store_true", "help": "report how many nodes were specialized"}),
+    (
+        "--jit-threshold",
+        {
+            "type": int,
+            "default": DEFAULT_THRESHOLD,
+            "help": "calls plus loop iterations before a function is compiled",
+        },
+    ),
+    ("--no-jit", {"action": "store_true", "help": "only use the tree walker"}),
+    ("--lazy", {"action": "store_true", "help": "parse function bodies on their first call"}),
+    ("--jit-stats", {"action": "store_true", "help": "report what the JIT did"}),
+    (
+        "--stack-parser",
+        {
+            "action": "store_true",
+            "help": "parse with an explicit stack so deep nesting can't overflow",
+        },
+    ),
+    ("--max-depth", {"type": int, "help": "parser stack frames the stack parser allows"}),
+    ("--module-stats", {"action": "store_true", "help": "report how often modules were reused"}),
+    ("--serve", {"metavar": "SOCKET", "help": "run scripts sent to this Unix socket"}),
+    ("--workers", {"type": int, "help": "worker processes to serve with"}),
+    ("--flat", {"action": "store_true", "help": "run from the array backed syntax tree"}),
+    (
+        "--no-quicken",
+        {"action": "store_true", "help": "leave the syntax tree unchanged while running"},
+    ),
+    ("--snapshot", {"metavar": "FILE", "help": "save the globals to FILE after the script"}),
+    ("--from-snapshot", {"metavar": "FILE", "help": "start from the globals saved in FILE"}),
+    ("--no-inline", {"action": "store_true", "help": "don't inline calls to tiny functions"}),
+    ("--inline-stats", {"action": "store_true", "help": "report which calls were inlined"}),
+    ("--no-shake", {"action": "store_true", "help": "keep functions the script never uses"}),
+    ("--shake-stats", {"action": "store_true", "help": "report what tree shaking removed"}),
+    ("--asyncio", {"action": "store_true", "help": "run the script as an asyncio task"}),
+    ("--max-steps", {"type": int, "help": "statements and calls a script may run"}),
+    ("--timeout", {"type": float, "metavar": "SECONDS", "help": "wall clock time a script may run"}),
+    ("--max-call-depth", {"type": int, "help": "nested calls a script may make"}),
+    (
+        "--max-memory",
+        {"type": float, "metavar": "MB", "help": "memory a script may use, checked now and then"},
+    ),
+    ("--coverage", {"metavar": "FILE", "help": "write the script's line and branch coverage to FILE"}),
+    (
+        "--coverage-format",
+        {"choices": ["lcov", "cobertura"], "default": "lcov", "help": "format of the coverage"},
+    ),
+    ("--memstats", {"action": "store_true", "help": "report where the script's memory went"}),
+    (
+        "--memstats-threshold",
+        {
+            "type": float,
+            "metavar": "MB",
+            "help": "print a heap summary once traced memory goes over this",
+        },
+    ),
+]
+
+
+def _parse_arguments(argv: list[str]):
+    if len(argv) <= 1 and not any(arg.startswith("-") for arg in argv):
+        # Plain `pylox [script]` is most runs, and argparse takes longer to
+        # import than everything else.
+        defaults = {
+            flag[2:].replace("-", "_"): options.get(
+                "default", False if options.get("action") == "store_true" else None
+            )
+            for flag, options in _OPTIONS
+        }
+        return SimpleNamespace(script=argv[0] if argv else None, **defaults)
+
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(prog="pylox", exit_on_error=False)
+    arg_parser.add_argument("script", nargs="?")
+    for flag, options in _OPTIONS:
+        arg_parser.add_argument(flag, **options)
+    try:
+        args, unknown = arg_parser.parse_known_args(argv)
+    except argparse.ArgumentError:
+        return None
+    if unknown:
+        return None
+    return args
 
-    if len(sys.argv) > 2:
-        print("Usage: pylox [script]")
+
+def main() -> None:
+    args = _parse_arguments(sys.argv[1:])
+    if args is None or (args.serve is not None and args.script is not None) or (
+        (args.snapshot is not None or args.asyncio) and args.script is None
+    ) or (args.coverage is not None and (args.script is None or args.flat)):
+        print("Usage: pylox [options] [script]")
         sys.exit(64)
-    elif len(sys.argv) == 2:
-        lox.run_file(sys.argv[1])
-    else:
-        lox.run_prompt()
+
+    jit_threshold: int | None = None if args.no_jit else args.jit_threshold
+    # Optional parts are only imported when used, to keep startup fast.
+    max_depth: int | None = None
+    if args.stack_parser:
+        from stack_parser import DEFAULT_MAX_DEPTH
+
+        max_depth = args.max_depth or DEFAULT_MAX_DEPTH
+    budget = None
+    max_memory: int | None = None
+    if args.max_memory is not None:
+        max_memory = int(args.max_memory * 1024 * 1024)
+    limits = (args.max_steps, args.timeout, args.max_call_depth, max_memory)
+    if any(limit is not None for limit in limits):
+        from budget import Budget
+
+        budget = Budget(*limits)
+    memstats = None
+    if args.memstats or args.memstats_threshold is not None:
+        from memstats import MemStats
+
+        threshold = args.memstats_threshold
+        memstats = MemStats(None if threshold is None else int(threshold * 1024 * 1024))
+        memstats.install()
+    make_lox = functools.partial(
+        Lox,
+        jit_threshold=jit_threshold,
+        lazy=args.lazy,
+        max_depth=max_depth,
+        flat=args.flat,
+        budget=budget,
+        memstats=memstats,
+        coverage=args.coverage is not None,
+        quicken=not args.no_quicken,
+        inline=not args.no_inline,
+        # A snapshot keeps every function for the scripts that start from it.
+        shake=not args.no_shake and args.snapshot is None,
+    )
+    if args.asyncio:
+        from async_interpreter import AsyncInterpreter
+
+        make_lox = functools.partial(make_lox, interpreter_class=AsyncInterpreter)
+    if args.serve is not None:
+        from lox_server import serve, DEFAULT_WORKERS
+
+        serve(args.serve, make_lox, args.workers or DEFAULT_WORKERS)
+        return
+    lox = make_lox(error_handler=ErrorHandler())
+
+    try:
+        if args.from_snapshot is not None:
+            lox.load_snapshot(args.from_snapshot)
+        if args.script is not None:
+            lox.run_file(args.script)
+        else:
+            lox.run_prompt()
+        if args.snapshot is not None:
+            lox.save_snapshot(args.snapshot)
+    finally:
+        if args.quicken_stats:
+            print(lox.quickener.report(), file=sys.stderr)
+        if args.jit_stats and lox.jit is not None:
+            print(lox.jit.report(), file=sys.stderr)
+        if args.module_stats:
+            print(MODULES.report(), file=sys.stderr)
+        if args.inline_stats:
+            print(lox.inliner.report(), file=sys.stderr)
+        if args.shake_stats:
+            print(lox.tree_shaker.report(), file=sys.stderr)
+        if args.memstats:
+            print(memstats.report(), file=sys.stderr)
+        if args.coverage is not None:
+            lox.coverage.write(args.coverage, args.coverage_format)
 
 
 class Lox:
-    def __init__(self, error_handler: ErrorHandler):
+    def __init__(
+        self,
+        error_handler: ErrorHandler,
+        jit_threshold: int | None = DEFAULT_THRESHOLD,
+        lazy: bool = False,
+        max_depth: int | None = None,
+        flat: bool = False,
+        budget: Budget | None = None,
+        memstats=None,
+        coverage: bool = False,
+        interpreter_class: type[Interpreter] = Interpreter,
+        out: TextIOBase | None = None,
+        quicken: bool = True,
+        inline: bool = True,
+        shake: bool = True,
+    ):
+        """A Lox for one run at a time. Runs in other threads need a Lox of
+        their own, and can share syntax trees with it. With
+        coverage, the scripts it runs and the modules they import count how
+        often each line and branch runs, see lox_coverage."""
+        self.coverage: Coverage | None = None
+        specialize_loops: bool = True
+        if coverage:
+            from lox_coverage import Coverage
+
+            self.coverage = Coverage()
+            # Coverage counts the syntax tree as parsed, run by the tree walker.
+            jit_threshold, lazy, inline, shake = None, False, False, False
+            specialize_loops = False
         self._error_handler = error_handler
         self._source: str = ""
-        self._interpreter = Interpreter(self._error_handler)
+        self._lazy = lazy
+        self._flat = flat
+        self._inline = inline
+        # Whether counting loops become ForRange statements.
+        self._specialize_loops = specialize_loops
+        # Whether scripts lose the top-level functions they never use.
+        self._shake = shake
+        # Whether the globals are only the ones scripts define, so the ones
+        # they never declare without an initializer can't be uninitialized.
+        self._known_globals = True
+        # Without a maximum depth the recursive Parser is used.
+        self._parser_class = Parser
+        if max_depth is not None:
+            from stack_parser import StackParser
+
+            self._parser_class = functools.partial(StackParser, max_depth=max_depth)
+            if sys.version_info >= (3, 11):
+                # The passes after parsing still recurse, about as deep as
+                # the parser's rule frames. Python calls don't use the C
+                # stack since 3.11, so only the limit stands in their way.
+                sys.setrecursionlimit(
+                    max(sys.getrecursionlimit(), max_depth * _FRAMES_PER_RULE + 100)
+                )
+        self._interpreter = interpreter_class(
+            self._error_handler, jit_threshold, out=out, quicken=quicken
+        )
+        self._interpreter.importer = self._import
+        if self._interpreter.is_async:
+            self._interpreter.importer = self._import_async
+        if budget is not None:
+            # Starts the clock for this script.
+            self._interpreter.limit(budget)
+        if memstats is not None:
+            # After limit, so the statements counted are sampled too.
+            memstats.watch(self._interpreter)
+
+        # Imports are relative to the directory of the file importing them.
+        self._directories: list[str] = [os.getcwd()]
+        # Modules this program has run, by absolute path.
+        self._modules: dict[str, LoxModule] = {}
+        self._importing: set[str] = set()
+        self._inliner: Inliner | None = None
+        self._tree_shaker: TreeShaker | None = None
+
+    @property
+    def jit(self):
+        return self._interpreter.jit
+
+    @property
+    def quickener(self) -> Quickener:
+        return self._interpreter.quickener
+
+    @property
+    def inliner(self) -> Inliner:
+        """The inliner of the programs this Lox compiles, which keeps what
+        it inlined in all of them."""
+        if self._inliner is None:
+            from inliner import Inliner
+
+            self._inliner = Inliner()
+        return self._inliner
+
+    @property
+    def tree_shaker(self) -> TreeShaker:
+        """The tree shaker of the programs this Lox runs, which keeps what it
+        shook out of all of them."""
+        if self._tree_shaker is None:
+            from tree_shaker import TreeShaker
+
+            self._tree_shaker = TreeShaker()
+        return self._tree_shaker
 
     def run_file(self, path: str) -> None:
         with open(path, mode="r", encoding=sys.getdefaultencoding()) as f:
-            self._source: str = f.read()
-            self.run(self._source, self._interpreter.interpret)
+            source: str = f.read()
+        if self._interpreter.is_async:
+            import asyncio
 
+            status: int = asyncio.run(self.run_source_async(source, path))
+        else:
+            status = self.run_source(source, path)
+
+        if status:
+            sys.exit(status)
+
+    def run_source(self, source: str, path: str) -> int:
+        """Run the source of the script at path and return its exit status."""
+        self._start(source, path)
+        self.run(self._source, self._interpreter.interpret, self._shake, path)
+        return self._status()
+
+    async def run_source_async(self, source: str, path: str) -> int:
+        """run_source for a Lox with an AsyncInterpreter."""
+        self._start(source, path)
+        running = self.run(self._source, self._interpreter.interpret, self._shake, path)
+        if running is not None:
+            await running
+        return self._status()
+
+    def _start(self, source: str, path: str) -> None:
+        self._directories = [os.path.dirname(os.path.abspath(path))]
+        self._importing = {os.path.abspath(path)}
+        self._source = source
+
+    def _status(self) -> int:
         if self._error_handler.had_error:
-            sys.exit(65)
+            return 65
         if self._error_handler.had_runtime_error:
-            sys.exit(70)
+            return self._error_handler.runtime_exit_status
+        return 0
+
+    def save_snapshot(self, path: str) -> None:
+        from snapshot import save, SnapshotError
+
+        if self._flat:
+            print("Can't save a snapshot of a flat syntax tree.", file=sys.stderr)
+            sys.exit(66)
+        try:
+            save(self._interpreter.globals, path)
+        except (OSError, SnapshotError) as error:
+            print(f"Can't save the snapshot: {error}", file=sys.stderr)
+            sys.exit(66)
+
+    def load_snapshot(self, path: str) -> None:
+        from snapshot import load, SnapshotError
+
+        self._known_globals = False
+        # Functions from the snapshot can call any global the script
+        # defines, so it isn't a whole program to shake.
+        self._shake = False
+        try:
+            self._interpreter.use_globals(load(path))
+        except (OSError, SnapshotError) as error:
+            print(f"Can't start from the snapshot: {error}", file=sys.stderr)
+            sys.exit(66)
 
     def run_prompt(self) -> None:
+        # Each line runs with the globals the lines before it left.
+        self._known_globals = False
         while (line := input("> ")) not in ["", ".quit"]:
             line = line.strip()
             if not (line.endswith("}") or line.endswith(";")):
@@ -43,17 +378,132 @@ class Lox:
             self.run(line, self._interpreter.repl_interpret)
             self._error_handler.had_error = False
 
-    def run(self, source: str, interpret_method) -> None:
-        scanner: Scanner = Scanner(source, self._error_handler)
+    def run(self, source: str, interpret_method, shake: bool = False, path: str | None = None):
+        """Compile source and pass it to interpret_method, returning what that
+        returns, or None if it didn't compile. shake when source is the whole
+        program, and path is where it came from if it's a file."""
+        statements: list[Stmt] | None = self._compile(
+            source, self._error_handler, self._lazy, shake, path
+        )
+        if statements is None:
+            return None
+
+        if self._flat:
+            from flat_ast import flatten
+
+            # Lazy bodies are parsed now.
+            statements = flatten(statements).statements
+        return interpret_method(statements)
+
+    def compile(self, source: str) -> list[Stmt] | None:
+        """The analyzed statements of source, to run later or share between
+        interpreters, or None if it has errors."""
+        return self._compile(source, self._error_handler, self._lazy, self._shake)
+
+    def _compile(
+        self,
+        source: str,
+        error_handler: ErrorHandler,
+        lazy: bool,
+        shake: bool = False,
+        path: str | None = None,
+    ) -> list[Stmt] | None:
+        """Scan, parse and analyze source, or report its errors and return None."""
+        scanner: Scanner = Scanner(source, error_handler)
         tokens: list[Token] = scanner.scan_tokens()
 
-        parser: Parser = Parser(tokens, self._error_handler)
+        bodies: LazyBodies | None = None
+        if lazy:
+            bodies = LazyBodies(source, error_handler, self._analyze_body, self._parser_class)
+        parser: Parser = self._parser_class(tokens, error_handler, bodies)
         statements: list[Stmt] = parser.parse()
 
-        if self._error_handler.had_error:
-            return
+        if error_handler.had_error:
+            return None
+
+        try:
+            if self._specialize_loops:
+                statements = LoopSpecializer().specialize(statements)
+            statements = Resolver().resolve(statements)
+            statements = DefiniteAssignment(error_handler, self._known_globals).analyze(statements)
+            # Only after the whole program is checked, so whether it compiles
+            # doesn't depend on what is shaken out.
+            if shake:
+                statements = self.tree_shaker.shake(statements)
+            if self._inline:
+                statements = self.inliner.inline(statements)
+        except RecursionError:
+            # The static passes are still recursive.
+            error_handler.error(tokens[-1].line, "Too much nesting to analyze.")
+            return None
+        if error_handler.had_error:
+            return None
+        if self.coverage is not None and path is not None:
+            self.coverage.instrument(path, statements)
+        return statements
+
+    def _import(self, stmt: Import) -> LoxModule:
+        path, statements = self._find_module(stmt)
+        if statements is None:
+            return self._modules[path]
+
+        self._importing.add(path)
+        self._directories.append(os.path.dirname(path))
+        try:
+            module = self._interpreter.execute_module(stmt.name.lexeme, statements)
+        finally:
+            self._directories.pop()
+            self._importing.discard(path)
+
+        self._modules[path] = module
+        return module
+
+    async def _import_async(self, stmt: Import) -> LoxModule:
+        path, statements = self._find_module(stmt)
+        if statements is None:
+            return self._modules[path]
+
+        self._importing.add(path)
+        self._directories.append(os.path.dirname(path))
+        try:
+            module = await self._interpreter.execute_module(stmt.name.lexeme, statements)
+        finally:
+            self._directories.pop()
+            self._importing.discard(path)
+
+        self._modules[path] = module
+        return module
+
+    def _find_module(self, stmt: Import) -> tuple[str, list[Stmt] | None]:
+        """The absolute path of the module stmt imports, and its statements
+        unless this program already ran it."""
+        path: str = os.path.abspath(os.path.join(self._directories[-1], stmt.path.literal))
+        if path in self._modules:
+            return path, None
+        if path in self._importing:
+            raise LoxRuntimeError(stmt.path, f"Circular import of '{stmt.path.literal}'.")
+
+        def parse(source: str) -> list[Stmt] | None:
+            return self._compile(source, ErrorHandler(self._error_handler.out), lazy=False, path=path)
+
+        # Modules are parsed eagerly: the parse is cached for the whole process.
+        try:
+            if self.coverage is not None:
+                # Instrumented trees count into this Lox's coverage only.
+                with open(path, encoding="utf-8") as f:
+                    statements = parse(f.read())
+            else:
+                statements = MODULES.load(path, parse)
+        except OSError:
+            raise LoxRuntimeError(stmt.path, f"Can't read module '{stmt.path.literal}'.")
+        if statements is None:
+            raise LoxRuntimeError(stmt.path, f"Module '{stmt.path.literal}' has errors.")
+        return path, statements
 
-        interpret_method(statements)
+    def _analyze_body(self, function: LazyFunction, body: list[Stmt]) -> list[Stmt]:
+        body = LoopSpecializer().specialize(body)
+        body = Resolver().resolve_body(function, body)
+        return DefiniteAssignment(None).analyze_body(function, body)
 
 
 if __name__ == "__main__":
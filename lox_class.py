@@ -0,0 +1,160 @@
+from __future__ import annotations
+from collections.abc import Sequence
+
+from type_checking import TYPE_CHECKING
+from Expr import Get, Set
+from callable import LoxCallable, LoxFunction
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+
+
+# Shapes an inline cache remembers before it stops taking new ones.
+POLYMORPHIC_LIMIT = 4
+
+
+class Shape:
+    """The layout of an instance: its class and which slot holds each field.
+
+    Instances start out with their class's empty shape and move to another
+    shape whenever they get a new field. Adding the same field to the same
+    shape always gives the same shape, so instances whose fields were set in
+    the same order share one, and a shape seen before tells where a field is
+    without looking it up.
+    """
+
+    __slots__ = ("klass", "slots", "_transitions")
+
+    def __init__(self, klass: LoxClass, slots: dict[str, int]) -> None:
+        self.klass = klass
+        self.slots = slots
+        self._transitions: dict[str, Shape] = {}
+
+    def with_field(self, name: str) -> Shape:
+        shape = self._transitions.get(name)
+        if shape is None:
+            shape = Shape(self.klass, {**self.slots, name: len(self.slots)})
+            self._transitions[name] = shape
+        return shape
+
+
+class LoxClass(LoxCallable):
+    def __init__(
+        self, name: str, superclass: LoxClass | None, methods: dict[str, LoxFunction]
+    ) -> None:
+        self.name = name
+        self.superclass = superclass
+        # Inherited methods are copied in, classes don't change once declared.
+        self.methods: dict[str, LoxFunction] = {}
+        if superclass is not None:
+            self.methods.update(superclass.methods)
+        self.methods.update(methods)
+        self.shape = Shape(self, {})
+        initializer: LoxFunction | None = self.methods.get("init")
+        self.arity_count = 0 if initializer is None else initializer.arity_count
+
+    def find_method(self, name: str) -> LoxFunction | None:
+        return self.methods.get(name)
+
+    def call(self, interpreter: Interpreter, arguments: Sequence[object]) -> object:
+        instance = LoxInstance(self)
+        initializer: LoxFunction | None = self.methods.get("init")
+        if initializer is not None:
+            initializer.call(interpreter, arguments, instance)
+        return instance
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class LoxInstance:
+    """Fields are a list laid out by `shape`, not a dict."""
+
+    __slots__ = ("shape", "fields")
+
+    def __init__(self, klass: LoxClass) -> None:
+        self.shape: Shape = klass.shape
+        self.fields: list[object] = []
+
+    def __str__(self) -> str:
+        return f"{self.shape.klass.name} instance"
+
+
+class BoundMethod(LoxCallable):
+    """A method read off an instance, called with `this` bound to it."""
+
+    __slots__ = ("instance", "method", "arity_count")
+
+    def __init__(self, instance: LoxInstance, method: LoxFunction) -> None:
+        self.instance = instance
+        self.method = method
+        self.arity_count = method.arity_count
+
+    def call(self, interpreter: Interpreter, arguments: Sequence[object]) -> object:
+        return self.method.call(interpreter, arguments, self.instance)
+
+    def __str__(self) -> str:
+        return str(self.method)
+
+
+# An inline cache on a Get or Set node maps shapes to an entry: the slot of
+# the field as an int, or for Get the method, or for a Set that adds a field
+# the shape the instance moves to. `cache` holds the shape and entry last
+# used and `entries` every shape seen, up to POLYMORPHIC_LIMIT of them. Both
+# are replaced rather than changed, so threads sharing a node never see half
+# of an update.
+
+
+def property_entry(node: Get, shape: Shape, cache: bool) -> int | LoxFunction | None:
+    """Where the property node reads is for instances of shape, or None if
+    they don't have it. Remembered in the node's inline cache when cache is
+    set."""
+    entry = _cached(node, shape)
+    if entry is not None:
+        return entry
+
+    name: str = node.name.lexeme
+    entry = shape.slots.get(name)
+    if entry is None:
+        entry = shape.klass.methods.get(name)
+        if entry is None:
+            return None
+    if cache:
+        _remember(node, shape, entry)
+    return entry
+
+
+def field_entry(node: Set, shape: Shape, cache: bool) -> int | Shape:
+    """The slot the field node sets is in for instances of shape, or the
+    shape they move to when it's a new field."""
+    entry = _cached(node, shape)
+    if entry is not None:
+        return entry
+
+    name: str = node.name.lexeme
+    entry = shape.slots.get(name)
+    if entry is None:
+        entry = shape.with_field(name)
+    if cache:
+        _remember(node, shape, entry)
+    return entry
+
+
+def _cached(node: Get | Set, shape: Shape) -> object:
+    entries: dict | None = node.entries
+    if entries is None:
+        return None
+    entry = entries.get(shape)
+    if entry is not None:
+        node.cache = (shape, entry)
+    return entry
+
+
+def _remember(node: Get | Set, shape: Shape, entry: object) -> None:
+    entries: dict | None = node.entries
+    if entries is None:
+        node.entries = {shape: entry}
+    elif len(entries) < POLYMORPHIC_LIMIT:
+        node.entries = {**entries, shape: entry}
+    # Megamorphic sites keep their entries, only the last one used changes.
+    node.cache = (shape, entry)
@@ -0,0 +1,79 @@
+"""Runs a script on a `lox.py --serve` server instead of starting an interpreter.
+
+Usage: python lox_client.py <socket> [script | -]
+
+Only the standard library is imported so starting the client stays cheap.
+"""
+import json
+import os
+import socket
+import struct
+import sys
+
+
+# Every reply is a sequence of frames: a kind byte and a payload length.
+FRAME = struct.Struct("!cI")
+STDOUT = b"1"
+STDERR = b"2"
+EXIT = b"x"
+
+
+def send_frame(connection: socket.socket, kind: bytes, payload: bytes) -> None:
+    connection.sendall(FRAME.pack(kind, len(payload)) + payload)
+
+
+def receive_exactly(connection: socket.socket, size: int) -> bytes:
+    chunks: list[bytes] = []
+    while size:
+        chunk = connection.recv(size)
+        if not chunk:
+            raise ConnectionError("Server closed the connection.")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def run(socket_path: str, request: dict, stdout=None, stderr=None) -> int:
+    """Send a request to the server, stream its output and return the exit status.
+
+    The request holds either the absolute `path` of a script or its `source`
+    and the `directory` imports are relative to.
+    """
+    stdout = stdout or sys.stdout.buffer
+    stderr = stderr or sys.stderr.buffer
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode("utf-8"))
+        connection.shutdown(socket.SHUT_WR)
+
+        while True:
+            kind, size = FRAME.unpack(receive_exactly(connection, FRAME.size))
+            payload = receive_exactly(connection, size)
+            if kind == EXIT:
+                return int(payload)
+            output = stdout if kind == STDOUT else stderr
+            output.write(payload)
+            output.flush()
+
+
+def main() -> None:
+    if len(sys.argv) not in (2, 3):
+        print("Usage: lox_client <socket> [script | -]")
+        sys.exit(64)
+
+    script = sys.argv[2] if len(sys.argv) == 3 else "-"
+    if script == "-":
+        request = {"source": sys.stdin.read(), "directory": os.getcwd()}
+    else:
+        request = {"path": os.path.abspath(script)}
+
+    try:
+        status = run(sys.argv[1], request)
+    except OSError as error:
+        print(f"Can't reach the server: {error}", file=sys.stderr)
+        sys.exit(69)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
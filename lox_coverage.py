@@ -0,0 +1,326 @@
+import os
+import time
+import xml.etree.ElementTree as ElementTree
+
+from walker import AstWalker
+from Stmt import Stmt, Block, If, While, Break, Return, Function, Class, Import
+from Expr import Expr, Assign, Binary, Ternary, Logical, Unary, Variable, Call, Get, Set, Super
+from tokentype import TokenType as TT
+from budget import token_of, line_of
+
+
+class _File:
+    def __init__(self, path: str, counts: list[int]) -> None:
+        self.path = path
+        self._counts = counts
+        # The counters of the statements starting on each line.
+        self.lines: dict[int, list[int]] = {}
+        # Per branch point, its line and the counters it takes its branches from.
+        self.branches: list[tuple[int, str, tuple[int, ...]]] = []
+
+    def line_hits(self) -> dict[int, int]:
+        counts: list[int] = self._counts
+        return {line: max(counts[counter] for counter in ids) for line, ids in self.lines.items()}
+
+    def branch_hits(self) -> list[tuple[int, list[int | None]]]:
+        """Per branch point, its line and how often each branch was taken,
+        None for all of them if the branch point itself never ran."""
+        counts: list[int] = self._counts
+        hits: list[tuple[int, list[int | None]]] = []
+        for line, kind, ids in self.branches:
+            if kind == "if":
+                node, then_branch = ids
+                taken = [counts[then_branch], counts[node] - counts[then_branch]]
+            elif kind == "loop":
+                # Entered the body, and left the loop.
+                node, body = ids
+                taken = [counts[body], counts[node]]
+            elif kind == "ternary":
+                node, left, right = ids
+                taken = [counts[left], counts[right]]
+            else:
+                # Short-circuited, and evaluated the right operand.
+                node, right = ids
+                taken = [counts[node] - counts[right], counts[right]]
+            hits.append((line, taken if counts[node] else [None] * len(taken)))
+        return hits
+
+
+class Coverage:
+    """How often the lines and branches of the scripts a Lox runs ran.
+
+    Statements run as often as the one before them in their block, unless
+    that one can break, return or raise a runtime error, so each run of
+    statements like that shares the counter of its first one. The first
+    statement of a block shares the block's. Only the nodes owning a
+    counter, and every expression a Ternary or Logical may skip, get a
+    subclass of their class whose accept increments it, and running the
+    instrumented tree costs nothing else. A run stopped by a budget between
+    two statements sharing a counter still counts the second. The tree has
+    to be final and run as written, so the JIT, inlining, loop
+    specialization, tree shaking and lazy parsing are off while measuring
+    coverage, and counted nodes aren't quickened.
+    """
+
+    def __init__(self) -> None:
+        # How often each instrumented node ran, indexed by its coverage_id.
+        self.counts: list[int] = []
+        # The files instrumented, by path.
+        self.files: dict[str, _File] = {}
+        # Per node class, the subclass that counts how often it runs.
+        self._counted: dict[type, type] = {}
+
+    def instrument(self, path: str, statements: list[Stmt]) -> list[Stmt]:
+        """Count how often the statements and the branches in them run."""
+        file: _File | None = self.files.get(path)
+        if file is None:
+            file = self.files[path] = _File(path, self.counts)
+        instrumenter = _Instrumenter(file, self.counts)
+        instrumenter.walk(statements)
+        # Only now, walking counted nodes would count.
+        for node in instrumenter.owners:
+            node_class: type = type(node)
+            counted: type | None = self._counted.get(node_class)
+            if counted is None:
+                counted = self._counted[node_class] = type(
+                    node_class.__name__,
+                    (node_class,),
+                    {"accept": _counting_accept(node_class, self.counts)},
+                )
+            node.__class__ = counted
+        return statements
+
+    def write(self, path: str, report_format: str = "lcov") -> None:
+        text: str = self.cobertura() if report_format == "cobertura" else self.lcov()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def lcov(self) -> str:
+        """The coverage as an lcov tracefile."""
+        records: list[str] = []
+        for file in self.files.values():
+            records.append("TN:")
+            records.append(f"SF:{os.path.abspath(file.path)}")
+            branches = file.branch_hits()
+            for block, (line, taken) in enumerate(branches):
+                for branch, hits in enumerate(taken):
+                    records.append(f"BRDA:{line},{block},{branch},{'-' if hits is None else hits}")
+            records.append(f"BRF:{sum(len(taken) for _, taken in branches)}")
+            records.append(f"BRH:{sum(1 for _, taken in branches for hits in taken if hits)}")
+            line_hits = file.line_hits()
+            for line in sorted(line_hits):
+                records.append(f"DA:{line},{line_hits[line]}")
+            records.append(f"LF:{len(line_hits)}")
+            records.append(f"LH:{sum(1 for hits in line_hits.values() if hits)}")
+            records.append("end_of_record")
+        return "\n".join(records) + "\n"
+
+    def cobertura(self) -> str:
+        """The coverage as a Cobertura XML report."""
+        root = ElementTree.Element("coverage", version="pylox", timestamp=str(int(time.time())))
+        ElementTree.SubElement(ElementTree.SubElement(root, "sources"), "source").text = os.getcwd()
+        packages = ElementTree.SubElement(root, "packages")
+        package = ElementTree.SubElement(packages, "package", name=".")
+        classes = ElementTree.SubElement(package, "classes")
+
+        totals: list[int] = [0, 0, 0, 0]
+        for file in self.files.values():
+            line_hits = file.line_hits()
+            branches: dict[int, list[int | None]] = {}
+            for line, taken in file.branch_hits():
+                branches.setdefault(line, []).extend(taken)
+
+            path: str = os.path.relpath(file.path)
+            element = ElementTree.SubElement(
+                classes, "class", name=os.path.basename(path), filename=path, complexity="0"
+            )
+            ElementTree.SubElement(element, "methods")
+            lines = ElementTree.SubElement(element, "lines")
+            covered = [sum(1 for hits in line_hits.values() if hits), len(line_hits), 0, 0]
+            for line in sorted(line_hits):
+                attributes: dict[str, str] = {"number": str(line), "hits": str(line_hits[line])}
+                if line in branches:
+                    taken: int = sum(1 for hits in branches[line] if hits)
+                    attributes["branch"] = "true"
+                    attributes["condition-coverage"] = (
+                        f"{_percent(taken, len(branches[line]))}% ({taken}/{len(branches[line])})"
+                    )
+                    covered[2] += taken
+                    covered[3] += len(branches[line])
+                ElementTree.SubElement(lines, "line", attributes)
+            _rates(element, covered)
+            totals = [total + part for total, part in zip(totals, covered)]
+
+        _rates(package, totals)
+        _rates(root, totals)
+        root.set("lines-covered", str(totals[0]))
+        root.set("lines-valid", str(totals[1]))
+        root.set("branches-covered", str(totals[2]))
+        root.set("branches-valid", str(totals[3]))
+        ElementTree.indent(root)
+        return '<?xml version="1.0" ?>\n' + ElementTree.tostring(root, encoding="unicode") + "\n"
+
+
+def _counting_accept(node_class: type, counts: list[int]):
+    if node_class.__module__ in ("Expr", "Stmt"):
+        # Dispatch like the generated accept does, so counting adds no call.
+        visit: str = f"visit_{node_class.__name__.lower()}_{node_class.__module__.lower()}"
+        source: str = (
+            "def counting_accept(self, visitor):\n"
+            "    counts[self.coverage_id] += 1\n"
+            f"    return visitor.{visit}(self)\n"
+        )
+        namespace: dict[str, object] = {"counts": counts}
+        exec(compile(source, f"<coverage {node_class.__name__}>", "exec"), namespace)
+        return namespace["counting_accept"]
+
+    accept = node_class.accept
+
+    def counting_accept(self, visitor):
+        counts[self.coverage_id] += 1
+        return accept(self, visitor)
+
+    return counting_accept
+
+
+class _Instrumenter(AstWalker):
+    def __init__(self, file: _File, counts: list[int]) -> None:
+        self._file = file
+        self._counts = counts
+        # The nodes that increment a counter of their own.
+        self.owners: list[Stmt | Expr] = []
+
+    def _counter(self, node: Stmt | Expr) -> int:
+        """Give node a counter, unless it has one, and return it."""
+        counter: int | None = vars(node).get("coverage_id")
+        if counter is None:
+            counter = node.coverage_id = len(self._counts)
+            self._counts.append(0)
+            self.owners.append(node)
+        return counter
+
+    def walk(self, statements: list[Stmt], counter: int | None = None) -> None:
+        """Walk statements, the first of which runs as often as `counter` counts."""
+        for statement in statements:
+            if counter is not None and vars(statement).get("coverage_id") is None:
+                statement.coverage_id = counter
+            self._walk_stmt(statement)
+            counter = None if _may_end(statement) else statement.coverage_id
+
+    def _walk_stmt(self, stmt: Stmt | None) -> None:
+        if stmt is None:
+            return
+        counter: int = self._counter(stmt)
+        stmt.accept(self)
+
+        if isinstance(stmt, Block):
+            return
+        line: int | None = line_of(stmt)
+        if line is not None:
+            self._file.lines.setdefault(line, []).append(counter)
+
+    def visit_block_stmt(self, stmt: Block):
+        self.walk(stmt.statements, stmt.coverage_id)
+
+    def _branch(self, node: Stmt | Expr, kind: str, *branches: Stmt | Expr) -> None:
+        token = token_of(node)
+        if token is not None:
+            ids = (self._counter(node),) + tuple(self._counter(branch) for branch in branches)
+            self._file.branches.append((token.line, kind, ids))
+
+    def visit_if_stmt(self, stmt: If):
+        super().visit_if_stmt(stmt)
+        self._branch(stmt, "if", stmt.then_branch)
+
+    def visit_while_stmt(self, stmt: While):
+        super().visit_while_stmt(stmt)
+        self._branch(stmt, "loop", stmt.body)
+
+    def visit_ternary_expr(self, expr: Ternary):
+        super().visit_ternary_expr(expr)
+        self._branch(expr, "ternary", expr.left, expr.right)
+
+    def visit_logical_expr(self, expr: Logical):
+        super().visit_logical_expr(expr)
+        self._branch(expr, "logical", expr.right)
+
+
+class _Ends(AstWalker):
+    """Finds a break or return that could leave the statements it walks, or
+    anything in them that could raise a runtime error."""
+
+    def __init__(self) -> None:
+        self.found = False
+
+    def visit_break_stmt(self, stmt: Break):
+        self.found = True
+
+    def visit_return_stmt(self, stmt: Return):
+        self.found = True
+
+    def visit_import_stmt(self, stmt: Import):
+        self.found = True
+
+    def visit_function_stmt(self, stmt: Function):
+        pass
+
+    def visit_class_stmt(self, stmt: Class):
+        # Only the superclass is evaluated where it is declared.
+        if stmt.superclass is not None:
+            self.found = True
+
+    def visit_binary_expr(self, expr: Binary):
+        if expr.operator.token_type in (TT.EQUAL_EQUAL, TT.BANG_EQUAL):
+            super().visit_binary_expr(expr)
+        else:
+            self.found = True
+
+    def visit_quickened_expr(self, expr: Binary):
+        self.visit_binary_expr(expr)
+
+    def visit_unary_expr(self, expr: Unary):
+        if expr.operator.token_type == TT.BANG:
+            super().visit_unary_expr(expr)
+        else:
+            self.found = True
+
+    def visit_assign_expr(self, expr: Assign):
+        self.found = True
+
+    def visit_variable_expr(self, expr: Variable):
+        self.found = True
+
+    def visit_initialized_expr(self, expr: Variable):
+        # Proven initialized, but a global may still be undefined.
+        self.found = True
+
+    def visit_call_expr(self, expr: Call):
+        self.found = True
+
+    def visit_inlined_expr(self, expr: Call):
+        self.found = True
+
+    def visit_get_expr(self, expr: Get):
+        self.found = True
+
+    def visit_set_expr(self, expr: Set):
+        self.found = True
+
+    def visit_super_expr(self, expr: Super):
+        self.found = True
+
+
+def _may_end(stmt: Stmt) -> bool:
+    ends = _Ends()
+    ends._walk_stmt(stmt)
+    return ends.found
+
+
+def _rates(element: ElementTree.Element, covered: list[int]) -> None:
+    element.set("line-rate", str(covered[0] / covered[1] if covered[1] else 1.0))
+    element.set("branch-rate", str(covered[2] / covered[3] if covered[3] else 1.0))
+    element.set("complexity", "0")
+
+
+def _percent(part: int, whole: int) -> int:
+    return round(100 * part / whole) if whole else 100
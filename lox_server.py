@@ -0,0 +1,167 @@
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from collections.abc import Callable
+
+from error import ErrorHandler
+from lox_client import send_frame, STDOUT, STDERR, EXIT
+
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Workers are replaced after this many scripts, in case anything leaks.
+DEFAULT_MAX_REQUESTS = 1000
+
+
+def serve(
+    socket_path: str,
+    make_lox: Callable[..., object],
+    workers: int = DEFAULT_WORKERS,
+    max_requests: int = DEFAULT_MAX_REQUESTS,
+) -> None:
+    """Run scripts sent to a Unix socket on a pool of pre-forked workers.
+
+    The workers are forked after everything is imported, so none of them
+    pays for starting up. They all accept on the same socket and run each
+    script with a fresh Lox from `make_lox`, streaming back what it prints
+    and then its exit status. Modules stay cached in a worker across scripts.
+    Runs until it gets SIGINT or SIGTERM.
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    children: set[int] = set()
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    print(f"pylox: serving on {socket_path} with {workers} workers", file=sys.stderr)
+
+    try:
+        while True:
+            while len(children) < workers:
+                children.add(_fork_worker(listener, make_lox, max_requests))
+            # Replace workers as they exit.
+            pid, _ = os.wait()
+            children.discard(pid)
+    except _Stopped:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        listener.close()
+        os.unlink(socket_path)
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _stop(signum, frame) -> None:
+    raise _Stopped
+
+
+def _fork_worker(
+    listener: socket.socket, make_lox: Callable[..., object], max_requests: int
+) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # The worker.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    status = 0
+    try:
+        for _ in range(max_requests):
+            connection, _ = listener.accept()
+            with connection:
+                _handle(connection, make_lox)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def _handle(connection: socket.socket, make_lox: Callable[..., object]) -> None:
+    chunks: list[bytes] = []
+    while chunk := connection.recv(65536):
+        chunks.append(chunk)
+
+    stdout = _FrameWriter(connection, STDOUT)
+    stderr = _FrameWriter(connection, STDERR)
+    saved = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        status = _run(json.loads(b"".join(chunks)), make_lox)
+    except (OSError, ValueError, KeyError) as error:
+        print(f"Can't run the request: {error}", file=sys.stderr)
+        status = 66
+    except Exception:
+        # A bug in the interpreter shouldn't take the worker down.
+        traceback.print_exc()
+        status = 70
+    finally:
+        sys.stdout, sys.stderr = saved
+
+    try:
+        stdout.flush()
+        stderr.flush()
+        send_frame(connection, EXIT, str(status).encode())
+    except OSError:
+        # The client went away, the worker carries on with the next one.
+        pass
+
+
+def _run(request: dict, make_lox: Callable[..., object]) -> int:
+    lox = make_lox(error_handler=ErrorHandler())
+    if "path" in request:
+        path: str = request["path"]
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+    else:
+        source = request["source"]
+        path = os.path.join(request["directory"], "<stdin>")
+
+    return lox.run_source(source, path)
+
+
+class _FrameWriter:
+    """A text stream that sends what is written as frames, at least every 50 ms."""
+
+    _INTERVAL = 0.05
+    _SIZE = 8192
+
+    def __init__(self, connection: socket.socket, kind: bytes) -> None:
+        self._connection = connection
+        self._kind = kind
+        self._buffer: list[str] = []
+        self._buffered = 0
+        self._flushed = time.monotonic()
+
+    def write(self, text: str) -> int:
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self._SIZE or time.monotonic() - self._flushed >= self._INTERVAL:
+            self.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        if self._buffer:
+            send_frame(self._connection, self._kind, "".join(self._buffer).encode("utf-8"))
+            self._buffer.clear()
+            self._buffered = 0
+        self._flushed = time.monotonic()
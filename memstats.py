@@ -0,0 +1,238 @@
+import functools
+import gc
+import sys
+import tracemalloc
+from io import TextIOBase
+
+import Expr
+import Stmt
+from budget import token_of, line_of
+from callable import LoxFunction
+from environment import Environment
+
+
+# Lines in each table of the report.
+TOP = 10
+
+
+class MemStats:
+    """Counts what a run allocates, for finding out where its memory goes.
+
+    install() starts tracemalloc and wraps the constructors of environments,
+    functions and syntax tree nodes with counters, so runs without memory
+    statistics don't pay anything. watch() has an interpreter sample the
+    traced memory before each statement it executes. Growth since the last
+    sample is put down to the Lox line of the statement that was running,
+    which is where the allocations still live at the next statement were
+    made, give or take the statements compiled code runs. The first time
+    the traced memory goes over `threshold` bytes a heap summary is
+    written to `out`.
+    """
+
+    def __init__(self, threshold: int | None = None, out: TextIOBase | None = None) -> None:
+        self.threshold = threshold
+        self.out = out
+        self.environments = 0
+        self.live_environments = 0
+        self.peak_environments = 0
+        self.closures = 0
+        self.peak_closures = 0
+        # Per scope node, None for globals, the most names an environment for it had.
+        self.scope_sizes: dict[object, int] = {}
+        # Per node class, how many were created and their size in bytes.
+        self.nodes: dict[str, list[int]] = {}
+        # Bytes by Lox line, summing how much the memory grew while a statement
+        # on it ran, whether or not it was freed later.
+        self.lines: dict[int, int] = {}
+        self._line = 0
+        self._traced = 0
+        self._statement_lines: dict[Stmt.Stmt, int] = {}
+        self._restore: list[tuple[type, str, object]] = []
+
+    def install(self) -> None:
+        tracemalloc.start()
+        stats = self
+
+        def environment_init(environment: Environment, *args, **kwargs) -> None:
+            init(environment, *args, **kwargs)
+            stats.environments += 1
+            stats.live_environments += 1
+            if stats.live_environments > stats.peak_environments:
+                stats.peak_environments = stats.live_environments
+
+        def environment_del(environment: Environment) -> None:
+            stats.live_environments -= 1
+            size: int = len(environment._values)
+            if size > stats.scope_sizes.get(environment.scope, 0):
+                stats.scope_sizes[environment.scope] = size
+
+        def function_init(function: LoxFunction, *args, **kwargs) -> None:
+            function_init_unwrapped(function, *args, **kwargs)
+            stats.closures += 1
+            if stats.closures > stats.peak_closures:
+                stats.peak_closures = stats.closures
+
+        def function_del(function: LoxFunction) -> None:
+            stats.closures -= 1
+
+        init = Environment.__init__
+        function_init_unwrapped = LoxFunction.__init__
+        self._patch(Environment, "__init__", environment_init)
+        self._patch(Environment, "__del__", environment_del)
+        self._patch(LoxFunction, "__init__", function_init)
+        self._patch(LoxFunction, "__del__", function_del)
+        for node_class in _node_classes():
+            self._patch(node_class, "__init__", self._counting_init(node_class.__init__))
+
+    def uninstall(self) -> None:
+        for cls, name, value in reversed(self._restore):
+            if value is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, value)
+        self._restore = []
+        tracemalloc.stop()
+
+    def _patch(self, cls: type, name: str, value: object) -> None:
+        self._restore.append((cls, name, cls.__dict__.get(name)))
+        setattr(cls, name, value)
+
+    def _counting_init(self, init):
+        nodes = self.nodes
+
+        # Wrapped so inspecting the signature still finds the fields.
+        @functools.wraps(init)
+        def counting_init(node, *args, **kwargs) -> None:
+            init(node, *args, **kwargs)
+            counts = nodes.get(type(node).__name__)
+            if counts is None:
+                counts = nodes[type(node).__name__] = [0, 0]
+            counts[0] += 1
+            counts[1] += sys.getsizeof(node) + sys.getsizeof(node.__dict__)
+
+        return counting_init
+
+    def watch(self, interpreter) -> None:
+        """Sample the memory before every statement interpreter executes."""
+        execute = interpreter._execute
+        sample = self._sample
+
+        if interpreter.is_async:
+
+            async def execute_sampled(stmt: Stmt.Stmt) -> None:
+                sample(stmt)
+                await execute(stmt)
+
+        else:
+
+            def execute_sampled(stmt: Stmt.Stmt) -> None:
+                sample(stmt)
+                execute(stmt)
+
+        interpreter._execute = execute_sampled
+
+    def _sample(self, stmt: Stmt.Stmt) -> None:
+        traced: int = tracemalloc.get_traced_memory()[0]
+        if traced > self._traced:
+            self.lines[self._line] = self.lines.get(self._line, 0) + traced - self._traced
+        self._traced = traced
+
+        line: int | None = self._statement_lines.get(stmt)
+        if line is None:
+            line = self._statement_lines[stmt] = line_of(stmt) or 0
+        self._line = line
+
+        if self.threshold is not None and traced > self.threshold:
+            self.threshold = None
+            print(self.heap_summary(), file=self.out or sys.stderr)
+
+    def heap_summary(self) -> str:
+        """Where the memory traced right now was allocated, by Python line."""
+        traced, _ = tracemalloc.get_traced_memory()
+        lines: list[str] = [f"Heap summary at {_size(traced)}, running line {self._line}:"]
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        )
+        for stat in snapshot.statistics("lineno")[:TOP]:
+            frame = stat.traceback[0]
+            where = f"{frame.filename.rsplit('/', 1)[-1]}:{frame.lineno}"
+            lines.append(f"  {where:<30} {_size(stat.size):>10} {stat.count:>9} blocks")
+        lines.append(f"  live environments  {self.live_environments}")
+        lines.append(f"  closures alive     {self.closures}")
+        lines.extend(self._line_table())
+        return "\n".join(lines)
+
+    def report(self) -> str:
+        # Environments only caught in cycles count as live until collected.
+        gc.collect()
+        traced, peak = tracemalloc.get_traced_memory()
+        lines: list[str] = [
+            "Memory:",
+            f"  peak RSS           {_peak_rss()}",
+            f"  traced             {_size(traced)} now, {_size(peak)} at peak",
+            f"  environments       {self.environments} created, "
+            f"{self.live_environments} live, {self.peak_environments} at peak",
+            f"  closures alive     {self.closures}, {self.peak_closures} at peak",
+        ]
+
+        # Scopes still alive haven't reported their size yet.
+        sizes: dict[object, int] = dict(self.scope_sizes)
+        for obj in gc.get_objects():
+            if isinstance(obj, Environment):
+                sizes[obj.scope] = max(sizes.get(obj.scope, 0), len(obj._values))
+        lines.append("  largest scopes:")
+        for scope, size in sorted(sizes.items(), key=lambda item: -item[1])[:TOP]:
+            lines.append(f"    {_describe_scope(scope):<30} {size:>8} names")
+
+        lines.append("  syntax tree nodes created:")
+        for name, (count, size) in sorted(self.nodes.items(), key=lambda item: -item[1][1])[:TOP]:
+            lines.append(f"    {name:<30} {count:>8} {_size(size):>10}")
+
+        lines.extend(self._line_table())
+        return "\n".join(lines)
+
+    def _line_table(self) -> list[str]:
+        lines: list[str] = ["  allocated while running, by Lox line:"]
+        for line, size in sorted(self.lines.items(), key=lambda item: -item[1])[:TOP]:
+            where = f"line {line}" if line else "before the first statement"
+            lines.append(f"    {where:<30} {_size(size):>10}")
+        return lines
+
+
+def _node_classes() -> list[type]:
+    classes: list[type] = []
+    for module, base in ((Expr, Expr.Expr), (Stmt, Stmt.Stmt)):
+        for cls in vars(module).values():
+            if isinstance(cls, type) and issubclass(cls, base) and cls is not base:
+                if cls.__module__ == module.__name__:
+                    classes.append(cls)
+    return classes
+
+
+def _describe_scope(scope: object) -> str:
+    if scope is None:
+        return "globals"
+    if isinstance(scope, Stmt.Function):
+        return f"fun {scope.name.lexeme} (line {scope.name.line})"
+    kind: str = "block" if isinstance(scope, Stmt.Block) else "scope"
+    token = token_of(scope)
+    return f"{kind} (line {token.line})" if token is not None else kind
+
+
+def _size(size: float) -> str:
+    if size < 1024:
+        return f"{int(size)} B"
+    for unit in ("kB", "MB", "GB"):
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+
+
+def _peak_rss() -> str:
+    try:
+        import resource
+    except ImportError:
+        return "unknown on this platform"
+    # Kilobytes on Linux, bytes on macOS.
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return _size(peak if sys.platform == "darwin" else peak * 1024)
@@ -0,0 +1,119 @@
+import os
+# threading takes longer to import, its Lock is this one.
+from _thread import allocate_lock
+from collections import OrderedDict
+from collections.abc import Callable
+
+from Stmt import Stmt
+from ttoken import Token
+from environment import Environment
+from error import LoxRuntimeError
+
+
+DEFAULT_CAPACITY = 64
+
+
+class LoxModule:
+    """The namespace a module's top level definitions were bound in."""
+
+    def __init__(self, name: str, environment: Environment) -> None:
+        self.name = name
+        self.environment = environment
+
+    def get(self, name: Token) -> object:
+        try:
+            return self.environment._values[name.lexeme]
+        except KeyError:
+            raise LoxRuntimeError(
+                name, f"Undefined name '{name.lexeme}' in module '{self.name}'."
+            )
+
+    def __str__(self) -> str:
+        return f"<module {self.name}>"
+
+
+class _Entry:
+    def __init__(self, mtime: int, size: int, digest: str, statements: list[Stmt]) -> None:
+        self.mtime = mtime
+        self.size = size
+        self.digest = digest
+        self.statements = statements
+
+
+class ModuleCache:
+    """Parsed and analyzed modules, shared by everything in the process.
+
+    Entries are keyed by absolute path. A module whose modification time and
+    size haven't changed is reused without reading it; otherwise it is read
+    and only parsed again if its contents hash differently. The least
+    recently used modules are dropped beyond `capacity`. Safe to use from
+    several threads, which then share the statements.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.capacity = capacity
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = allocate_lock()
+
+    def load(
+        self, path: str, parse: Callable[[str], list[Stmt] | None]
+    ) -> list[Stmt] | None:
+        """The statements of the module at path, parsing it with parse if needed.
+
+        Raises OSError if the file can't be read. Modules with errors aren't
+        cached, parse reports them and returns None.
+        """
+        # A module imported by several threads at once is only parsed once.
+        with self._lock:
+            return self._load(path, parse)
+
+    def _load(
+        self, path: str, parse: Callable[[str], list[Stmt] | None]
+    ) -> list[Stmt] | None:
+        status = os.stat(path)
+        entry: _Entry | None = self._entries.get(path)
+        if entry is not None and (entry.mtime, entry.size) == (status.st_mtime_ns, status.st_size):
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry.statements
+
+        # Only needed once a module changed, and slow to import.
+        import hashlib
+
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if entry is not None and entry.digest == digest:
+            # Touched but not changed.
+            entry.mtime, entry.size = status.st_mtime_ns, status.st_size
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry.statements
+
+        self.misses += 1
+        statements = parse(data.decode("utf-8"))
+        if statements is None:
+            self._entries.pop(path, None)
+            return None
+
+        self._entries[path] = _Entry(status.st_mtime_ns, status.st_size, digest, statements)
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return statements
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def report(self) -> str:
+        return (
+            f"modules: {len(self._entries)} cached, "
+            f"{self.hits} imports reused a parse, {self.misses} parsed"
+        )
+
+
+# Shared by every Lox in the process.
+MODULES = ModuleCache()
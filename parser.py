@@ -1,26 +1,80 @@
+import os
+from collections.abc import Callable, Iterator
+
 from ttoken import Token
-from Expr import Expr, Variable, Binary, Ternary, Unary, Literal, Grouping, Assign, Logical, Call
-from Stmt import Stmt, Var, Print, ExprStmt, Block, If, While, Break, Function, Return
+from Expr import Expr, Variable, Binary, Ternary, Unary, Literal, Grouping, Assign, Logical, Call, Get
+from Expr import Set, This, Super
+from Stmt import Stmt, Var, Print, ExprStmt, Block, If, While, Break, Function, Return, Import, Class
 from tokentype import TokenType
 from error import ErrorHandler
+from scanner import Scanner
+from lazy_function import LazyFunction
+from syntax_validator import SyntaxValidator
+
+
+class LazyBodies:
+    """Turns the bodies of lazily parsed functions into statements.
+
+    `analyze` runs the static passes over a freshly parsed body.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        error_handler: ErrorHandler,
+        analyze: Callable[[LazyFunction, list[Stmt]], list[Stmt]],
+        parser_class: Callable[..., "Parser"] | None = None,
+    ) -> None:
+        self.source = source
+        self._error_handler = error_handler
+        self._analyze = analyze
+        self._parser_class = parser_class or Parser
+
+    def materialize(self, function: LazyFunction) -> list[Stmt]:
+        scanner: Scanner = Scanner(
+            self.source[function.start:function.end], self._error_handler, function.line, function.start
+        )
+        parser: Parser = self._parser_class(scanner.scan_tokens(), self._error_handler, lazy=self)
+        return self._analyze(function, parser.parse())
 
 
 class Parser:
-    def __init__(self, tokens: list[Token], error_handler: ErrorHandler) -> None:
+    def __init__(
+        self, tokens: list[Token], error_handler: ErrorHandler, lazy: LazyBodies | None = None
+    ) -> None:
         self._tokens = tokens
         self._current: int = 0
         self._error_handler = error_handler
 
+        # When set, valid function bodies are skipped and parsed on first use.
+        self._lazy = lazy
+        self._validator: SyntaxValidator | None = None
+
+        # For each class being parsed, whether it has a superclass.
+        self._classes: list[bool] = []
+        # The kind of each function being parsed, innermost last.
+        self._function_kinds: list[str] = []
+
     def parse(self) -> list[Stmt]:
         statements: list[Stmt] = []
-        while not self._is_at_end():
-            try:
-                statements.append(self._declaration())
-            except ParseError:
-                return None
+        try:
+            for statement, _ in self.declarations():
+                statements.append(statement)
+        except ParseError:
+            return None
 
         return statements
 
+    def declarations(self) -> Iterator[tuple[Stmt | None, int]]:
+        """Parse the top-level declarations one at a time, yielding each with
+        the index of the token after it. Raises ParseError if recovering from
+        an error runs into the end."""
+        while not self._is_at_end():
+            yield self._top_level_declaration(), self._current
+
+    def _top_level_declaration(self) -> Stmt | None:
+        return self._declaration()
+
     def _comma_expression(self) -> Expr:
         expr: Expr = self._expression()
 
@@ -36,10 +90,14 @@ class Parser:
 
     def _declaration(self):
         try:
+            if self._match(TokenType.CLASS):
+                return self._class_declaration()
             if self._match(TokenType.FUN):
                 return self._function("function")
             if self._match(TokenType.VAR):
                 return self._var_declaration()
+            if self._match(TokenType.IMPORT):
+                return self._import_declaration()
             return self._statement()
         except ParseError:
             self._synchronize()
@@ -57,13 +115,41 @@ class Parser:
         if self._match(TokenType.WHILE):
             return self._while_statement()
         if self._match(TokenType.LEFT_BRACE):
-            return Block(self._block())
+            brace: Token = self._previous()
+            block: Block = Block(self._block())
+            block.start = brace
+            return block
         if self._match(TokenType.BREAK):
-            return Break(self._break_statement())
+            return self._break_statement()
 
         return self._expression_statement()
 
+    def _class_declaration(self) -> Class:
+        name, superclass = self._class_header()
+        methods: list[Function] = []
+        try:
+            while not self._check(TokenType.RIGHT_BRACE) and not self._is_at_end():
+                methods.append(self._function("method"))
+        finally:
+            self._classes.pop()
+        self._consume(TokenType.RIGHT_BRACE, "Expect '}' after class body.")
+        return Class(name, superclass, methods)
+
+    def _class_header(self) -> tuple[Token, Variable | None]:
+        name: Token = self._consume(TokenType.IDENTIFIER, "Expect class name.")
+
+        superclass: Variable | None = None
+        if self._match(TokenType.LESS):
+            superclass = Variable(self._consume(TokenType.IDENTIFIER, "Expect superclass name."))
+            if superclass.name.lexeme == name.lexeme:
+                self._error(superclass.name, "A class can't inherit from itself.")
+
+        self._consume(TokenType.LEFT_BRACE, "Expect '{' before class body.")
+        self._classes.append(superclass is not None)
+        return name, superclass
+
     def _for_statement(self):
+        keyword: Token = self._previous()
         self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
 
         initializer: Stmt
@@ -96,6 +182,7 @@ class Parser:
             condition = Literal(True)
 
         body = While(condition, body)
+        body.start = keyword
 
         if initializer is not None:
             body = Block([
@@ -106,6 +193,7 @@ class Parser:
         return body
 
     def _if_statement(self):
+        keyword: Token = self._previous()
         self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
         condition: Expr = self._expression()
         self._consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
@@ -115,12 +203,17 @@ class Parser:
         if self._match(TokenType.ELSE):
             else_branch = self._statement()
 
-        return If(condition, then_branch, else_branch)
+        statement: If = If(condition, then_branch, else_branch)
+        statement.start = keyword
+        return statement
 
     def _print_statement(self):
+        keyword: Token = self._previous()
         value: Expr = self._expression()
         self._consume(TokenType.SEMICOLON, "Expect ';' after value.")
-        return Print(value)
+        statement: Print = Print(value)
+        statement.start = keyword
+        return statement
 
     def _return_statement(self):
         keyword: Token = self._previous()
@@ -129,6 +222,11 @@ class Parser:
             value = self._expression()
 
         self._consume(TokenType.SEMICOLON, "Expect ';' after return value.")
+        return self._return(keyword, value)
+
+    def _return(self, keyword: Token, value: Expr | None) -> Return:
+        if value is not None and self._function_kinds and self._function_kinds[-1] == "initializer":
+            self._error(keyword, "Can't return a value from an initializer.")
         return Return(keyword, value)
 
     def _var_declaration(self):
@@ -141,13 +239,28 @@ class Parser:
         self._consume(TokenType.SEMICOLON, "Expect ';' after variable declaration.")
         return Var(name, initializer)
 
+    def _import_declaration(self) -> Import:
+        keyword: Token = self._previous()
+        path: Token = self._consume(TokenType.STRING, "Expect module path after 'import'.")
+        self._consume(TokenType.SEMICOLON, "Expect ';' after module path.")
+
+        # The module is bound to the name of its file.
+        stem: str = os.path.splitext(os.path.basename(path.literal))[0]
+        if not stem.isidentifier():
+            self._error(path, "Module name must be an identifier.")
+        name: Token = Token(TokenType.IDENTIFIER, stem, None, path.line, path.offset)
+        return Import(keyword, path, name)
+
     def _while_statement(self):
+        keyword: Token = self._previous()
         self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
         expr: Expr = self._expression()
         self._consume(TokenType.RIGHT_PAREN, "Expect ')' after condition.")
         body: Stmt = self._statement()
 
-        return While(expr, body)
+        statement: While = While(expr, body)
+        statement.start = keyword
+        return statement
 
     def _break_statement(self):
         break_keyword = self._previous()
@@ -155,9 +268,12 @@ class Parser:
         return Break(break_keyword)
 
     def _expression_statement(self):
+        start: Token = self._peek()
         value: Expr = self._expression()
         self._consume(TokenType.SEMICOLON, "Expect ';' after value.")
-        return ExprStmt(value)
+        statement: ExprStmt = ExprStmt(value)
+        statement.start = start
+        return statement
 
     def _function(self, kind: str) -> Function:
         name: Token = self._consume(TokenType.IDENTIFIER, f"Expect {kind} name.")
@@ -178,10 +294,53 @@ class Parser:
         self._consume(TokenType.RIGHT_PAREN, "Expect ')' after parameters.")
 
         self._consume(TokenType.LEFT_BRACE, f"Expect '{{' before {kind} body.")
-        body: list[Stmt] = self._block()
+        # Methods are always parsed eagerly, what an initializer may return
+        # depends on the class around it.
+        if self._lazy is not None and kind == "function":
+            function: LazyFunction | None = self._lazy_function(name, parameters)
+            if function is not None:
+                return function
+
+        self._function_kinds.append(self._body_kind(kind, name))
+        try:
+            body: list[Stmt] = self._block()
+        finally:
+            self._function_kinds.pop()
 
         return Function(name, parameters, body)
 
+    def _body_kind(self, kind: str, name: Token) -> str:
+        if kind == "method" and name.lexeme == "init":
+            return "initializer"
+        return kind
+
+    def _lazy_function(self, name: Token, parameters: list[Token]) -> LazyFunction | None:
+        if self._validator is None:
+            self._validator = SyntaxValidator([token.token_type for token in self._tokens])
+
+        # Anything wrong with the body is left to the eager parse to report.
+        end: int = self._validator.block_end(self._current)
+        if end == -1:
+            return None
+
+        identifiers: set[str] = set()
+        for token in self._tokens[self._current:end]:
+            if token.token_type == TokenType.IDENTIFIER:
+                identifiers.add(token.lexeme)
+
+        left_brace: Token = self._previous()
+        right_brace: Token = self._tokens[end - 1]
+        self._current = end
+        return LazyFunction(
+            name,
+            parameters,
+            self._lazy,
+            left_brace.offset + 1,
+            right_brace.offset,
+            left_brace.line,
+            frozenset(identifiers),
+        )
+
     def _block(self):
         statements: list[Stmt] = []
         while not self._check(TokenType.RIGHT_BRACE):
@@ -189,42 +348,8 @@ class Parser:
         self._consume(TokenType.RIGHT_BRACE, "Expect '}' after block.")
         return statements
 
-    def _assignment(self):
-        expr: Expr = self._or()
-
-        if self._match(TokenType.EQUAL):
-            equals: Token = self._previous()
-            value: Expr = self._assignment()
-
-            if isinstance(expr, Variable):
-                return Assign(expr.name, value)
-
-            self._error(equals, "Invalid assignment target.")
-
-        return expr
-
-    def _or(self) -> Expr:
-        expr: Expr = self._and()
-
-        while self._match(TokenType.OR):
-            operator: Token = self._previous()
-            right: Expr = self._and()
-            expr = Logical(expr, operator, right)
-
-        return expr
-
-    def _and(self):
-        expr: Expr = self._equality()
-
-        while self._match(TokenType.AND):
-            operator: Token = self._previous()
-            right: Expr = self._equality()
-            expr = Logical(expr, operator, right)
-
-        return expr
-
     def _ternary(self) -> Expr:
-        expr: Expr = self._assignment()
+        expr: Expr = self._precedence(_ASSIGNMENT)
 
         if not self._match(TokenType.QUESTION_MARK):
             return expr
@@ -241,52 +366,87 @@ class Parser:
 
         return expr
 
-    def _equality(self) -> Expr:
-        expr: Expr = self._comparison()
+    def _precedence(self, min_power: int) -> Expr:
+        """Parse an expression whose operators bind at least as tight as min_power."""
+        token: Token = self._tokens[self._current]
+        prefix = self._prefix.get(token.token_type)
+        if prefix is None:
+            raise self._error(token, "Expect expression.")
+        self._current += 1
+        expr: Expr = prefix(self, token)
 
-        while self._match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
-            operator: Token = self._previous()
-            right: Expr = self._comparison()
-            expr = Binary(expr, operator, right)
+        while True:
+            token = self._tokens[self._current]
+            infix = self._infix.get(token.token_type)
+            if infix is None or infix[0] < min_power:
+                return expr
+            self._current += 1
+            expr = infix[1](self, expr, token)
 
-        return expr
+    def _literal(self, token: Token) -> Expr:
+        return Literal(token.literal)
 
-    def _comparison(self) -> Expr:
-        expr: Expr = self._term()
+    def _false(self, token: Token) -> Expr:
+        return Literal(False)
 
-        while self._match(
-            TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL
-        ):
-            operator: Token = self._previous()
-            right: Expr = self._term()
-            expr = Binary(expr, operator, right)
+    def _true(self, token: Token) -> Expr:
+        return Literal(True)
 
-        return expr
+    def _nil(self, token: Token) -> Expr:
+        return Literal(None)
 
-    def _term(self):
-        expr: Expr = self._factor()
+    def _variable(self, token: Token) -> Expr:
+        return Variable(token)
 
-        while self._match(TokenType.MINUS, TokenType.PLUS):
-            operator: Token = self._previous()
-            right: Expr = self._factor()
-            expr = Binary(expr, operator, right)
+    def _this(self, keyword: Token) -> Expr:
+        if not self._classes:
+            self._error(keyword, "Can't use 'this' outside of a class.")
+        return This(keyword)
 
-        return expr
+    def _super(self, keyword: Token) -> Expr:
+        if not self._classes:
+            self._error(keyword, "Can't use 'super' outside of a class.")
+        elif not self._classes[-1]:
+            self._error(keyword, "Can't use 'super' in a class with no superclass.")
+        self._consume(TokenType.DOT, "Expect '.' after 'super'.")
+        method: Token = self._consume(TokenType.IDENTIFIER, "Expect superclass method name.")
+        return Super(keyword, method)
 
-    def _factor(self):
-        expr: Expr = self._unary()
+    def _grouping(self, token: Token) -> Expr:
+        expr: Expr = self._expression()
+        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
+        return Grouping(expr)
 
-        while self._match(TokenType.SLASH, TokenType.STAR):
-            operator: Token = self._previous()
-            right: Expr = self._unary()
-            expr = Binary(expr, operator, right)
+    def _unary(self, operator: Token) -> Expr:
+        return Unary(operator, self._precedence(_UNARY))
 
-        return expr
+    def _binary(self, left: Expr, operator: Token) -> Expr:
+        # Left associative, so the right operand has to bind tighter.
+        return Binary(left, operator, self._precedence(self._infix[operator.token_type][0] + 1))
+
+    def _logical(self, left: Expr, operator: Token) -> Expr:
+        return Logical(left, operator, self._precedence(self._infix[operator.token_type][0] + 1))
+
+    def _assignment(self, target: Expr, equals: Token) -> Expr:
+        value: Expr = self._precedence(_ASSIGNMENT)
+
+        return self._assignment_to(target, equals, value)
 
-    def _unary(self):
-        if self._match(TokenType.BANG, TokenType.MINUS):
-            return Unary(self._previous(), self._unary())
-        return self._call()
+    def _assignment_to(self, target: Expr, equals: Token, value: Expr) -> Expr:
+        if isinstance(target, Variable):
+            return Assign(target.name, value)
+        if isinstance(target, Get):
+            return Set(target.object, target.name, value)
+
+        self._error(equals, "Invalid assignment target.")
+        return target
+
+    def _call(self, callee: Expr, paren: Token) -> Expr:
+        return self._finish_call(callee)
+
+    def _get(self, target: Expr, dot: Token) -> Expr:
+        name: Token = self._consume(TokenType.IDENTIFIER, "Expect property name after '.'.")
+        return Get(target, name)
 
     def _finish_call(self, callee: Expr) -> Expr:
         arguments: list[Expr] = []
@@ -303,38 +463,6 @@ class Parser:
         paren: Token = self._consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
         return Call(callee, paren, arguments)
 
-    def _call(self):
-        expr: Expr = self._primary()
-
-        while True:
-            if self._match(TokenType.LEFT_PAREN):
-                expr = self._finish_call(expr)
-            else:
-                break
-
-        return expr
-
-    def _primary(self):
-        if self._match(TokenType.FALSE):
-            return Literal(False)
-        if self._match(TokenType.TRUE):
-            return Literal(True)
-        if self._match(TokenType.NIL):
-            return Literal(None)
-
-        if self._match(TokenType.NUMBER, TokenType.STRING):
-            return Literal(self._previous().literal)
-
-        if self._match(TokenType.IDENTIFIER):
-            return Variable(self._previous())
-
-        if self._match(TokenType.LEFT_PAREN):
-            expr: Expr = self._expression()
-            self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
-            return Grouping(expr)
-
-        raise self._error(self._peek(), "Expect expression.")
-
     def _match(self, *tokentypes: tuple[TokenType]) -> bool:
         for tokentype in tokentypes:
             if self._check(tokentype):
@@ -362,6 +490,7 @@ class Parser:
                 case (TokenType.CLASS
                       | TokenType.FUN
                       | TokenType.VAR
+                      | TokenType.IMPORT
                       | TokenType.FOR
                       | TokenType.IF
                       | TokenType.WHILE
@@ -394,6 +523,50 @@ class Parser:
         return self._tokens[self._current - 1]
 
 
+# Binding powers, from loosest to tightest.
+_ASSIGNMENT = 1
+_OR = 2
+_AND = 3
+_EQUALITY = 4
+_COMPARISON = 5
+_TERM = 6
+_FACTOR = 7
+_UNARY = 8
+_CALL = 9
+
+Parser._prefix = {
+    TokenType.FALSE: Parser._false,
+    TokenType.TRUE: Parser._true,
+    TokenType.NIL: Parser._nil,
+    TokenType.NUMBER: Parser._literal,
+    TokenType.STRING: Parser._literal,
+    TokenType.IDENTIFIER: Parser._variable,
+    TokenType.THIS: Parser._this,
+    TokenType.SUPER: Parser._super,
+    TokenType.LEFT_PAREN: Parser._grouping,
+    TokenType.BANG: Parser._unary,
+    TokenType.MINUS: Parser._unary,
+}
+
+Parser._infix = {
+    TokenType.EQUAL: (_ASSIGNMENT, Parser._assignment),
+    TokenType.OR: (_OR, Parser._logical),
+    TokenType.AND: (_AND, Parser._logical),
+    TokenType.BANG_EQUAL: (_EQUALITY, Parser._binary),
+    TokenType.EQUAL_EQUAL: (_EQUALITY, Parser._binary),
+    TokenType.GREATER: (_COMPARISON, Parser._binary),
+    TokenType.GREATER_EQUAL: (_COMPARISON, Parser._binary),
+    TokenType.LESS: (_COMPARISON, Parser._binary),
+    TokenType.LESS_EQUAL: (_COMPARISON, Parser._binary),
+    TokenType.MINUS: (_TERM, Parser._binary),
+    TokenType.PLUS: (_TERM, Parser._binary),
+    TokenType.SLASH: (_FACTOR, Parser._binary),
+    TokenType.STAR: (_FACTOR, Parser._binary),
+    TokenType.LEFT_PAREN: (_CALL, Parser._call),
+    TokenType.DOT: (_CALL, Parser._get),
+}
+
+
 class ParseError(Exception):
     pass
 
@@ -0,0 +1,155 @@
+import operator
+
+from Expr import Binary
+from tokentype import TokenType as TT
+
+
+class QuickenedBinary(Binary):
+    """A Binary node that rewrote itself after seeing its operand types.
+
+    The interpreter only has to check that both operands still have
+    `operand_type` before applying `operation`. When they don't, the node
+    is rewritten into an UnspecializedBinary and never quickened again.
+    """
+
+    operand_type: type
+    operation = None
+    # What deoptimizing rewrites the node into.
+    unspecialized: type
+
+    def accept(self, visitor):
+        return visitor.visit_quickened_expr(self)
+
+
+class FloatAdd(QuickenedBinary):
+    operand_type = float
+    operation = operator.add
+
+
+class FloatSubtract(QuickenedBinary):
+    operand_type = float
+    operation = operator.sub
+
+
+class FloatMultiply(QuickenedBinary):
+    operand_type = float
+    operation = operator.mul
+
+
+class FloatDivide(QuickenedBinary):
+    operand_type = float
+    operation = operator.truediv
+
+
+class FloatLess(QuickenedBinary):
+    operand_type = float
+    operation = operator.lt
+
+
+class FloatLessEqual(QuickenedBinary):
+    operand_type = float
+    operation = operator.le
+
+
+class FloatGreater(QuickenedBinary):
+    operand_type = float
+    operation = operator.gt
+
+
+class FloatGreaterEqual(QuickenedBinary):
+    operand_type = float
+    operation = operator.ge
+
+
+class StringConcat(QuickenedBinary):
+    operand_type = str
+    operation = operator.add
+
+
+class UnspecializedBinary(Binary):
+    """A node whose operand types changed after it was quickened."""
+
+    # Matches no operand, for a run that dispatched on the specialization
+    # another run sharing the tree just deoptimized.
+    operand_type = None
+
+
+QuickenedBinary.unspecialized = UnspecializedBinary
+
+
+_float_specializations: dict[TT, type] = {
+    TT.PLUS: FloatAdd,
+    TT.MINUS: FloatSubtract,
+    TT.STAR: FloatMultiply,
+    TT.SLASH: FloatDivide,
+    TT.LESS: FloatLess,
+    TT.LESS_EQUAL: FloatLessEqual,
+    TT.GREATER: FloatGreater,
+    TT.GREATER_EQUAL: FloatGreaterEqual,
+}
+
+# Per class of generic Binary nodes, the class quickening rewrites them
+# into for each specialization, UnspecializedBinary included. Stand-ins for
+# node objects, like the cursors of flat_ast, add their own.
+QUICKENED: dict[type, dict[type, type]] = {
+    Binary: {
+        specialization: specialization
+        for specialization in (*_float_specializations.values(), StringConcat, UnspecializedBinary)
+    }
+}
+
+
+class Quickener:
+    """Rewrites the Binary nodes a run evaluates, and counts what it did.
+
+    Runs sharing a syntax tree can each have one. Every rewrite is a single
+    assignment of the node's class, and every class a node can have
+    evaluates it the same way, the specializations only after checking the
+    operand types. A run seeing another run's rewrite is only slower for it.
+    """
+
+    def __init__(self) -> None:
+        # Per specialization name, how many nodes were quickened and deoptimized.
+        self.specialized: dict[str, int] = {}
+        self.deoptimized: dict[str, int] = {}
+
+    def quicken(self, expr: Binary, left: object, right: object) -> None:
+        """Rewrite a generic Binary node for the operand types just observed."""
+        classes: dict[type, type] | None = QUICKENED.get(type(expr))
+        if classes is None:
+            # Another run sharing the tree was first.
+            return
+        specialization: type | None = None
+        if type(left) is float and type(right) is float:
+            specialization = _float_specializations.get(expr.operator.token_type)
+        elif type(left) is str and type(right) is str and expr.operator.token_type == TT.PLUS:
+            specialization = StringConcat
+
+        if specialization is None:
+            expr.__class__ = classes[UnspecializedBinary]
+            return
+
+        expr.__class__ = classes[specialization]
+        name: str = specialization.__name__
+        self.specialized[name] = self.specialized.get(name, 0) + 1
+
+    def deoptimize(self, expr: Binary, specialization: type) -> None:
+        """Send expr, evaluated as specialization, back to the generic path."""
+        if specialization.operand_type is None:
+            # Already deoptimized by another run sharing the tree.
+            return
+        name: str = specialization.__name__
+        self.deoptimized[name] = self.deoptimized.get(name, 0) + 1
+        expr.__class__ = specialization.unspecialized
+
+    def report(self) -> str:
+        specialized, deoptimized = self.specialized, self.deoptimized
+        lines: list[str] = ["Quickened nodes:"]
+        for name in sorted(specialized):
+            lines.append(
+                f"  {name:<20} {specialized[name]:>6} specialized {deoptimized.get(name, 0):>6} deoptimized"
+            )
+        lines.append(
+            f"  {'total':<20} {sum(specialized.values()):>6} specialized {sum(deoptimized.values()):>6} deoptimized"
+        )
+        return "\n".join(lines)
@@ -0,0 +1,111 @@
+from walker import AstWalker
+from ttoken import Token
+from Stmt import Stmt, Block, Var, Function, Import, Class
+from Expr import Assign, Variable, This, Super
+from lazy_function import LazyFunction, is_unparsed
+
+
+class Resolver(AstWalker):
+    """Static pass run over a parsed program before it is interpreted.
+
+    Blocks that don't declare anything directly get `scoped = False`, so the
+    interpreter runs them in the current environment instead of allocating a
+    new one. This matters most for loop bodies and the block the for loop
+    desugaring wraps around the body and increment.
+
+    Functions get the set of enclosing scopes that declare a name they refer
+    to in `captures`, so their closure doesn't keep every other scope alive.
+    Methods declare `this` in their own scope, and a class with a superclass
+    gets a scope of its own, keyed by the superclass expression, for `super`.
+    """
+
+    def __init__(self) -> None:
+        # Enclosing local scopes with every name they declare, wherever in the
+        # scope the declaration is. Variables are looked up dynamically so a
+        # later declaration can still be seen by an earlier closure.
+        self._scopes: list[tuple[Stmt, set[str]]] = []
+        # Names referenced by the functions being resolved.
+        self._references: list[set[str]] = []
+
+    def resolve(self, statements: list[Stmt]) -> list[Stmt]:
+        self.walk(statements)
+        return statements
+
+    def resolve_body(self, function: LazyFunction, body: list[Stmt]) -> list[Stmt]:
+        """Resolve the body of a lazy function once it has been parsed."""
+        self._scopes = function.scopes + [(function, self._function_names(function.params, body))]
+        self._references = [set()]
+        self.walk(body)
+        return body
+
+    def visit_block_stmt(self, stmt: Block):
+        stmt.scoped = any(isinstance(s, _DECLARATIONS) for s in stmt.statements)
+        if not stmt.scoped:
+            super().visit_block_stmt(stmt)
+            return
+
+        self._scopes.append((stmt, self._declared(stmt.statements)))
+        super().visit_block_stmt(stmt)
+        self._scopes.pop()
+
+    def visit_function_stmt(self, stmt: Function):
+        self._function(stmt, set())
+
+    def visit_class_stmt(self, stmt: Class):
+        self._walk_expr(stmt.superclass)
+        if stmt.superclass is not None:
+            self._scopes.append((stmt.superclass, {"super"}))
+        for method in stmt.methods:
+            self._function(method, {"this"})
+        if stmt.superclass is not None:
+            self._scopes.pop()
+
+    def _function(self, stmt: Function, implicit: set[str]):
+        if is_unparsed(stmt):
+            # Every identifier in the body stands in for the names it refers to.
+            references: set[str] = set(stmt.identifiers)
+            stmt.scopes = list(self._scopes)
+        else:
+            references = set()
+            self._references.append(references)
+            self._scopes.append((stmt, implicit | self._function_names(stmt.params, stmt.body)))
+            super().visit_function_stmt(stmt)
+            self._scopes.pop()
+            self._references.pop()
+
+        stmt.captures = frozenset(scope for scope, names in self._scopes if names & references)
+
+        # What a nested function refers to has to be kept alive by its parent too.
+        if self._references:
+            self._references[-1] |= references
+
+    def visit_variable_expr(self, expr: Variable):
+        if self._references:
+            self._references[-1].add(expr.name.lexeme)
+
+    def visit_assign_expr(self, expr: Assign):
+        if self._references:
+            self._references[-1].add(expr.name.lexeme)
+        super().visit_assign_expr(expr)
+
+    def visit_this_expr(self, expr: This):
+        if self._references:
+            self._references[-1].add("this")
+
+    def visit_super_expr(self, expr: Super):
+        if self._references:
+            self._references[-1] |= {"super", "this"}
+
+    def _function_names(self, params: list[Token], body: list[Stmt]) -> set[str]:
+        return {param.lexeme for param in params} | self._declared(body)
+
+    def _declared(self, statements: list[Stmt]) -> set[str]:
+        names: set[str] = set()
+        for statement in statements:
+            if isinstance(statement, _DECLARATIONS):
+                names.add(statement.name.lexeme)
+        return names
+
+
+# Statements that declare a name in the scope they are in.
+_DECLARATIONS = (Var, Function, Import, Class)
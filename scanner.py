@@ -1,4 +1,4 @@
-from pdb import set_trace
+from collections.abc import Iterator
 
 from ttoken import Token
 from ttoken import TokenType
@@ -6,14 +6,16 @@ from error import ErrorHandler
 
 
 class Scanner:
-    def __init__(self, source: str, error_handler: ErrorHandler):
+    def __init__(self, source: str, error_handler: ErrorHandler, line: int = 1, offset: int = 0):
         self._source: str = source
         self._tokens: list[Token] = []
         self._error_handler: ErrorHandler = error_handler
 
         self._start: int = 0
         self._current: int = 0
-        self._line: int = 1
+        self._line: int = line
+        # Added to token offsets when scanning a slice of a larger source.
+        self._offset: int = offset
 
         self._keywords = {
             "and": TokenType.AND,
@@ -33,6 +35,7 @@ class Scanner:
             "var": TokenType.VAR,
             "while": TokenType.WHILE,
             "break": TokenType.BREAK,
+            "import": TokenType.IMPORT,
         }
 
     def scan_tokens(self):
@@ -41,9 +44,23 @@ class Scanner:
             self._start = self._current
             self.scan_token()
 
-        self._tokens.append(Token(TokenType.EOF, "", None, self._line))
+        self._tokens.append(Token(TokenType.EOF, "", None, self._line, self._offset + self._current))
         return self._tokens
 
+    def scan_from(self, start: int, line: int) -> Iterator[Token]:
+        """Scan from start, which has to be outside any token, string or
+        comment, yielding the tokens as they are found and EOF last."""
+        self._current = start
+        self._line = line
+        while not self.is_at_end():
+            self._start = self._current
+            found: int = len(self._tokens)
+            self.scan_token()
+            if len(self._tokens) > found:
+                yield self._tokens[-1]
+
+        yield Token(TokenType.EOF, "", None, self._line, self._offset + self._current)
+
     def scan_token(self) -> None:
         char: str = self.advance()
         TT = TokenType
@@ -104,7 +121,7 @@ class Scanner:
 
     def add_token(self, token_type: TokenType, literal: object | None = None) -> None:
         text = self._source[self._start:self._current]
-        self._tokens.append(Token(token_type, text, literal, self._line))
+        self._tokens.append(Token(token_type, text, literal, self._line, self._offset + self._start))
 
     def identifier(self) -> None:
         while self.is_alpha_numeric(self.peek()):
@@ -148,17 +165,16 @@ class Scanner:
         return True
 
     def string(self) -> None:
-        while self.peek() != '"' and not self.is_at_end():
-            if self.peek() == "\n":
-                self._line += 1
-            self.advance()
-
-        if self.is_at_end():
+        end: int = self._source.find('"', self._current)
+        if end == -1:
+            self._line += self._source.count("\n", self._current)
+            self._current = len(self._source)
             self._error_handler.error(self._line, "Unterminated string.")
             return
 
-        # The closing ".
-        self.advance()
+        self._line += self._source.count("\n", self._current, end)
+        # Past the closing ".
+        self._current = end + 1
 
         value: str = self._source[self._start + 1:self._current - 1]
         self.add_token(TokenType.STRING, value)
@@ -177,16 +193,22 @@ class Scanner:
         self.add_token(TokenType.NUMBER, float(self._source[self._start:self._current]))
 
     def block_comment(self):
-        while not self.is_at_end():
-            char = self.advance()
-            # End of a code block
-            if char == "*" and self.peek() == "/":
-                self.advance()
-                break
-            # Start of new code block
-            if char == "/" and self.peek() == "*":
-                self.advance()
-                self.block_comment()
+        depth: int = 1
+        source: str = self._source
+        while depth:
+            close: int = source.find("*/", self._current)
+            if close == -1:
+                self._current = len(source)
+                return
+            # A nested comment starting before the end of this one, which
+            # wins the * they share in "/*/".
+            opening: int = source.find("/*", self._current, close + 1)
+            if opening == -1:
+                depth -= 1
+                self._current = close + 2
+            else:
+                depth += 1
+                self._current = opening + 2
 
     def is_at_end(self) -> bool:
         return self._current >= len(self._source)
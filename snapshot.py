@@ -0,0 +1,93 @@
+import hashlib
+import importlib.util
+import pickle
+import sys
+
+from environment import GlobalEnvironment
+from callable import LoxFunction
+from lazy_function import LazyFunction
+from Stmt import Function
+
+
+_MAGIC = b"LOXSNAP"
+_VERSION = 1
+
+# Modules whose classes end up in a snapshot. A change to any of them makes
+# older snapshots stale.
+_RUNTIME_MODULES = (
+    "Expr",
+    "Stmt",
+    "ttoken",
+    "tokentype",
+    "environment",
+    "callable",
+    "lox_class",
+    "lazy_function",
+    "quickening",
+    "inliner",
+    "definite_assignment",
+    "modules",
+    "interpreter",
+    "snapshot",
+)
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def save(globals: GlobalEnvironment, path: str) -> None:
+    """Write the globals, and everything they refer to, to path.
+
+    Functions keep their declarations and closures but not their compiled
+    code, lazy bodies are parsed first, and watchers on the globals are
+    dropped: the JIT starts over after a restore.
+    """
+    with open(path, "wb") as f:
+        f.write(_header())
+        try:
+            _Pickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(globals)
+        except RecursionError:
+            raise SnapshotError("the globals are nested too deeply.")
+        except (pickle.PicklingError, TypeError) as error:
+            raise SnapshotError(str(error))
+
+
+def load(path: str) -> GlobalEnvironment:
+    with open(path, "rb") as f:
+        header = _header()
+        if f.read(len(header)) != header:
+            raise SnapshotError(f"'{path}' was saved by another version of the interpreter.")
+        try:
+            return pickle.load(f)
+        except Exception as error:
+            raise SnapshotError(f"'{path}' is damaged: {error}")
+
+
+def _header() -> bytes:
+    digest = hashlib.sha256(f"{sys.version_info[:2]}".encode())
+    for name in _RUNTIME_MODULES:
+        digest.update(importlib.util.find_spec(name).loader.get_source(name).encode("utf-8"))
+    return _MAGIC + bytes([_VERSION]) + digest.digest()
+
+
+class _Pickler(pickle.Pickler):
+    def reducer_override(self, obj: object):
+        # The state is set after the object is memoized, so cycles through
+        # closures and the globals restore fine.
+        if type(obj) is LoxFunction:
+            state = dict(vars(obj), compiled=None)
+            return object.__new__, (LoxFunction,), state
+        if type(obj) is GlobalEnvironment:
+            state = dict(vars(obj), _watchers={})
+            return object.__new__, (GlobalEnvironment,), state
+        if isinstance(obj, LazyFunction):
+            # Saved parsed, as the plain declaration it stands for.
+            state = {
+                "name": obj.name,
+                "params": obj.params,
+                "body": obj.body,
+                "captures": obj.captures,
+            }
+            return object.__new__, (Function,), state
+        return NotImplemented
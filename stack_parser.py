@@ -0,0 +1,372 @@
+from collections.abc import Generator
+from types import GeneratorType
+
+from ttoken import Token
+from Expr import Expr, Binary, Ternary, Unary, Grouping, Logical, Call, Literal
+from Stmt import Stmt, Var, Print, ExprStmt, Block, If, While, Function, Class
+from tokentype import TokenType
+from error import ErrorHandler
+from lazy_function import LazyFunction
+from parser import Parser, LazyBodies, ParseError, _ASSIGNMENT, _OR, _AND, _EQUALITY
+from parser import _COMPARISON, _TERM, _FACTOR, _UNARY, _CALL
+
+
+# Counted in rule frames: one level of parentheses takes four.
+DEFAULT_MAX_DEPTH = 200_000
+
+# A grammar rule that yields the rules it would otherwise call recursively
+# and gets their result sent back.
+Rule = Generator[Generator, object, object]
+
+
+class StackParser(Parser):
+    """A Parser that keeps its rules on an explicit stack.
+
+    Every rule that would recurse yields the generator of the rule it needs
+    instead, and a loop in `_run` drives the innermost one. Nesting depth is
+    then only limited by memory, and `max_depth` turns input that nests too
+    deep into a parse error instead of a crash. Errors are thrown into the
+    rule that yielded, so error recovery works as in the Parser and the trees
+    are identical.
+    """
+
+    def __init__(
+        self,
+        tokens: list[Token],
+        error_handler: ErrorHandler,
+        lazy: LazyBodies | None = None,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+    ) -> None:
+        super().__init__(tokens, error_handler, lazy)
+        self._max_depth = max_depth
+
+    def _top_level_declaration(self) -> Stmt | None:
+        return self._run(self._declaration())
+
+    def _run(self, rule: Rule) -> object:
+        stack: list[Rule] = [rule]
+        value: object = None
+        error: BaseException | None = None
+
+        while True:
+            try:
+                if error is not None:
+                    error, thrown = None, error
+                    called = stack[-1].throw(thrown)
+                else:
+                    called = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                if not stack:
+                    return stop.value
+                value = stop.value
+                continue
+            except ParseError as parse_error:
+                stack.pop()
+                if not stack:
+                    raise
+                error = parse_error
+                continue
+
+            if len(stack) >= self._max_depth:
+                called.close()
+                error = self._error(self._peek(), "Too much nesting.")
+                continue
+
+            stack.append(called)
+            value = None
+
+    def _expression(self) -> Rule:
+        return (yield self._ternary())
+
+    def _declaration(self) -> Rule:
+        try:
+            if self._match(TokenType.CLASS):
+                return (yield self._class_declaration())
+            if self._match(TokenType.FUN):
+                return (yield self._function("function"))
+            if self._match(TokenType.VAR):
+                return (yield self._var_declaration())
+            if self._match(TokenType.IMPORT):
+                return self._import_declaration()
+            return (yield self._statement())
+        except ParseError:
+            self._synchronize()
+            return None
+
+    def _statement(self) -> Rule:
+        if self._match(TokenType.FOR):
+            return (yield self._for_statement())
+        if self._match(TokenType.IF):
+            return (yield self._if_statement())
+        if self._match(TokenType.PRINT):
+            return (yield self._print_statement())
+        if self._match(TokenType.RETURN):
+            return (yield self._return_statement())
+        if self._match(TokenType.WHILE):
+            return (yield self._while_statement())
+        if self._match(TokenType.LEFT_BRACE):
+            brace: Token = self._previous()
+            block: Block = Block((yield self._block()))
+            block.start = brace
+            return block
+        if self._match(TokenType.BREAK):
+            return self._break_statement()
+
+        return (yield self._expression_statement())
+
+    def _class_declaration(self) -> Rule:
+        name, superclass = self._class_header()
+        methods: list[Function] = []
+        try:
+            while not self._check(TokenType.RIGHT_BRACE) and not self._is_at_end():
+                methods.append((yield self._function("method")))
+        finally:
+            self._classes.pop()
+        self._consume(TokenType.RIGHT_BRACE, "Expect '}' after class body.")
+        return Class(name, superclass, methods)
+
+    def _for_statement(self) -> Rule:
+        keyword: Token = self._previous()
+        self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
+
+        initializer: Stmt
+        if self._match(TokenType.SEMICOLON):
+            initializer = None
+        elif self._match(TokenType.VAR):
+            initializer = yield self._var_declaration()
+        else:
+            initializer = yield self._expression_statement()
+
+        condition: Expr = None
+        if not self._check(TokenType.SEMICOLON):
+            condition = yield self._expression()
+        self._consume(TokenType.SEMICOLON, "Expect ';' after loop condition.")
+
+        increment: Expr = None
+        if not self._check(TokenType.RIGHT_PAREN):
+            increment = yield self._expression()
+        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
+
+        body: Stmt = yield self._statement()
+
+        if increment is not None:
+            body = Block([
+                body,
+                ExprStmt(increment)
+            ])
+
+        if condition is None:
+            condition = Literal(True)
+
+        body = While(condition, body)
+        body.start = keyword
+
+        if initializer is not None:
+            body = Block([
+                initializer,
+                body,
+            ])
+
+        return body
+
+    def _if_statement(self) -> Rule:
+        keyword: Token = self._previous()
+        self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
+        condition: Expr = yield self._expression()
+        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
+
+        then_branch: Stmt = yield self._statement()
+        else_branch: Stmt | None = None
+        if self._match(TokenType.ELSE):
+            else_branch = yield self._statement()
+
+        statement: If = If(condition, then_branch, else_branch)
+        statement.start = keyword
+        return statement
+
+    def _print_statement(self) -> Rule:
+        keyword: Token = self._previous()
+        value: Expr = yield self._expression()
+        self._consume(TokenType.SEMICOLON, "Expect ';' after value.")
+        statement: Print = Print(value)
+        statement.start = keyword
+        return statement
+
+    def _return_statement(self) -> Rule:
+        keyword: Token = self._previous()
+        value: None | Expr = None
+        if not self._check(TokenType.SEMICOLON):
+            value = yield self._expression()
+
+        self._consume(TokenType.SEMICOLON, "Expect ';' after return value.")
+        return self._return(keyword, value)
+
+    def _var_declaration(self) -> Rule:
+        name: Token = self._consume(TokenType.IDENTIFIER, "Expect variable name.")
+
+        initializer: Expr | None = None
+        if self._match(TokenType.EQUAL):
+            initializer = yield self._expression()
+
+        self._consume(TokenType.SEMICOLON, "Expect ';' after variable declaration.")
+        return Var(name, initializer)
+
+    def _while_statement(self) -> Rule:
+        keyword: Token = self._previous()
+        self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
+        expr: Expr = yield self._expression()
+        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after condition.")
+        body: Stmt = yield self._statement()
+
+        statement: While = While(expr, body)
+        statement.start = keyword
+        return statement
+
+    def _expression_statement(self) -> Rule:
+        start: Token = self._peek()
+        value: Expr = yield self._expression()
+        self._consume(TokenType.SEMICOLON, "Expect ';' after value.")
+        statement: ExprStmt = ExprStmt(value)
+        statement.start = start
+        return statement
+
+    def _function(self, kind: str) -> Rule:
+        name: Token = self._consume(TokenType.IDENTIFIER, f"Expect {kind} name.")
+        self._consume(TokenType.LEFT_PAREN, f"Expect '(' after {kind} name.")
+        parameters: list[Token] = []
+
+        if not self._check(TokenType.RIGHT_PAREN):
+            parameters.append(
+                self._consume(TokenType.IDENTIFIER, "Expect parameter name.")
+            )
+            while self._match(TokenType.COMMA):
+                if len(parameters) >= 255:
+                    self._error(self._peek(), "Can't have more then 255 parameters.")
+                parameters.append(
+                    self._consume(TokenType.IDENTIFIER, "Expect parameter name.")
+                )
+
+        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after parameters.")
+
+        self._consume(TokenType.LEFT_BRACE, f"Expect '{{' before {kind} body.")
+        if self._lazy is not None and kind == "function":
+            function: LazyFunction | None = self._lazy_function(name, parameters)
+            if function is not None:
+                return function
+
+        self._function_kinds.append(self._body_kind(kind, name))
+        try:
+            body: list[Stmt] = yield self._block()
+        finally:
+            self._function_kinds.pop()
+
+        return Function(name, parameters, body)
+
+    def _block(self) -> Rule:
+        statements: list[Stmt] = []
+        while not self._check(TokenType.RIGHT_BRACE):
+            statements.append((yield self._declaration()))
+        self._consume(TokenType.RIGHT_BRACE, "Expect '}' after block.")
+        return statements
+
+    def _ternary(self) -> Rule:
+        expr: Expr = yield self._precedence(_ASSIGNMENT)
+
+        if not self._match(TokenType.QUESTION_MARK):
+            return expr
+
+        operator: Token = self._previous()
+        left: Expr = yield self._expression()
+
+        branch_operator: Token = self._advance()
+        if branch_operator.token_type != TokenType.COLON:
+            raise self._error(branch_operator, "Expected colon in ternary.")
+
+        right: Expr = yield self._expression()
+        expr = Ternary(expr, operator, left, branch_operator, right)
+
+        return expr
+
+    def _precedence(self, min_power: int) -> Rule:
+        token: Token = self._tokens[self._current]
+        prefix = self._prefix.get(token.token_type)
+        if prefix is None:
+            raise self._error(token, "Expect expression.")
+        self._current += 1
+        expr = prefix(self, token)
+        if isinstance(expr, GeneratorType):
+            expr = yield expr
+
+        while True:
+            token = self._tokens[self._current]
+            infix = self._infix.get(token.token_type)
+            if infix is None or infix[0] < min_power:
+                return expr
+            self._current += 1
+            expr = infix[1](self, expr, token)
+            if isinstance(expr, GeneratorType):
+                expr = yield expr
+
+    def _grouping(self, token: Token) -> Rule:
+        expr: Expr = yield self._expression()
+        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
+        return Grouping(expr)
+
+    def _unary(self, operator: Token) -> Rule:
+        return Unary(operator, (yield self._precedence(_UNARY)))
+
+    def _binary(self, left: Expr, operator: Token) -> Rule:
+        power: int = self._infix[operator.token_type][0] + 1
+        return Binary(left, operator, (yield self._precedence(power)))
+
+    def _logical(self, left: Expr, operator: Token) -> Rule:
+        power: int = self._infix[operator.token_type][0] + 1
+        return Logical(left, operator, (yield self._precedence(power)))
+
+    def _assignment(self, target: Expr, equals: Token) -> Rule:
+        value: Expr = yield self._precedence(_ASSIGNMENT)
+        return self._assignment_to(target, equals, value)
+
+    def _call(self, callee: Expr, paren: Token) -> Rule:
+        return (yield self._finish_call(callee))
+
+    def _finish_call(self, callee: Expr) -> Rule:
+        arguments: list[Expr] = []
+
+        if not self._check(TokenType.RIGHT_PAREN):
+            arguments.append((yield self._expression()))
+
+            while self._match(TokenType.COMMA):
+                if len(arguments) >= 255:
+                    self._erro(self._peek(), "Can't have more then 255 arguments.")
+
+                arguments.append((yield self._expression()))
+
+        paren: Token = self._consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
+        return Call(callee, paren, arguments)
+
+
+StackParser._prefix = Parser._prefix | {
+    TokenType.LEFT_PAREN: StackParser._grouping,
+    TokenType.BANG: StackParser._unary,
+    TokenType.MINUS: StackParser._unary,
+}
+
+StackParser._infix = {
+    TokenType.EQUAL: (_ASSIGNMENT, StackParser._assignment),
+    TokenType.OR: (_OR, StackParser._logical),
+    TokenType.AND: (_AND, StackParser._logical),
+    TokenType.BANG_EQUAL: (_EQUALITY, StackParser._binary),
+    TokenType.EQUAL_EQUAL: (_EQUALITY, StackParser._binary),
+    TokenType.GREATER: (_COMPARISON, StackParser._binary),
+    TokenType.GREATER_EQUAL: (_COMPARISON, StackParser._binary),
+    TokenType.LESS: (_COMPARISON, StackParser._binary),
+    TokenType.LESS_EQUAL: (_COMPARISON, StackParser._binary),
+    TokenType.MINUS: (_TERM, StackParser._binary),
+    TokenType.PLUS: (_TERM, StackParser._binary),
+    TokenType.SLASH: (_FACTOR, StackParser._binary),
+    TokenType.STAR: (_FACTOR, StackParser._binary),
+    TokenType.LEFT_PAREN: (_CALL, StackParser._call),
+    TokenType.DOT: (_CALL, Parser._get),
+}
@@ -0,0 +1,212 @@
+from tokentype import TokenType as TT
+
+
+class SyntaxValidator:
+    """Checks that a block follows the grammar without building any nodes.
+
+    Mirrors the Parser rule for rule but only looks at token types, so it is
+    much cheaper than parsing. It is at least as strict as the Parser: when it
+    says a block is invalid the Parser is run on it to report the errors.
+    """
+
+    def __init__(self, types: list[TT]) -> None:
+        self._types = types
+        self._current = 0
+
+    def block_end(self, start: int) -> int:
+        """Index after the '}' closing the block starting at start, or -1."""
+        self._current = start
+        try:
+            self._block()
+        except _Invalid:
+            return -1
+        except RecursionError:
+            return -1
+        return self._current
+
+    def _declaration(self) -> None:
+        if self._match(TT.FUN):
+            self._function()
+        elif self._match(TT.VAR):
+            self._var_declaration()
+        elif self._check(TT.IMPORT):
+            # Whether the module name is valid depends on the path, which
+            # only the Parser sees.
+            raise _Invalid
+        else:
+            self._statement()
+
+    def _function(self) -> None:
+        self._consume(TT.IDENTIFIER)
+        self._consume(TT.LEFT_PAREN)
+        if not self._check(TT.RIGHT_PAREN):
+            self._consume(TT.IDENTIFIER)
+            parameters = 1
+            while self._match(TT.COMMA):
+                if parameters >= 255:
+                    raise _Invalid
+                self._consume(TT.IDENTIFIER)
+                parameters += 1
+        self._consume(TT.RIGHT_PAREN)
+        self._consume(TT.LEFT_BRACE)
+        self._block()
+
+    def _var_declaration(self) -> None:
+        self._consume(TT.IDENTIFIER)
+        if self._match(TT.EQUAL):
+            self._expression()
+        self._consume(TT.SEMICOLON)
+
+    def _block(self) -> None:
+        while not self._check(TT.RIGHT_BRACE):
+            self._declaration()
+        self._consume(TT.RIGHT_BRACE)
+
+    def _statement(self) -> None:
+        if self._match(TT.FOR):
+            self._consume(TT.LEFT_PAREN)
+            if self._match(TT.SEMICOLON):
+                pass
+            elif self._match(TT.VAR):
+                self._var_declaration()
+            else:
+                self._expression()
+                self._consume(TT.SEMICOLON)
+            if not self._check(TT.SEMICOLON):
+                self._expression()
+            self._consume(TT.SEMICOLON)
+            if not self._check(TT.RIGHT_PAREN):
+                self._expression()
+            self._consume(TT.RIGHT_PAREN)
+            self._statement()
+        elif self._match(TT.IF):
+            self._consume(TT.LEFT_PAREN)
+            self._expression()
+            self._consume(TT.RIGHT_PAREN)
+            self._statement()
+            if self._match(TT.ELSE):
+                self._statement()
+        elif self._match(TT.PRINT):
+            self._expression()
+            self._consume(TT.SEMICOLON)
+        elif self._match(TT.RETURN):
+            if not self._check(TT.SEMICOLON):
+                self._expression()
+            self._consume(TT.SEMICOLON)
+        elif self._match(TT.WHILE):
+            self._consume(TT.LEFT_PAREN)
+            self._expression()
+            self._consume(TT.RIGHT_PAREN)
+            self._statement()
+        elif self._match(TT.LEFT_BRACE):
+            self._block()
+        elif self._match(TT.BREAK):
+            self._consume(TT.SEMICOLON)
+        else:
+            self._expression()
+            self._consume(TT.SEMICOLON)
+
+    def _expression(self) -> None:
+        self._assignment()
+        if self._match(TT.QUESTION_MARK):
+            self._expression()
+            self._consume(TT.COLON)
+            self._expression()
+
+    # The expression rules return whether what they matched is a lone
+    # variable or ends in a property, the only valid assignment targets.
+    # 'class', 'this' and 'super' are never valid here: whether they are
+    # depends on the class around the block, which only the Parser tracks.
+
+    def _assignment(self) -> bool:
+        is_variable = self._binary(0)
+        if self._match(TT.EQUAL):
+            self._assignment()
+            if not is_variable:
+                raise _Invalid
+            return False
+        return is_variable
+
+    def _binary(self, level: int) -> bool:
+        if level == len(_BINARY_LEVELS):
+            return self._unary()
+
+        operators = _BINARY_LEVELS[level]
+        is_variable = self._binary(level + 1)
+        while self._types[self._current] in operators:
+            self._current += 1
+            self._binary(level + 1)
+            is_variable = False
+        return is_variable
+
+    def _unary(self) -> bool:
+        if self._match(TT.BANG) or self._match(TT.MINUS):
+            self._unary()
+            return False
+        return self._call()
+
+    def _call(self) -> bool:
+        is_variable = self._primary()
+        while True:
+            if self._match(TT.DOT):
+                self._consume(TT.IDENTIFIER)
+                is_variable = True
+                continue
+            if self._match(TT.LEFT_PAREN):
+                if not self._check(TT.RIGHT_PAREN):
+                    self._expression()
+                    arguments = 1
+                    while self._match(TT.COMMA):
+                        if arguments >= 255:
+                            raise _Invalid
+                        self._expression()
+                        arguments += 1
+                self._consume(TT.RIGHT_PAREN)
+            else:
+                return is_variable
+            is_variable = False
+
+    def _primary(self) -> bool:
+        token_type: TT = self._types[self._current]
+        if token_type in _LITERALS:
+            self._current += 1
+            return False
+        if token_type == TT.IDENTIFIER:
+            self._current += 1
+            return True
+        if token_type == TT.LEFT_PAREN:
+            self._current += 1
+            self._expression()
+            self._consume(TT.RIGHT_PAREN)
+            return False
+        raise _Invalid
+
+    def _match(self, token_type: TT) -> bool:
+        if self._types[self._current] == token_type and token_type != TT.EOF:
+            self._current += 1
+            return True
+        return False
+
+    def _check(self, token_type: TT) -> bool:
+        current: TT = self._types[self._current]
+        return current == token_type and current != TT.EOF
+
+    def _consume(self, token_type: TT) -> None:
+        if not self._match(token_type):
+            raise _Invalid
+
+
+_BINARY_LEVELS: tuple[frozenset[TT], ...] = (
+    frozenset({TT.OR}),
+    frozenset({TT.AND}),
+    frozenset({TT.BANG_EQUAL, TT.EQUAL_EQUAL}),
+    frozenset({TT.GREATER, TT.GREATER_EQUAL, TT.LESS, TT.LESS_EQUAL}),
+    frozenset({TT.MINUS, TT.PLUS}),
+    frozenset({TT.SLASH, TT.STAR}),
+)
+
+_LITERALS = frozenset({TT.FALSE, TT.TRUE, TT.NIL, TT.NUMBER, TT.STRING})
+
+
+class _Invalid(Exception):
+    pass
@@ -55,6 +55,7 @@ class TokenType(EnumAutoName):
     VAR = auto()
     WHILE = auto()
     BREAK = auto()
+    IMPORT = auto()
 
     EOF = auto()
 
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+import resource
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from error import ErrorHandler
+from lox import Lox
+from async_interpreter import AsyncInterpreter
+
+# A mostly idle handler: a little work between long waits.
+HANDLER = """
+var total = 0;
+for (var round = 0; round < {rounds}; round = round + 1) {{
+    for (var i = 0; i < 20; i = i + 1) total = total + i * round;
+    sleep({sleep});
+}}
+print total;
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run many Lox scripts concurrently on one event loop."
+    )
+    parser.add_argument("--scripts", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--sleep", type=int, default=100, help="milliseconds per round")
+    parser.add_argument(
+        "--cpu", metavar="SCRIPT", help="also time SCRIPT on both interpreters, without the JIT"
+    )
+    args = parser.parse_args()
+
+    source = HANDLER.format(rounds=args.rounds, sleep=args.sleep)
+    output = io.StringIO()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with redirect_stdout(output):
+        statuses = asyncio.run(run_all(source, args.scripts))
+    elapsed = time.perf_counter() - start
+    # In KiB on Linux.
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * 1024
+
+    idle = args.rounds * args.sleep / 1000
+    print(
+        f"{args.scripts} scripts: {elapsed:.2f} s, of which {idle:.2f} s each is sleeping; "
+        f"{sum(1 for status in statuses if status)} failed, "
+        f"{output.getvalue().count(chr(10))} lines printed"
+    )
+    print(
+        f"peak memory grew {peak / 2**20:.1f} MiB, {peak / args.scripts / 1024:.1f} KiB per script"
+    )
+
+    if args.cpu:
+        cpu(args.cpu)
+
+
+async def run_all(source: str, count: int) -> list[int]:
+    path = os.path.join(ROOT, "<handler>")
+    return await asyncio.gather(
+        *(
+            Lox(ErrorHandler(), jit_threshold=None, interpreter_class=AsyncInterpreter)
+            .run_source_async(source, path)
+            for _ in range(count)
+        )
+    )
+
+
+def cpu(path: str) -> None:
+    """What suspending costs a script that never sleeps."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        Lox(ErrorHandler(), jit_threshold=None).run_source(source, path)
+        walker = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lox = Lox(ErrorHandler(), jit_threshold=None, interpreter_class=AsyncInterpreter)
+        asyncio.run(lox.run_source_async(source, path))
+        cooperative = time.perf_counter() - start
+
+    print(
+        f"{path}: tree walker {walker * 1000:.1f} ms, "
+        f"asyncio {cooperative * 1000:.1f} ms ({cooperative / walker:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
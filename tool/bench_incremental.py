@@ -0,0 +1,113 @@
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tool"))
+
+from error import ErrorHandler
+from scanner import Scanner
+from parser import Parser
+from incremental import Document
+from generate_bench import library
+
+METRIC = os.path.join(ROOT, "bench", "incremental.txt")
+
+# Milliseconds the median keystroke may take on the generated file.
+DEFAULT_BUDGET = 5.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long an edit takes to rescan and reparse.")
+    parser.add_argument("--lines", type=int, default=50_000)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET)
+    parser.add_argument("--record", action="store_true", help=f"write the results to {METRIC}")
+    args = parser.parse_args()
+
+    # library writes seven lines per function.
+    source: str = library(args.lines // 7)
+    errors = ErrorHandler(io.StringIO())
+
+    start = time.perf_counter()
+    Parser(Scanner(source, errors).scan_tokens(), errors).parse()
+    full: float = time.perf_counter() - start
+
+    start = time.perf_counter()
+    document = Document(source, errors)
+    opened: float = time.perf_counter() - start
+
+    sessions = {
+        "typing a statement": typing,
+        "opening a string": lambda document, rng: delimited(document, rng, '"', '"'),
+        "opening a comment": lambda document, rng: delimited(document, rng, "/*", "*/"),
+    }
+    rng = random.Random(0)
+    timings: dict[str, list[float]] = {}
+    for name, session in sessions.items():
+        timings[name] = []
+        while len(timings[name]) < args.edits:
+            for edit in session(document, rng):
+                start = time.perf_counter()
+                document.edit(*edit)
+                timings[name].append(time.perf_counter() - start)
+
+    lines = [
+        f"{source.count(chr(10))} lines, {len(document.tokens)} tokens:",
+        f"  full scan and parse  {full * 1000:8.1f} ms",
+        f"  opening the document {opened * 1000:8.1f} ms",
+        "per edit:                  median      p95      max",
+    ]
+    for name, seconds in timings.items():
+        seconds.sort()
+        lines.append(
+            f"  {name:<22} {statistics.median(seconds) * 1000:6.2f} ms "
+            f"{seconds[int(len(seconds) * 0.95)] * 1000:6.2f} ms {seconds[-1] * 1000:6.1f} ms"
+        )
+    report = "\n".join(lines)
+    print(report)
+
+    if args.record:
+        with open(METRIC, "w") as f:
+            f.write(report + "\n")
+
+    median = statistics.median(timings["typing a statement"]) * 1000
+    if median > args.budget:
+        print(f"over the edit budget: {median:.2f} ms > {args.budget:.2f} ms")
+        sys.exit(1)
+
+
+def typing(document: Document, rng: random.Random) -> list[tuple[int, int, str]]:
+    """Type a statement into a function body a key at a time, then delete it
+    the same way."""
+    at: int = _statement_start(document, rng)
+    statement: str = "total = total + helper0(b, 2);\n    "
+    edits = [(at + i, at + i, char) for i, char in enumerate(statement)]
+    edits += [(at + i - 1, at + i, "") for i in range(len(statement), 0, -1)]
+    return edits
+
+
+def delimited(document: Document, rng: random.Random, left: str, right: str):
+    """Open a string or comment, which swallows the rest of the file until it
+    is closed a few keys later, and take it out again."""
+    at: int = _statement_start(document, rng)
+    text: str = f"{left} note {right}"
+    edits = [(at, at, left)]
+    edits += [(at + len(left) + i, at + len(left) + i, char) for i, char in enumerate(text[len(left):])]
+    edits.append((at, at + len(text), ""))
+    return edits
+
+
+def _statement_start(document: Document, rng: random.Random) -> int:
+    """The offset of a `return` somewhere in the file."""
+    at: int = document.source.find("return", rng.randrange(len(document.source)))
+    return at if at != -1 else document.source.find("return")
+
+
+if __name__ == "__main__":
+    main()
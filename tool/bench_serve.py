@@ -0,0 +1,105 @@
+import argparse
+import io
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import lox_client
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare starting pylox per script with a --serve worker pool."
+    )
+    parser.add_argument("script")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--cold", type=int, default=20, help="cold starts to time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    args = parser.parse_args()
+    script = os.path.abspath(args.script)
+
+    cold = []
+    for _ in range(args.cold):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, "lox.py"), script],
+            stdout=subprocess.DEVNULL,
+            check=False,
+        )
+        cold.append(time.perf_counter() - start)
+    report("cold start", cold)
+
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "lox.sock")
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(ROOT, "lox.py"),
+                "--serve",
+                socket_path,
+                "--workers",
+                str(args.workers),
+            ],
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while not os.path.exists(socket_path):
+                time.sleep(0.01)
+            benchmark_server(socket_path, script, args)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+
+
+def benchmark_server(socket_path: str, script: str, args) -> None:
+    request = {"path": script}
+
+    def send() -> float:
+        start = time.perf_counter()
+        lox_client.run(socket_path, request, io.BytesIO(), io.BytesIO())
+        return time.perf_counter() - start
+
+    # Let every worker see the script once.
+    for _ in range(args.workers):
+        send()
+
+    report("warm server", [send() for _ in range(args.requests)])
+
+    def client(count: int) -> None:
+        for _ in range(count):
+            send()
+
+    per_client = args.requests // args.clients
+    threads = [threading.Thread(target=client, args=(per_client,)) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(
+        f"throughput: {per_client * args.clients / elapsed:.0f} scripts/s "
+        f"with {args.clients} clients and {args.workers} workers"
+    )
+
+
+def report(name: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{name}: median {statistics.median(timings) * 1000:.2f} ms, "
+        f"p99 {p99 * 1000:.2f} ms over {len(timings)} runs"
+    )
+
+
+if __name__ == "__main__":
+    main()
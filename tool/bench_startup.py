@@ -0,0 +1,92 @@
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRIC = os.path.join(ROOT, "bench", "startup.txt")
+
+# Milliseconds pylox may add to a bare Python startup before the first
+# statement of a one line script runs.
+DEFAULT_BUDGET = 30.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long pylox takes to start.")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET)
+    parser.add_argument("--record", action="store_true", help=f"write the results to {METRIC}")
+    args = parser.parse_args()
+
+    # Startup is measured with up to date bytecode, as users get it.
+    compileall.compile_dir(ROOT, maxlevels=0, quiet=1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, "one_line.lox")
+        with open(script, "w") as f:
+            f.write('print "ready";\n')
+
+        commands = {"python": [sys.executable, "-c", "print('ready')"]}
+        commands["lox.py"] = [sys.executable, os.path.join(ROOT, "lox.py"), script]
+        bundle = os.path.join(ROOT, "dist", "pylox.pyz")
+        if os.path.exists(bundle):
+            commands["pylox.pyz"] = [sys.executable, bundle, script]
+
+        results = {
+            name: statistics.median(first_output(command) for _ in range(args.runs))
+            for name, command in commands.items()
+        }
+        imports = import_times([sys.executable, "-X", "importtime"] + commands["lox.py"][1:])
+
+    floor = results["python"]
+    lines = [f"time to first statement, median of {args.runs} runs:"]
+    for name, seconds in results.items():
+        lines.append(f"  {name:<10} {seconds * 1000:7.1f} ms  +{(seconds - floor) * 1000:.1f} ms")
+    lines.append(f"imports beyond a bare python: {sum(imports.values()) / 1000:.1f} ms, slowest:")
+    for module, micros in sorted(imports.items(), key=lambda item: -item[1])[:8]:
+        lines.append(f"  {module:<20} {micros / 1000:6.2f} ms")
+    report = "\n".join(lines)
+    print(report)
+
+    if args.record:
+        with open(METRIC, "w") as f:
+            f.write(report + "\n")
+
+    overhead = (results["lox.py"] - floor) * 1000
+    if overhead > args.budget:
+        print(f"over the startup budget: +{overhead:.1f} ms > {args.budget:.1f} ms")
+        sys.exit(1)
+
+
+def first_output(command: list[str]) -> float:
+    """Seconds from starting command until it writes its first byte."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    process.stdout.read(1)
+    elapsed = time.perf_counter() - start
+    process.communicate()
+    return elapsed
+
+
+def import_times(command: list[str]) -> dict[str, int]:
+    """Microseconds each module took to import itself, less what python -c imports."""
+    def self_times(command: list[str]) -> dict[str, int]:
+        output = subprocess.run(command, capture_output=True, text=True).stderr
+        times: dict[str, int] = {}
+        for line in output.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            own, _, name = line[len("import time:"):].split("|")
+            times[name.strip()] = int(own)
+        return times
+
+    bare = self_times([sys.executable, "-X", "importtime", "-c", "pass"])
+    return {name: own for name, own in self_times(command).items() if name not in bare}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from error import ErrorHandler
+from lox import Lox
+from interpreter import Interpreter
+from jit import DEFAULT_THRESHOLD
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run one parsed script in many threads and measure how throughput scales."
+    )
+    parser.add_argument("script")
+    parser.add_argument("--runs", type=int, default=32, help="runs per thread count")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--no-jit", action="store_true", help="only use the tree walker")
+    args = parser.parse_args()
+
+    with open(args.script, encoding="utf-8") as f:
+        source = f.read()
+    statements = Lox(ErrorHandler()).compile(source)
+    if statements is None:
+        sys.exit(65)
+    jit_threshold = None if args.no_jit else DEFAULT_THRESHOLD
+
+    def run() -> str:
+        # Everything but the syntax tree belongs to this run.
+        out = io.StringIO()
+        interpreter = Interpreter(ErrorHandler(out), jit_threshold, out=out)
+        interpreter.interpret(statements)
+        return out.getvalue()
+
+    expected = run()
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"{args.script}: {args.runs} runs per thread count, GIL {'on' if gil else 'off'}")
+
+    single = None
+    threads = 1
+    while threads <= args.threads:
+        with ThreadPoolExecutor(threads) as pool:
+            start = time.perf_counter()
+            outputs = list(pool.map(lambda _: run(), range(args.runs)))
+            elapsed = time.perf_counter() - start
+        if any(output != expected for output in outputs):
+            print(f"{threads} threads: output differs from a single run")
+            sys.exit(1)
+
+        throughput = args.runs / elapsed
+        single = single or throughput
+        print(
+            f"{threads:>3} threads: {throughput:8.1f} runs/s, "
+            f"{throughput / single:.2f}x one thread ({throughput / single / threads:.0%} efficiency)"
+        )
+        threads *= 2
+
+
+if __name__ == "__main__":
+    main()
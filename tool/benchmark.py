@@ -0,0 +1,163 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from error import ErrorHandler
+from lox import Lox
+from scanner import Scanner
+from parser import Parser
+from stack_parser import StackParser
+from flat_ast import flatten, FlatAst
+from jit import DEFAULT_THRESHOLD
+from budget import Budget
+import environment
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a Lox script.")
+    parser.add_argument("script")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--memory", action="store_true", help="report memory still held after the run"
+    )
+    parser.add_argument("--no-jit", action="store_true", help="only use the tree walker")
+    parser.add_argument("--lazy", action="store_true", help="parse function bodies lazily")
+    parser.add_argument(
+        "--no-shake", action="store_true", help="keep the functions the script never uses"
+    )
+    parser.add_argument(
+        "--budget", action="store_true", help="run under budgets too large to run out"
+    )
+    parser.add_argument("--parse", action="store_true", help="only time the parser")
+    parser.add_argument(
+        "--stack", action="store_true", help="time the explicit stack parser instead"
+    )
+    parser.add_argument(
+        "--ast-size", action="store_true", help="compare node objects with the flat tree"
+    )
+    args = parser.parse_args()
+
+    if args.ast_size:
+        ast_size(args.script)
+        return
+    if args.parse:
+        parsing(args.script, args.repeat, StackParser if args.stack else Parser)
+        return
+
+    options = {
+        "jit_threshold": None if args.no_jit else DEFAULT_THRESHOLD,
+        "lazy": args.lazy,
+        "shake": not args.no_shake,
+    }
+    if args.budget:
+        options["budget"] = Budget(
+            max_steps=10**12, timeout=3600.0, max_depth=10_000, max_memory=2**40
+        )
+    if args.memory:
+        memory(args.script, options)
+    else:
+        timing(args.script, args.repeat, options)
+
+
+def timing(path: str, repeat: int, options: dict) -> None:
+    created = count_environments()
+    timings = []
+    for _ in range(repeat):
+        lox = Lox(error_handler=ErrorHandler(), **options)
+        with silenced():
+            start = time.perf_counter()
+            lox.run_file(path)
+            timings.append(time.perf_counter() - start)
+
+    # Modules are cached after the first run, it shows what parsing them costs.
+    print(
+        f"{path}: best {min(timings) * 1000:.1f} ms over {repeat} runs, "
+        f"first {timings[0] * 1000:.1f} ms"
+    )
+    print(f"environments created per run: {created[0] // repeat}")
+
+
+def parsing(path: str, repeat: int, parser_class: type) -> None:
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    error_handler = ErrorHandler()
+    tokens = Scanner(source, error_handler).scan_tokens()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser_class(tokens, error_handler).parse()
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"{path}: parsed {len(tokens)} tokens in {best * 1000:.1f} ms")
+    print(f"parse throughput: {len(tokens) / best / 1000:.0f}k tokens/s")
+
+
+def ast_size(path: str) -> None:
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    error_handler = ErrorHandler()
+
+    # The tree and the tokens it still refers to once the token list is gone.
+    tracemalloc.start()
+    tokens = Scanner(source, error_handler).scan_tokens()
+    statements = Parser(tokens, error_handler).parse()
+    del tokens
+    objects = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    data = flatten(statements).to_bytes()
+    flattened = time.perf_counter() - start
+    del statements
+
+    start = time.perf_counter()
+    FlatAst.from_buffer(data)
+    loaded = time.perf_counter() - start
+
+    print(f"{path}: node objects {objects / 1024:.0f} KiB, flat tree {len(data) / 1024:.0f} KiB")
+    print(f"flatten and serialize {flattened * 1000:.1f} ms, load {loaded * 1000:.2f} ms")
+
+
+def memory(path: str, options: dict) -> None:
+    tracemalloc.start()
+    # Keep the interpreter, and with it the globals, alive while measuring.
+    lox = Lox(error_handler=ErrorHandler(), **options)
+    with silenced():
+        lox.run_file(path)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{path}: {current / 1024:.0f} KiB retained, {peak / 1024:.0f} KiB peak")
+
+
+class silenced:
+    def __enter__(self):
+        self._devnull = open(os.devnull, "w")
+        self._stdout, sys.stdout = sys.stdout, self._devnull
+
+    def __exit__(self, *exc_info):
+        sys.stdout = self._stdout
+        self._devnull.close()
+
+
+def count_environments():
+    created = [0]
+    init = environment.Environment.__init__
+
+    def counting_init(self, *args, **kwargs):
+        created[0] += 1
+        init(self, *args, **kwargs)
+
+    environment.Environment.__init__ = counting_init
+    return created
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import os
+import py_compile
+import shutil
+import sys
+import tempfile
+import zipapp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Development tools, not needed to run scripts.
+EXCLUDE = {"ast_printer.py"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle the runtime into one zipapp.")
+    parser.add_argument("--output", default=os.path.join(ROOT, "dist", "pylox.pyz"))
+    args = parser.parse_args()
+    bundle(args.output)
+    print(f"[written]: {args.output}")
+
+
+def bundle(output: str) -> None:
+    """Write every runtime module, source and bytecode, into an executable zip.
+
+    Python can't write bytecode next to modules in a zip, so it is compiled
+    up front. The bytecode is marked as never needing a check against the
+    source, since neither can change inside the zip.
+    """
+    with tempfile.TemporaryDirectory() as staging:
+        for name in sorted(os.listdir(ROOT)):
+            if not name.endswith(".py") or name in EXCLUDE:
+                continue
+            source = os.path.join(ROOT, name)
+            shutil.copy(source, staging)
+            py_compile.compile(
+                source,
+                cfile=os.path.join(staging, name + "c"),
+                dfile=name,
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        zipapp.create_archive(
+            staging, output, interpreter="/usr/bin/env python3", main="lox:main"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -27,6 +27,10 @@ def main():
             "Unary | operator: Token, right: Expr",
             "Variable | name: Token",
             "Call | callee: Expr, paren: Token, arguments: list[Expr]",
+            "Get | object: Expr, name: Token | cache = None, entries = None",
+            "Set | object: Expr, name: Token, value: Expr | cache = None, entries = None",
+            "This | keyword: Token",
+            "Super | keyword: Token, method: Token",
         ],
         imports=[
             "from ttoken import Token",
@@ -37,19 +41,22 @@ def main():
         output_dir,
         "Stmt",
         [
-            "Block | statements: list[Stmt]",
-            "ExprStmt | expression: Expr",
-            "Print | expression: Expr",
+            "Block | statements: list[Stmt] | scoped = True, start = None",
+            "ExprStmt | expression: Expr | start = None",
+            "Print | expression: Expr | start = None",
             "Return | keyword: Token, value: Expr",
             "Var | name: Token, initializer: Expr",
-            "Function | name: Token, params: list[Token], body: list[Stmt]",
-            "If | condition: Expr, then_branch: Stmt, else_branch: Stmt",
-            "While | condition: Expr, body: Stmt",
+            "Function | name: Token, params: list[Token], body: list[Stmt] | captures = None",
+            "If | condition: Expr, then_branch: Stmt, else_branch: Stmt | start = None",
+            "While | condition: Expr, body: Stmt | start = None",
             "Break | stmt: Token",
+            "ForRange | counter: Token, loop: While, operator: Token, limit: Expr, step: float, body: Stmt",
+            "Import | keyword: Token, path: Token, name: Token",
+            "Class | name: Token, superclass: Variable, methods: list[Function]",
         ],
         imports=[
             "from ttoken import Token",
-            "from Expr import Expr",
+            "from Expr import Expr, Variable",
         ]
     )
 
@@ -70,9 +77,11 @@ def define_ast(output_dir, base_name, types, imports=None):
 
     # the AST classes
     for ttype in types:
-        class_name = ttype.split("|")[0].strip()
-        fields = ttype.split("|")[1].strip()
-        define_type(output_file, base_name, class_name, fields)
+        parts = ttype.split("|")
+        class_name = parts[0].strip()
+        fields = parts[1].strip()
+        annotations = parts[2].strip() if len(parts) > 2 else ""
+        define_type(output_file, base_name, class_name, fields, annotations)
 
 
 def define_base_class(output_file, base_name):
@@ -115,7 +124,7 @@ def define_visitor(visitor_file, base_name, types):
     print(f"[written]: {visitor_file.name}")
 
 
-def define_type(output_file, base_name, class_name, fields):
+def define_type(output_file, base_name, class_name, fields, annotations=""):
     output_file.write(f"\nclass {class_name}({base_name}):\n")
     output_file.write(f"    def __init__(self, {fields}):\n")
 
@@ -124,6 +133,11 @@ def define_type(output_file, base_name, class_name, fields):
     for field in fields:
         name = field.split(": ")[0].strip()
         output_file.write(f"        self.{name} = {name}\n")
+
+    # Annotations filled in by the static passes, with their defaults
+    if annotations:
+        for annotation in annotations.split(", "):
+            output_file.write(f"        self.{annotation.strip()}\n")
     output_file.write("\n")
 
     # Visitor Pattern
@@ -0,0 +1,72 @@
+import sys
+
+
+def main():
+    generators = {
+        "library": library,
+        "expressions": expressions,
+        "nesting": nesting,
+        "prelude": prelude,
+    }
+    if len(sys.argv) != 3 or sys.argv[1] not in generators:
+        print(f"Usage: python generate_bench.py <{'|'.join(generators)}> <size>")
+        sys.exit(64)
+
+    sys.stdout.write(generators[sys.argv[1]](int(sys.argv[2])))
+
+
+def library(functions: int) -> str:
+    """A large library of helpers of which the script only calls two."""
+    lines = []
+    for i in range(functions):
+        lines.append(f"fun helper{i}(a, b) {{")
+        lines.append(f"    var total = a * {i} + b;")
+        lines.append(f"    for (var i = 0; i < b; i = i + 1) {{")
+        lines.append(f"        if (total > {i * 10}) total = total - i; else total = total + i * 2;")
+        lines.append("    }")
+        lines.append(f"    return total > 0 ? total : -total;")
+        lines.append("}")
+    lines.append("print helper0(1, 2) + helper1(3, 4);")
+    return "\n".join(lines) + "\n"
+
+
+def expressions(statements: int) -> str:
+    """Statements made of long expressions, for measuring the parser."""
+    lines = ["var a = 1;", "var b = 2;", "var c = 3;", "fun f(x, y) { return x; }"]
+    for i in range(statements):
+        lines.append(
+            f"var v{i} = (a + b * {i} - c / 2) < f(a, -b) == -(c - {i}) "
+            f"or a * (b + c) <= {i} and b != c ? a = b + c : f(c, a - b * c);"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def prelude(functions: int) -> str:
+    """Helpers, closures over precomputed values and a slow warm up, as a
+    prelude for scripts that start from a snapshot of it."""
+    lines = [library(functions).rsplit("print", 1)[0]]
+    lines.append("fun table(key) { var value = key * key; fun get() { return value; } return get; }")
+    for i in range(functions // 10):
+        lines.append(f"var entry{i} = table({i});")
+    lines.append("var total = 0;")
+    lines.append("for (var n = 0; n < 200000; n = n + 1) total = total + entry0() + n;")
+    return "\n".join(lines) + "\n"
+
+
+def nesting(depth: int) -> str:
+    """Expressions, blocks and statements nested depth levels deep."""
+    lines = [
+        "print " + "(" * depth + "1" + ")" * depth + ";",
+        "print " + "- " * depth + "1;",
+        "print " + " + ".join(["1"] * depth) + ";",
+        "var a;",
+        "a = " * depth + "1;",
+        "{" * depth + "print 1;" + "}" * depth,
+        "if (true) " * depth + "print 1;",
+        "while (false) " * depth + "print 1;",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    main()
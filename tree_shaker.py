@@ -0,0 +1,108 @@
+import time
+
+from walker import AstWalker
+from Stmt import Stmt, Function
+from Expr import Expr, Assign, Variable
+from lazy_function import is_unparsed
+
+
+class TreeShaker:
+    """Drops top-level functions the program can never call.
+
+    Every name mentioned by the top-level code outside function declarations
+    is a root, and a function keeps alive every name mentioned in its body,
+    nested functions and all. Functions no root leads to are removed after
+    the passes that report errors, which still check them, and before the
+    inliner and the interpreter see them. Any mention counts, so a function
+    passed as a value or stored in a variable is kept. Lazy bodies count
+    every identifier in them as mentioned.
+
+    Only for a whole program: the REPL and modules can be reached from code
+    that isn't in the statements. A TreeShaker keeps what it shook out of
+    every program, for report.
+    """
+
+    def __init__(self) -> None:
+        self.removed: list[str] = []
+        self.removed_nodes = 0
+        self.unparsed_removed = 0
+        self.seconds = 0.0
+
+    def shake(self, statements: list[Stmt]) -> list[Stmt]:
+        start = time.perf_counter()
+        roots: set[str] = set()
+        calls: dict[str, set[str]] = {}
+        sizes: dict[Stmt, int] = {}
+        for statement in statements:
+            names = _Names()
+            names._walk_stmt(statement)
+            if isinstance(statement, Function):
+                calls.setdefault(statement.name.lexeme, set()).update(names.names)
+                sizes[statement] = names.nodes
+            else:
+                roots |= names.names
+
+        reachable: set[str] = set()
+        pending: list[str] = [name for name in roots if name in calls]
+        while pending:
+            name = pending.pop()
+            if name in reachable:
+                continue
+            reachable.add(name)
+            pending.extend(callee for callee in calls[name] if callee in calls)
+
+        kept: list[Stmt] = []
+        for statement in statements:
+            if isinstance(statement, Function) and statement.name.lexeme not in reachable:
+                self.removed.append(f"{statement.name.lexeme} (line {statement.name.line})")
+                if is_unparsed(statement):
+                    self.unparsed_removed += 1
+                else:
+                    self.removed_nodes += sizes[statement]
+            else:
+                kept.append(statement)
+        self.seconds += time.perf_counter() - start
+        return kept
+
+    def report(self) -> str:
+        lines: list[str] = [
+            "Tree shaking:",
+            f"  functions removed  {len(self.removed)}",
+            f"  nodes removed      {self.removed_nodes}",
+            f"  time taken         {self.seconds * 1000:.2f} ms",
+        ]
+        if self.unparsed_removed:
+            lines.insert(3, f"  lazy bodies        {self.unparsed_removed} never parsed")
+        return "\n".join(lines)
+
+
+class _Names(AstWalker):
+    """The names mentioned in what it walks, and how many nodes that is."""
+
+    def __init__(self) -> None:
+        self.names: set[str] = set()
+        self.nodes = 0
+
+    def _walk_stmt(self, stmt: Stmt | None) -> None:
+        if stmt is not None:
+            self.nodes += 1
+            stmt.accept(self)
+
+    def _walk_expr(self, expr: Expr | None) -> None:
+        if expr is not None:
+            self.nodes += 1
+            expr.accept(self)
+
+    def visit_function_stmt(self, stmt: Function):
+        if is_unparsed(stmt):
+            self.names |= stmt.identifiers
+        else:
+            super().visit_function_stmt(stmt)
+
+    def visit_variable_expr(self, expr: Variable):
+        self.names.add(expr.name.lexeme)
+
+    def visit_assign_expr(self, expr: Assign):
+        self.names.add(expr.name.lexeme)
+        super().visit_assign_expr(expr)
+
@@ -2,11 +2,13 @@ from tokentype import TokenType
 
 
 class Token:
-    def __init__(self, token_type, lexeme, literal, line):
+    def __init__(self, token_type, lexeme, literal, line, offset=-1):
         self.token_type: TokenType = token_type
         self.lexeme: str = lexeme
         self.literal: object = literal
         self.line: int = line
+        # Where the lexeme starts in the source.
+        self.offset: int = offset
 
     def __str__(self):
         return f"{self.token_type} {self.lexeme} {self.literal}"
@@ -0,0 +1,3 @@
+# Like typing.TYPE_CHECKING, without importing typing, which would cost
+# startup. Type checkers take any TYPE_CHECKING to be true.
+TYPE_CHECKING = False
@@ -40,6 +40,22 @@ class ExprVisitor(ABC):
     def visit_call_expr(self, expr: Call):
         pass
 
+    @abstractmethod
+    def visit_get_expr(self, expr: Get):
+        pass
+
+    @abstractmethod
+    def visit_set_expr(self, expr: Set):
+        pass
+
+    @abstractmethod
+    def visit_this_expr(self, expr: This):
+        pass
+
+    @abstractmethod
+    def visit_super_expr(self, expr: Super):
+        pass
+
 from Stmt import *
 from abc import ABC, abstractmethod
 
@@ -82,3 +98,15 @@ class StmtVisitor(ABC):
     def visit_break_stmt(self, stmt: Break):
         pass
 
+    @abstractmethod
+    def visit_forrange_stmt(self, stmt: ForRange):
+        pass
+
+    @abstractmethod
+    def visit_import_stmt(self, stmt: Import):
+        pass
+
+    @abstractmethod
+    def visit_class_stmt(self, stmt: Class):
+        pass
+
@@ -0,0 +1,125 @@
+from visitor import StmtVisitor, ExprVisitor
+from Stmt import Stmt, Block, ExprStmt, Print, Return, Var, Function, If, While, Break, ForRange, Import, Class
+from Expr import Expr, Assign, Binary, Ternary, Grouping, Literal, Logical, Unary, Variable, Call, Get, Set, This, Super
+from lazy_function import is_unparsed
+
+
+class AstWalker(StmtVisitor, ExprVisitor):
+    """Visits every node of a tree without doing anything.
+
+    Static passes subclass this and only override the nodes they care about,
+    calling the super method to keep walking into the children.
+    """
+
+    def walk(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            self._walk_stmt(statement)
+
+    def _walk_stmt(self, stmt: Stmt | None) -> None:
+        if stmt is not None:
+            stmt.accept(self)
+
+    def _walk_expr(self, expr: Expr | None) -> None:
+        if expr is not None:
+            expr.accept(self)
+
+    def visit_block_stmt(self, stmt: Block):
+        self.walk(stmt.statements)
+
+    def visit_exprstmt_stmt(self, stmt: ExprStmt):
+        self._walk_expr(stmt.expression)
+
+    def visit_print_stmt(self, stmt: Print):
+        self._walk_expr(stmt.expression)
+
+    def visit_return_stmt(self, stmt: Return):
+        self._walk_expr(stmt.value)
+
+    def visit_var_stmt(self, stmt: Var):
+        self._walk_expr(stmt.initializer)
+
+    def visit_function_stmt(self, stmt: Function):
+        # Walking a lazy body would parse it, it gets analyzed on first use.
+        if not is_unparsed(stmt):
+            self.walk(stmt.body)
+
+    def visit_if_stmt(self, stmt: If):
+        self._walk_expr(stmt.condition)
+        self._walk_stmt(stmt.then_branch)
+        self._walk_stmt(stmt.else_branch)
+
+    def visit_while_stmt(self, stmt: While):
+        self._walk_expr(stmt.condition)
+        self._walk_stmt(stmt.body)
+
+    def visit_break_stmt(self, stmt: Break):
+        pass
+
+    def visit_forrange_stmt(self, stmt: ForRange):
+        # The original loop holds the condition, body and increment.
+        self._walk_stmt(stmt.loop)
+
+    def visit_import_stmt(self, stmt: Import):
+        pass
+
+    def visit_class_stmt(self, stmt: Class):
+        self._walk_expr(stmt.superclass)
+        for method in stmt.methods:
+            method.accept(self)
+
+    def visit_assign_expr(self, expr: Assign):
+        self._walk_expr(expr.value)
+
+    def visit_binary_expr(self, expr: Binary):
+        self._walk_expr(expr.left)
+        self._walk_expr(expr.right)
+
+    def visit_quickened_expr(self, expr: Binary):
+        self.visit_binary_expr(expr)
+
+    def visit_ternary_expr(self, expr: Ternary):
+        self._walk_expr(expr.condition)
+        self._walk_expr(expr.left)
+        self._walk_expr(expr.right)
+
+    def visit_grouping_expr(self, expr: Grouping):
+        self._walk_expr(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal):
+        pass
+
+    def visit_logical_expr(self, expr: Logical):
+        self._walk_expr(expr.left)
+        self._walk_expr(expr.right)
+
+    def visit_unary_expr(self, expr: Unary):
+        self._walk_expr(expr.right)
+
+    def visit_variable_expr(self, expr: Variable):
+        pass
+
+    def visit_initialized_expr(self, expr: Variable):
+        # A read proved initialized is still just a read.
+        self.visit_variable_expr(expr)
+
+    def visit_call_expr(self, expr: Call):
+        self._walk_expr(expr.callee)
+        for argument in expr.arguments:
+            self._walk_expr(argument)
+
+    def visit_inlined_expr(self, expr: Call):
+        # The body inlined belongs to the function's declaration.
+        self.visit_call_expr(expr)
+
+    def visit_get_expr(self, expr: Get):
+        self._walk_expr(expr.object)
+
+    def visit_set_expr(self, expr: Set):
+        self._walk_expr(expr.object)
+        self._walk_expr(expr.value)
+
+    def visit_this_expr(self, expr: This):
+        pass
+
+    def visit_super_expr(self, expr: Super):
+        pass